@@ -24,6 +24,7 @@ class QuotationAdmin(admin.ModelAdmin):
     list_display = ['quotation_number', 'client', 'date', 'valid_until', 'status', 'total']
     list_filter = ['status', 'date']
     search_fields = ['quotation_number', 'client__name']
+    list_select_related = ['client']
     inlines = [QuotationItemInline]
 
 
@@ -32,4 +33,5 @@ class ReceiptAdmin(admin.ModelAdmin):
     list_display = ['receipt_number', 'client', 'date', 'payment_method', 'status', 'total']
     list_filter = ['status', 'payment_method', 'date']
     search_fields = ['receipt_number', 'client__name']
+    list_select_related = ['client']
     inlines = [ReceiptItemInline]
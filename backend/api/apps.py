@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class ApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
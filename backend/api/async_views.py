@@ -0,0 +1,81 @@
+"""
+Async (ASGI) API views.
+
+Under ASGI a sync view holds a thread for the whole request, including the
+time spent rendering a PDF or waiting on the SMTP server. ``AsyncAPIView``
+is an ``APIView`` whose handlers are coroutines:
+
+* authentication, permissions, throttling and content negotiation
+  (``initial``) may query the database, so they run through
+  ``sync_to_async``;
+* handlers read with the async ORM, hand CPU-bound work such as reportlab
+  to ``run_blocking`` and await network I/O (``email_service.asend``);
+* errors go through ``handle_exception`` and responses through
+  ``finalize_response``, the same as any other DRF view.
+
+``run_blocking`` uses a process-wide thread pool of ``ASYNC_RENDER_WORKERS``
+threads. It bounds how many renders run at once, however many requests are
+waiting on one. The pool copies the request's context, so ``metrics.timed``
+still reaches the ``Server-Timing`` header.
+
+The async ORM still runs each query in a worker thread. Async views free the
+event loop while they wait and never hold a thread between queries. They do
+not make the queries themselves any faster.
+
+Under WSGI (and in tests) Django runs these views with ``async_to_sync``, so
+they behave exactly as before.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.views import APIView
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ASYNC_RENDER_WORKERS', 4), thread_name_prefix='async-render',
+            )
+        return _executor
+
+
+async def run_blocking(func, *args):
+    """Run ``func(*args)`` on the bounded render pool and wait for it without blocking the event loop."""
+    call = functools.partial(contextvars.copy_context().run, func, *args)
+    return await asyncio.get_running_loop().run_in_executor(_pool(), call)
+
+
+class AsyncAPIView(APIView):
+    """``APIView`` for ``async def`` handlers (see the module docstring)."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
@@ -0,0 +1,70 @@
+"""
+JWT authentication without a database query per request.
+
+``JWTAuthentication`` loads the token's user row on every authenticated
+request. ``CachedJWTAuthentication`` keeps that row in the
+``AUTH_USER_CACHE_ALIAS`` cache for ``AUTH_USER_CACHE_SECONDS``. By default
+that is the file-based response cache, which every worker process shares,
+so an invalidation in one worker is seen by all of them. A hit still
+checks ``is_active`` and, with ``CHECK_REVOKE_TOKEN``, the password hash
+claim, just like a database read. Together with a response cache hit, a
+repeated ``GET`` runs no query at all.
+
+``api.signals`` drops the cached user on ``post_save`` / ``post_delete``
+(which covers password changes and ``last_login`` updates) and when its
+groups or permissions change. It drops it again once the transaction
+commits, so a row read while the write was in flight is not kept. Writes
+that skip signals, such as ``User.objects.update()``, are picked up when
+the entry expires. ``AUTH_USER_CACHE_SECONDS = 0`` turns the cache off.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def _cache():
+    return caches[getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'responses')]
+
+
+def _timeout():
+    return getattr(settings, 'AUTH_USER_CACHE_SECONDS', 300)
+
+
+def _key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def invalidate(user_ids):
+    """
+    Forget the cached rows of ``user_ids`` (values of the token's
+    ``USER_ID_FIELD``); safe to call for users never cached.
+    """
+    _cache().delete_many([_key(user_id) for user_id in user_ids])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` with the user row read from the cache."""
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if not _timeout() or user_id is None:
+            return super().get_user(validated_token)
+
+        user = _cache().get(_key(user_id))
+        if user is None:
+            # Raises for unknown and inactive users, which are not cached
+            user = super().get_user(validated_token)
+            _cache().set(_key(user_id), user, timeout=_timeout())
+            return user
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
@@ -0,0 +1,260 @@
+"""
+Latency and query-count benchmark of every API endpoint.
+
+Each case sends the same request ``repeat`` times through the full
+middleware stack, authenticated with a real JWT, and records the wall time
+and number of SQL queries of every request. The report has p50/p95/p99
+latencies per endpoint, is JSON, and can be compared with one saved from
+another commit (``compare``).
+
+Run it against a database filled by ``seed_billing``. Everything the
+benchmark writes (its user, created and deleted rows, queued jobs) is
+rolled back at the end. Emails go to the locmem backend, and PDFs and
+cached responses to a temporary directory. Detail and PDF cases cycle
+through different objects, so they measure cold renders; list cases repeat
+the same URL.
+"""
+import platform
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from . import jobs
+from .models import Client, Job, Quotation, Receipt
+
+PASSWORD = 'benchmark-password'
+
+
+class Case:
+    """
+    One endpoint. ``path`` and ``data`` may be callables taking the request
+    number and the shared state; ``after`` sees each response.
+    """
+
+    def __init__(self, name, method, path, data=None, after=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.after = after
+
+    def _value(self, value, index, state):
+        return value(index, state) if callable(value) else value
+
+    def describe(self):
+        return getattr(self.path, 'label', self.path)
+
+    def __call__(self, client, index, state):
+        path = self._value(self.path, index, state)
+        data = self._value(self.data, index, state)
+        response = getattr(client, self.method.lower())(path, data, format='json' if self.method != 'GET' else None)
+        if response.streaming:
+            # Exports do their work while the body is read
+            b''.join(response.streaming_content)
+        if self.after:
+            self.after(response, state)
+        return response.status_code
+
+
+class Call(Case):
+    """Work that runs outside a request, e.g. a queued job."""
+
+    def __init__(self, name, func):
+        super().__init__(name, 'CALL', func.__name__)
+        self.func = func
+
+    def __call__(self, client, index, state):
+        self.func(index, state)
+        return None
+
+
+def _sample(model, count):
+    return list(model.objects.order_by('-created_at').values_list('pk', flat=True)[:count])
+
+
+def _detail(name, pk):
+    """Path of ``name`` for the object ``pk(index, state)``, labelled ``/.../{id}/`` in the report."""
+    def path(index, state):
+        return reverse(name, args=[pk(index, state)])
+    path.label = reverse(name, args=[0]).replace('/0/', '/{id}/')
+    return path
+
+
+def _cycle(pks, name):
+    return _detail(name, lambda index, state: pks[index % len(pks)])
+
+
+def _remember_job(response, state):
+    state.setdefault('jobs', []).append(response.data['job_id'])
+
+
+def _run_queued_job(index, state):
+    """What the job worker does for a queued email: render the PDF and send."""
+    jobs.run(Job.objects.get(pk=state['jobs'].pop(0)))
+
+
+def _created(key):
+    def after(response, state):
+        if response.status_code == 201:
+            state.setdefault(key, []).append(response.data['id'])
+    return after
+
+
+def _pop(key, name):
+    return _detail(name, lambda index, state: state[key].pop())
+
+
+def cases(repeat):
+    """Every endpoint, in the order they are run."""
+    clients, quotations, receipts = (_sample(model, repeat) for model in (Client, Quotation, Receipt))
+    if not (clients and quotations and receipts):
+        raise ValueError('The benchmark needs clients, quotations and receipts; run seed_billing first.')
+    client_id = clients[0]
+    item = [{'description': 'Benchmark item', 'quantity': 2, 'unit_price': '150.00'}]
+    new_client = lambda index, state: {  # noqa: E731
+        'name': f'Benchmark {index}', 'email': f'benchmark-{index}@example.com', 'phone': '555-0100',
+    }
+    new_quotation = {'client': client_id, 'date': '2030-01-01', 'valid_until': '2030-02-01', 'items': item}
+    new_receipt = {'client': client_id, 'payment_method': 'CASH', 'items': item}
+
+    return [
+        Case('auth.register', 'POST', reverse('register'),
+             lambda index, state: {'username': f'benchmark-new-{index}', 'password': PASSWORD}),
+        Case('auth.token', 'POST', reverse('token_obtain_pair'),
+             lambda index, state: {'username': state['username'], 'password': PASSWORD}),
+        Case('auth.token_refresh', 'POST', reverse('token_refresh'),
+             lambda index, state: {'refresh': state['refresh']}),
+        Case('dashboard', 'GET', reverse('dashboard')),
+        Case('search', 'GET', reverse('search') + '?q=marquee'),
+
+        Case('clients.list', 'GET', reverse('client-list')),
+        Case('clients.list_ordered', 'GET', reverse('client-list') + '?ordering=name'),
+        Case('clients.detail', 'GET', _cycle(clients, 'client-detail')),
+        Case('clients.create', 'POST', reverse('client-list'), new_client, _created('clients')),
+        Case('clients.update', 'PATCH', _cycle(clients, 'client-detail'), {'phone': '555-0199'}),
+        Case('clients.delete', 'DELETE', _pop('clients', 'client-detail')),
+        Case('clients.export', 'GET', reverse('client-export') + '?format=csv'),
+
+        Case('quotations.list', 'GET', reverse('quotation-list')),
+        Case('quotations.list_filtered', 'GET', reverse('quotation-list') + '?status=SENT&ordering=-total'),
+        Case('quotations.detail', 'GET', _cycle(quotations, 'quotation-detail')),
+        Case('quotations.create', 'POST', reverse('quotation-list'), new_quotation, _created('quotations')),
+        Case('quotations.update', 'PATCH', _cycle(quotations, 'quotation-detail'), {'notes': 'Benchmark'}),
+        Case('quotations.delete', 'DELETE', _pop('quotations', 'quotation-detail')),
+        Case('quotations.pdf', 'GET', _cycle(quotations, 'quotation-pdf')),
+        Case('quotations.send_email', 'POST', _cycle(quotations, 'quotation-send-email'), after=_remember_job),
+        Call('quotations.email_job', _run_queued_job),
+
+        Case('receipts.list', 'GET', reverse('receipt-list')),
+        Case('receipts.list_filtered', 'GET', reverse('receipt-list') + '?status=PAID&payment_method=CASH'),
+        Case('receipts.detail', 'GET', _cycle(receipts, 'receipt-detail')),
+        Case('receipts.create', 'POST', reverse('receipt-list'), new_receipt, _created('receipts')),
+        Case('receipts.update', 'PATCH', _cycle(receipts, 'receipt-detail'), {'notes': 'Benchmark'}),
+        Case('receipts.delete', 'DELETE', _pop('receipts', 'receipt-detail')),
+        Case('receipts.pdf', 'GET', _cycle(receipts, 'receipt-pdf')),
+        Case('receipts.send_email', 'POST', _cycle(receipts, 'receipt-send-email'), after=_remember_job),
+        Call('receipts.email_job', _run_queued_job),
+    ]
+
+
+def percentile(values, percent):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+def _summary(case, state, timings, queries, statuses):
+    return {
+        'name': case.name,
+        'method': case.method,
+        'path': case.describe(),
+        'requests': len(timings),
+        'status': dict(Counter(str(code) for code in statuses if code is not None)),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': statistics.median_low(queries),
+        'max_queries': max(queries),
+    }
+
+
+def scratch_caches(location):
+    """
+    ``CACHES`` with the response and user caches moved under ``location``:
+    responses and users read from rows that are rolled back must not
+    outlive the run.
+    """
+    caches = dict(settings.CACHES)
+    for alias in {getattr(settings, 'RESPONSE_CACHE_ALIAS', 'responses'),
+                  getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'responses')}:
+        if alias in caches:
+            caches[alias] = {**caches[alias], 'LOCATION': f'{location}/{alias}'}
+    return caches
+
+
+def run(repeat=20, only=None):
+    """Benchmark every case (or those whose name starts with ``only``) and return the report."""
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'machine': platform.machine(),
+        },
+        'data': {model._meta.model_name: model.objects.count() for model in (Client, Quotation, Receipt)},
+        'repeat': repeat,
+        'results': [],
+    }
+    with tempfile.TemporaryDirectory() as scratch, override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', PDF_CACHE_DIR=f'{scratch}/pdf',
+        CACHES=scratch_caches(f'{scratch}/caches'),
+    ), transaction.atomic():
+        state = {'username': 'benchmark-runner'}
+        User.objects.create_user(state['username'], password=PASSWORD, is_staff=True)
+        client = APIClient()
+        tokens = client.post(reverse('token_obtain_pair'), {'username': state['username'], 'password': PASSWORD})
+        state['refresh'] = tokens.data['refresh']
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens.data['access']}")
+
+        for case in cases(repeat):
+            if only and not any(case.name.startswith(prefix) for prefix in only):
+                continue
+            timings, queries, statuses = [], [], []
+            for index in range(repeat):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    statuses.append(case(client, index, state))
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(captured))
+            report['results'].append(_summary(case, state, timings, queries, statuses))
+        transaction.set_rollback(True)
+    return report
+
+
+def compare(baseline, current):
+    """Per endpoint change between two reports: latency ratios and query differences."""
+    before = {result['name']: result for result in baseline['results']}
+    changes = []
+    for result in current['results']:
+        old = before.get(result['name'])
+        if old is None:
+            continue
+        changes.append({
+            'name': result['name'],
+            'p50_ms': [old['p50_ms'], result['p50_ms']],
+            'p95_ms': [old['p95_ms'], result['p95_ms']],
+            'p50_ratio': round(result['p50_ms'] / old['p50_ms'], 2) if old['p50_ms'] else None,
+            'queries': [old['queries'], result['queries']],
+        })
+    return changes
@@ -0,0 +1,98 @@
+"""
+Billing aggregates stored on each client.
+
+* ``receipt_count``, ``total_paid`` and ``last_payment_at`` cover the
+  client's paid receipts; ``last_payment_at`` is the latest receipt date.
+* ``open_quotation_count`` counts quotations that are still draft or sent
+  (``rollups.PENDING_QUOTATION_STATUSES``).
+
+``api.signals`` refreshes the client of a quotation or receipt whenever one
+is saved or deleted, in the same transaction as the write. The refresh locks
+the client rows before it reads the documents, so concurrent writes for
+one client are applied one after the other. A document moved
+to another client refreshes both clients. A refresh recomputes the four
+values of that one client from its own rows, which the ``(client, ...)``
+indexes make cheap. Deltas could not handle a deleted last payment or a
+status change without the old row. The client row is written only if a
+value changed. Its ``updated_at`` then moves, so ETags, delta syncs and
+the response cache see the new figures.
+
+Bulk writes that skip signals (``api.imports``, ``api.seed``) call
+``refresh`` themselves. ``reconcile_client_totals`` recomputes every
+client and reports any drift.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import response_cache
+from .models import Client, Quotation, Receipt
+from .rollups import PENDING_QUOTATION_STATUSES
+
+FIELDS = ['receipt_count', 'total_paid', 'open_quotation_count', 'last_payment_at']
+PAID_STATUS = 'PAID'
+CENT = Decimal('0.01')
+
+
+def _computed():
+    """Annotations recomputing every field from the client's documents."""
+    paid = Receipt.objects.filter(client=OuterRef('pk'), status=PAID_STATUS).order_by().values('client')
+    open_quotations = (
+        Quotation.objects.filter(client=OuterRef('pk'), status__in=PENDING_QUOTATION_STATUSES)
+        .order_by().values('client')
+    )
+    return {
+        'computed_receipt_count': Coalesce(Subquery(paid.annotate(value=Count('pk')).values('value')), 0),
+        'computed_total_paid': Coalesce(
+            Subquery(paid.annotate(value=Sum('total')).values('value')), Decimal('0'),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+        'computed_open_quotation_count': Coalesce(
+            Subquery(open_quotations.annotate(value=Count('pk')).values('value')), 0,
+        ),
+        'computed_last_payment_at': Subquery(paid.annotate(value=Max('date')).values('value')),
+    }
+
+
+def _refresh_chunk(client_ids, now, dry_run):
+    changed = []
+    with transaction.atomic():
+        # Lock first, then aggregate in a new statement: under READ COMMITTED
+        # a statement that waited on the lock still reads the snapshot taken
+        # when it started, and would miss the document committed meanwhile
+        list(Client.objects.filter(pk__in=client_ids).order_by('pk').select_for_update().values_list('pk'))
+        rows = (
+            Client.objects.filter(pk__in=client_ids)
+            .annotate(**_computed()).values('pk', *FIELDS, *(f'computed_{field}' for field in FIELDS))
+        )
+        for row in rows:
+            values = {field: row[f'computed_{field}'] for field in FIELDS}
+            # SQLite sums decimals as floats
+            values['total_paid'] = values['total_paid'].quantize(CENT)
+            if any(row[field] != value for field, value in values.items()):
+                if not dry_run:
+                    Client.objects.filter(pk=row['pk']).update(**values, updated_at=now)
+                changed.append(row['pk'])
+    return changed
+
+
+def refresh(client_ids=None, chunk_size=500, dry_run=False):
+    """
+    Recompute the aggregates of ``client_ids`` (every client if ``None``)
+    and return the ids whose stored values were wrong or out of date.
+    ``dry_run`` only reports them.
+    """
+    if client_ids is None:
+        client_ids = Client.objects.order_by('pk').values_list('pk', flat=True)
+    client_ids = sorted({pk for pk in client_ids if pk is not None})
+    now = timezone.now()
+    changed = []
+    for start in range(0, len(client_ids), chunk_size):
+        changed.extend(_refresh_chunk(client_ids[start:start + chunk_size], now, dry_run))
+    if changed and not dry_run:
+        response_cache.invalidate(Client, changed)
+        transaction.on_commit(lambda: response_cache.invalidate(Client, changed))
+    return changed
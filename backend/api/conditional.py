@@ -0,0 +1,109 @@
+"""
+Conditional GET (``ETag`` / ``Last-Modified``) for the billing viewsets.
+
+Validators come from one aggregate query, so a ``304 Not Modified`` is
+answered before the page is fetched or any serializer runs.
+
+* Detail views get a strong ETag from the object's ``updated_at`` and the
+  ``updated_at`` of the related rows it embeds (the client of a document).
+  A document's ``updated_at`` also moves when one of its line items changes
+  (see ``api.signals``).
+* List views get a weak ETag from ``max(updated_at)`` and the row count of
+  the filtered queryset, the time of the last deletion (``api.sync``) and
+  the query string (filters, ordering, cursor).
+
+Responses carry ``Cache-Control: private, no-cache``, so browsers keep the
+body and revalidate it on every request.
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .sync import latest_deletion
+
+
+def _digest(*parts):
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+def _latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+class ConditionalGetMixin:
+    """
+    Adds ``ETag`` and ``Last-Modified`` to ``list`` and ``retrieve`` and
+    answers matching ``If-None-Match`` / ``If-Modified-Since`` with 304.
+    ``etag_related`` names the foreign keys whose rows are embedded in the
+    representation.
+    """
+    etag_related = []
+
+    def _related_fields(self):
+        return [f'{name}__updated_at' for name in self.etag_related]
+
+    def list_validators(self, queryset):
+        aggregates = {
+            'count': Count('pk'),
+            'updated_at': Max('updated_at'),
+            # Deletions that leave the count unchanged (e.g. in a delta sync)
+            'deleted_at': Max(latest_deletion(queryset.model)),
+        }
+        for index, field in enumerate(self._related_fields()):
+            aggregates[f'related_{index}'] = Max(field)
+        values = queryset.order_by().aggregate(**aggregates)
+        last_modified = _latest(*(value for key, value in values.items() if key != 'count'))
+        etag = 'W/"%s"' % _digest(
+            queryset.model._meta.label, sorted(values.items()), self.request.get_full_path(),
+        )
+        return etag, last_modified
+
+    def detail_validators(self, queryset, pk):
+        fields = ['pk', 'updated_at'] + self._related_fields()
+        try:
+            row = queryset.filter(pk=pk).order_by().values_list(*fields).first()
+        except (TypeError, ValueError, ValidationError):
+            row = None
+        if row is None:
+            # Let the regular lookup produce the 404
+            return None, None
+        # The query string picks the representation (?fields=, ?expand=)
+        etag = '"%s"' % _digest(queryset.model._meta.label, row, self.request.get_full_path())
+        return etag, _latest(*row[1:])
+
+    def _conditional(self, validators, render):
+        # Kept for ResponseCacheMixin, which stores them with the response
+        self._validators = validators
+        etag, last_modified = validators
+        # Whole seconds, like the HTTP date it is compared with
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        if etag is not None:
+            response = get_conditional_response(self.request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = render()
+        else:
+            response = render()
+        if etag is not None and response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self._conditional(
+            self.list_validators(queryset), lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.queryset.model.objects.all())
+        validators = self.detail_validators(queryset, kwargs[self.lookup_url_kwarg or self.lookup_field])
+        return self._conditional(
+            validators, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
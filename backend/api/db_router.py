@@ -0,0 +1,180 @@
+"""
+Read replicas for the client, quotation and receipt endpoints.
+
+``DATABASE_REPLICAS`` lists the ``DATABASES`` aliases that may serve
+reads. Aliases marked ``'REPLICA': True`` are replicas too, even when not
+serving reads; neither kind is ever migrated. Writes, and every read outside those endpoints (jobs, commands,
+admin, auth), go to ``default``. ``ReplicaReadMixin`` switches a
+request's reads to a replica once it has authenticated a ``GET`` /
+``HEAD`` / ``OPTIONS``, and:
+
+* a request that writes reads everything else from the primary too;
+* a user who just wrote is pinned to the primary for
+  ``DATABASE_REPLICA_STICKY_SECONDS`` (read-your-writes). The pin is kept in
+  the ``DATABASE_PIN_CACHE_ALIAS`` cache, which every worker must share;
+* a replica whose connection fails its health check is skipped for
+  ``DATABASE_REPLICA_RETRY_SECONDS``, and reads fall back to the primary
+  when none is left.
+
+Replicas lag, so a response rendered from one is kept in the response
+cache for the sticky period only, not until the next invalidation.
+
+Locally, a second SQLite file stands in for the replica (``SQLITE_REPLICA``
+in the settings): ``sync_sqlite_replica`` copies ``db.sqlite3`` to it with
+the SQLite backup API, and it is opened read-only. Its data is as old as the last copy,
+which makes lag easy to see.
+"""
+import logging
+import random
+import sqlite3
+import time
+from contextlib import closing
+from contextvars import ContextVar
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger('api.db_router')
+
+_routing = ContextVar('database_routing', default=None)
+# Replica alias -> time.monotonic() before which it is not tried again
+_down = {}
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def replica_aliases():
+    """Every alias that is a replica, whether or not it serves reads now."""
+    marked = {alias for alias, config in settings.DATABASES.items() if config.get('REPLICA')}
+    return marked | set(replicas())
+
+
+def sticky_seconds():
+    return getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 5)
+
+
+class Routing:
+    """Where the reads of one request go, and whether it has written."""
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+def start_request():
+    routing = Routing()
+    return routing, _routing.set(routing)
+
+
+def end_request(token):
+    _routing.reset(token)
+
+
+def reading_from_replica():
+    routing = _routing.get()
+    return routing is not None and routing.replica is not None and not routing.wrote
+
+
+def _pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def _pins():
+    return caches[getattr(settings, 'DATABASE_PIN_CACHE_ALIAS', 'default')]
+
+
+def pin(user_id):
+    """Send ``user_id``'s reads to the primary for the sticky period."""
+    _pins().set(_pin_key(user_id), 1, timeout=sticky_seconds())
+
+
+def is_pinned(user_id):
+    return _pins().get(_pin_key(user_id)) is not None
+
+
+def healthy_replica():
+    """A replica alias whose connection works, or ``None``."""
+    now = time.monotonic()
+    candidates = [alias for alias in replicas() if _down.get(alias, 0) <= now]
+    random.shuffle(candidates)
+    for alias in candidates:
+        connection = connections[alias]
+        try:
+            # Reconnects a persistent connection that went bad (CONN_HEALTH_CHECKS)
+            connection.close_if_health_check_failed()
+            connection.ensure_connection()
+        except DatabaseError as exc:
+            _down[alias] = now + getattr(settings, 'DATABASE_REPLICA_RETRY_SECONDS', 30)
+            logger.warning('Replica %s is unavailable, reading from the primary: %s', alias, exc)
+            continue
+        return alias
+    return None
+
+
+def read_from_replica(request):
+    """Route the rest of ``request``'s reads to a replica, if it may use one."""
+    routing = _routing.get()
+    if routing is None or request.method not in SAFE_METHODS or not replicas():
+        return None
+    user_id = getattr(request.user, 'pk', None)
+    if user_id is not None and is_pinned(user_id):
+        return None
+    routing.replica = healthy_replica()
+    return routing.replica
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None and routing.replica is not None and not routing.wrote:
+            return routing.replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema from the primary
+        return db not in replica_aliases()
+
+
+class ReplicaReadMixin:
+    """Serves the viewset's safe methods from a replica (see ``read_from_replica``)."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        read_from_replica(request)
+
+
+def _sqlite_path(alias):
+    name = str(connections[alias].settings_dict['NAME'])
+    return urlparse(name).path if name.startswith('file:') else name
+
+
+def sync_sqlite_replica(alias, primary=DEFAULT_DB_ALIAS):
+    """Copy the primary SQLite database over the SQLite file of ``alias``; returns its path."""
+    for name in (alias, primary):
+        if connections[name].vendor != 'sqlite':
+            raise ValueError(f'{name} is not a SQLite database.')
+    target = _sqlite_path(alias)
+    connections[alias].close()
+    source = connections[primary]
+    source.ensure_connection()
+    with closing(sqlite3.connect(target)) as destination:
+        source.connection.backup(destination)
+    return target
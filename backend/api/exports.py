@@ -0,0 +1,130 @@
+"""
+Streaming CSV / NDJSON export of clients, quotations and receipts.
+
+Rows are read in primary key order, ``EXPORT_CHUNK_SIZE`` at a time, with a
+keyset condition (``id > last id``) rather than an OFFSET. Each chunk is two
+bounded queries: the documents and then their line items. Only one chunk is
+held in memory, so memory use and time to first byte do not depend on the
+size of the table. Line items are either nested under their document or
+flattened to one row per item.
+"""
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from rest_framework import serializers
+
+from .filters import DocumentListFilterSerializer
+from .models import Client, Quotation, Receipt
+
+COLUMNS = {
+    Client: ['id', 'name', 'email', 'phone', 'address', 'company', 'created_at', 'updated_at'],
+    Quotation: [
+        'id', 'quotation_number', 'client', 'client_name', 'client_email',
+        'date', 'valid_until', 'status', 'terms', 'subtotal', 'tax',
+        'total', 'notes', 'created_at', 'updated_at',
+    ],
+    Receipt: [
+        'id', 'receipt_number', 'client', 'client_name', 'client_email',
+        'date', 'payment_method', 'status', 'subtotal', 'tax',
+        'total', 'notes', 'created_at', 'updated_at',
+    ],
+}
+ITEM_COLUMNS = ['id', 'description', 'quantity', 'unit_price', 'total']
+ITEM_LAYOUTS = ['nested', 'flat', 'none']
+
+
+class DocumentExportSerializer(DocumentListFilterSerializer):
+    """List filter plus how line items are laid out in the export"""
+    items = serializers.ChoiceField(choices=ITEM_LAYOUTS, required=False)
+
+
+class _Echo:
+    """File-like object that hands back whatever ``csv.writer`` writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _chunks(queryset, columns, chunk_size):
+    if 'client_name' in columns:
+        queryset = queryset.annotate(client_name=F('client__name'), client_email=F('client__email'))
+    queryset = queryset.order_by('pk').values_list(*columns)
+    last_id = None
+    while True:
+        page = queryset if last_id is None else queryset.filter(pk__gt=last_id)
+        rows = [dict(zip(columns, values)) for values in page[:chunk_size]]
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['id']
+
+
+def _attach_items(model, rows):
+    parent = model._meta.model_name
+    item_model = model._meta.get_field('items').related_model
+    by_parent = {row['id']: row.setdefault('items', []) for row in rows}
+    items = (
+        item_model.objects.filter(**{f'{parent}_id__in': list(by_parent)})
+        .order_by(parent, 'id')
+        .values_list(parent, *ITEM_COLUMNS)
+    )
+    for parent_id, *values in items.iterator():
+        by_parent[parent_id].append(dict(zip(ITEM_COLUMNS, values)))
+
+
+def _flatten(row):
+    """One output row per line item; a document without items still gets one row."""
+    items = row.pop('items')
+    for item in items or [{}]:
+        yield {**row, **{f'item_{column}': item.get(column) for column in ITEM_COLUMNS}}
+
+
+def stream_export(queryset, fmt='csv', items='nested', chunk_size=None):
+    """
+    Yield ``queryset`` as CSV or NDJSON text, one chunk of rows per string.
+
+    ``items`` is ``'nested'``, ``'flat'`` or ``'none'`` and is ignored for
+    clients. Nested items are a JSON array in CSV output.
+    """
+    model = queryset.model
+    chunk_size = chunk_size or getattr(settings, 'EXPORT_CHUNK_SIZE', 500)
+    columns = COLUMNS[model]
+    if model is Client:
+        items = 'none'
+
+    header = list(columns)
+    if items == 'nested':
+        header.append('items')
+    elif items == 'flat':
+        header.extend(f'item_{column}' for column in ITEM_COLUMNS)
+
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(header)
+
+    for rows in _chunks(queryset, columns, chunk_size):
+        if items != 'none':
+            _attach_items(model, rows)
+        if items == 'flat':
+            rows = [flat for row in rows for flat in _flatten(row)]
+
+        if fmt == 'csv':
+            lines = []
+            for row in rows:
+                if items == 'nested':
+                    row['items'] = json.dumps(row['items'], cls=DjangoJSONEncoder)
+                lines.append(writer.writerow([_csv_value(row[column]) for column in header]))
+        else:
+            lines = [json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows]
+        yield ''.join(lines)
@@ -0,0 +1,119 @@
+"""
+Sparse fieldsets and opt-in expansion for the list and detail endpoints.
+
+``?fields=id,quotation_number,total`` limits a representation to those
+fields; ``?expand=items,client`` adds the nested line items and the
+client's name and email. With either parameter the embedded data is only
+there when expanded, e.g. ``?expand=client`` is every plain field plus the
+client. Without both the full representation is returned as before.
+``id`` is always included.
+
+The selection is pushed down to the query. The ``values()`` list path
+(``api.readers``) selects only the needed columns. It only joins the
+client and reads line items when they are expanded. Detail views load the
+document with ``only()`` and skip the client join and the item prefetch
+when those are not requested.
+
+Unknown names are a ``400``. Writes always answer with the full
+representation.
+"""
+from rest_framework import serializers
+
+READ_ACTIONS = ('list', 'retrieve')
+
+
+def _names(value):
+    return [name for name in (part.strip() for part in value.split(',')) if name]
+
+
+def selection(query_params, readable, expandable):
+    """
+    The field names to return for ``?fields=`` / ``?expand=``, in no
+    particular order, or ``None`` for the full representation.
+    ``expandable`` maps an ``expand`` name to the fields it adds.
+    """
+    fields, expand = query_params.get('fields'), query_params.get('expand')
+    if fields is None and expand is None:
+        return None
+
+    embedded = {name for names in expandable.values() for name in names}
+    errors = {}
+    selected = {'id'}
+    if fields is None:
+        selected.update(name for name in readable if name not in embedded)
+    else:
+        unknown = [name for name in _names(fields) if name not in readable and name not in expandable]
+        if unknown:
+            errors['fields'] = [f'Unknown field(s): {", ".join(unknown)}.']
+        for name in _names(fields):
+            selected.update(expandable.get(name, [name]))
+    if expand is not None:
+        unknown = [name for name in _names(expand) if name not in expandable]
+        if unknown:
+            errors['expand'] = [f'Must be one of: {", ".join(expandable) or "nothing"}.']
+        for name in _names(expand):
+            selected.update(expandable.get(name, []))
+    if errors:
+        raise serializers.ValidationError(errors)
+    return selected & set(readable)
+
+
+class SparseFieldsMixin:
+    """
+    ``?fields=`` and ``?expand=`` on ``list`` and ``retrieve``. ``expandable``
+    maps each ``expand`` name to its serializer fields; ``expand_queryset``
+    maps it to the ``select_related`` / ``prefetch_related`` lookups that
+    load them.
+    """
+    expandable = {}
+    expand_queryset = {}
+
+    def get_field_selection(self):
+        if self.action not in READ_ACTIONS:
+            return None
+        if not hasattr(self, '_field_selection'):
+            serializer = self.get_serializer_class()(context=self.get_serializer_context())
+            readable = [name for name, field in serializer.fields.items() if not field.write_only]
+            self._field_selection = selection(self.request.query_params, readable, self.expandable)
+        return self._field_selection
+
+    def get_serializer(self, *args, **kwargs):
+        selected = self.get_field_selection()
+        if selected is not None:
+            kwargs['fields'] = selected
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        selected = self.get_field_selection()
+        if selected is None:
+            return queryset
+
+        related, prefetch = [], []
+        for name, fields in self.expandable.items():
+            if selected & set(fields):
+                lookups = self.expand_queryset.get(name, {})
+                related.extend(lookups.get('select_related', []))
+                prefetch.extend(lookups.get('prefetch_related', []))
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if self.action == 'retrieve':
+            queryset = queryset.only(*self._columns(selected, related))
+        return queryset
+
+    def _columns(self, selected, related):
+        """Model fields the selected serializer fields read (``only()`` for the detail query)."""
+        model = self.queryset.model
+        serializer = self.get_serializer_class()(context=self.get_serializer_context())
+        columns = {model._meta.pk.name, *related}
+        for name in selected:
+            field = serializer.fields[name]
+            if isinstance(field, serializers.ListSerializer):
+                continue
+            source = field.source.replace('.', '__')
+            if source.split('__', 1)[0] in related or hasattr(model, source):
+                columns.add(source)
+        return columns
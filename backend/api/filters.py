@@ -0,0 +1,179 @@
+"""Filters shared by the list and bulk document endpoints and management commands."""
+from datetime import datetime, time, timedelta
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Client
+from .sync import window_start
+
+
+class DocumentFilterSerializer(serializers.Serializer):
+    """Validates a status / date range / client filter over quotations or receipts"""
+    status = serializers.CharField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    client = serializers.IntegerField(required=False)
+
+    def __init__(self, *args, model=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.model = model
+
+    def validate_status(self, value):
+        value = value.upper()
+        choices = dict(self.model._meta.get_field('status').choices) if self.model else None
+        if choices is not None and value not in choices:
+            raise serializers.ValidationError(f'Must be one of: {", ".join(choices)}.')
+        return value
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError('date_from must not be after date_to.')
+        return attrs
+
+
+class CreatedRangeFilterSerializer(serializers.Serializer):
+    """Validates a ``created_at`` day range and the delta sync ``updated_since``"""
+    created_from = serializers.DateField(required=False)
+    created_to = serializers.DateField(required=False)
+    updated_since = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if attrs.get('created_from') and attrs.get('created_to') and attrs['created_from'] > attrs['created_to']:
+            raise serializers.ValidationError('created_from must not be after created_to.')
+        return attrs
+
+
+class ClientListFilterSerializer(CreatedRangeFilterSerializer):
+    """The creation day range plus the billing totals kept on each client"""
+    total_paid_min = serializers.DecimalField(max_digits=14, decimal_places=2, required=False)
+    total_paid_max = serializers.DecimalField(max_digits=14, decimal_places=2, required=False)
+    min_receipts = serializers.IntegerField(min_value=0, required=False)
+    has_open_quotations = serializers.BooleanField(required=False, allow_null=True, default=None)
+    last_payment_from = serializers.DateField(required=False)
+    last_payment_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if attrs.get('total_paid_min') is not None and attrs.get('total_paid_max') is not None \
+                and attrs['total_paid_min'] > attrs['total_paid_max']:
+            raise serializers.ValidationError('total_paid_min must not be above total_paid_max.')
+        if attrs.get('last_payment_from') and attrs.get('last_payment_to') \
+                and attrs['last_payment_from'] > attrs['last_payment_to']:
+            raise serializers.ValidationError('last_payment_from must not be after last_payment_to.')
+        return attrs
+
+
+class DocumentListFilterSerializer(DocumentFilterSerializer, CreatedRangeFilterSerializer):
+    """The bulk document filter plus payment method, creation day and total ranges"""
+    payment_method = serializers.CharField(required=False)
+    total_min = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    total_max = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+
+    def validate_payment_method(self, value):
+        value = value.upper()
+        try:
+            choices = dict(self.model._meta.get_field('payment_method').choices)
+        except FieldDoesNotExist:
+            raise serializers.ValidationError('Not supported on this endpoint.')
+        if value not in choices:
+            raise serializers.ValidationError(f'Must be one of: {", ".join(choices)}.')
+        return value
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if attrs.get('total_min') is not None and attrs.get('total_max') is not None \
+                and attrs['total_min'] > attrs['total_max']:
+            raise serializers.ValidationError('total_min must not be above total_max.')
+        return attrs
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _day_range(queryset, name, start, end):
+    """
+    Inclusive day range on a date or datetime column. On ``DateTimeField``
+    columns the days are turned into a datetime range so the index stays
+    usable.
+    """
+    is_datetime = isinstance(queryset.model._meta.get_field(name), models.DateTimeField)
+    if start:
+        queryset = queryset.filter(**{f'{name}__gte': _day_start(start) if is_datetime else start})
+    if end:
+        if is_datetime:
+            queryset = queryset.filter(**{f'{name}__lt': _day_start(end + timedelta(days=1))})
+        else:
+            queryset = queryset.filter(**{f'{name}__lte': end})
+    return queryset
+
+
+def filter_documents(queryset, filters):
+    """
+    Apply validated ``DocumentFilterSerializer`` data to a quotation or
+    receipt queryset. Date bounds are inclusive.
+    """
+    if filters.get('status'):
+        queryset = queryset.filter(status=filters['status'])
+    if filters.get('client'):
+        queryset = queryset.filter(client_id=filters['client'])
+    return _day_range(queryset, 'date', filters.get('date_from'), filters.get('date_to'))
+
+
+def filter_clients(queryset, filters):
+    """Apply validated ``ClientListFilterSerializer`` billing filters."""
+    if filters.get('total_paid_min') is not None:
+        queryset = queryset.filter(total_paid__gte=filters['total_paid_min'])
+    if filters.get('total_paid_max') is not None:
+        queryset = queryset.filter(total_paid__lte=filters['total_paid_max'])
+    if filters.get('min_receipts') is not None:
+        queryset = queryset.filter(receipt_count__gte=filters['min_receipts'])
+    if filters.get('has_open_quotations') is not None:
+        lookup = 'open_quotation_count__gt' if filters['has_open_quotations'] else 'open_quotation_count'
+        queryset = queryset.filter(**{lookup: 0})
+    return _day_range(queryset, 'last_payment_at', filters.get('last_payment_from'), filters.get('last_payment_to'))
+
+
+def filter_list(queryset, filters):
+    """Apply validated list filter data (see ``ListFilterBackend``)."""
+    queryset = _day_range(queryset, 'created_at', filters.get('created_from'), filters.get('created_to'))
+    if filters.get('updated_since'):
+        queryset = queryset.filter(updated_at__gte=window_start(filters['updated_since']))
+    if queryset.model is Client:
+        return filter_clients(queryset, filters)
+
+    queryset = filter_documents(queryset, filters)
+    if filters.get('payment_method'):
+        queryset = queryset.filter(payment_method=filters['payment_method'])
+    if filters.get('total_min') is not None:
+        queryset = queryset.filter(total__gte=filters['total_min'])
+    if filters.get('total_max') is not None:
+        queryset = queryset.filter(total__lte=filters['total_max'])
+    return queryset
+
+
+class ListFilterBackend(BaseFilterBackend):
+    """
+    Server-side filtering of the client, quotation and receipt lists from
+    the query string, e.g. ``?status=PAID&date_from=2024-01-01``. Each filter
+    has a matching composite index (see the model ``Meta.indexes``).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if queryset.model is Client:
+            serializer = ClientListFilterSerializer(data=request.query_params)
+        else:
+            serializer = DocumentListFilterSerializer(data=request.query_params, model=queryset.model)
+        serializer.is_valid(raise_exception=True)
+        return filter_list(queryset, serializer.validated_data)
+
+
+def serialize_filters(filters):
+    """Make validated filter data JSON-safe, e.g. for a job payload."""
+    return {key: value.isoformat() if hasattr(value, 'isoformat') else value for key, value in filters.items()}
@@ -0,0 +1,352 @@
+"""
+Chunked bulk import of clients, quotations and receipts.
+
+Input is CSV, NDJSON or a JSON array, read as a stream. The exports from
+``api.exports`` can be imported back. Records are validated and written
+``IMPORT_CHUNK_SIZE`` at a time, so peak memory is one chunk whatever the
+size of the file. Each chunk costs:
+
+* one query to look up the client emails it mentions;
+* one reservation of QT-/RC- numbers for all of its documents;
+* one ``bulk_create`` for the parents and one for all of their items.
+
+Clients are deduplicated on their unique ``email``, both against the
+database and within the file. Quotations and receipts name their client by
+``client_email``. A row that fails validation is reported with its row
+number and does not stop the import. Each chunk is committed on its own.
+
+``bulk_create`` does not send signals, so each chunk is added to the search
+index, refreshes the billing totals of the clients its documents belong to
+and invalidates the cached list responses explicitly, and the dashboard
+rollup buckets touched by the import are refreshed once at the end.
+"""
+import csv
+import io
+import json
+import time
+from decimal import Decimal
+from itertools import groupby
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import client_totals, response_cache, rollups, search
+from .models import Client, Quotation, QuotationItem, Receipt, ReceiptItem
+from .numbering import allocate_numbers
+from .serializers import QuotationItemSerializer, ReceiptItemSerializer
+
+FORMATS = ['csv', 'ndjson', 'json']
+
+
+class ImportFormatError(ValueError):
+    """The file cannot be parsed any further."""
+
+
+class ClientImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Client
+        fields = ['name', 'email', 'phone', 'address', 'company']
+        # Duplicates are skipped by the importer instead of failing the row
+        extra_kwargs = {'email': {'validators': []}}
+
+
+class QuotationImportSerializer(serializers.ModelSerializer):
+    client_email = serializers.EmailField()
+    items = QuotationItemSerializer(many=True)
+
+    class Meta:
+        model = Quotation
+        fields = ['client_email', 'date', 'valid_until', 'status', 'terms', 'tax', 'notes', 'items']
+
+
+class ReceiptImportSerializer(serializers.ModelSerializer):
+    client_email = serializers.EmailField()
+    items = ReceiptItemSerializer(many=True)
+
+    class Meta:
+        model = Receipt
+        fields = ['client_email', 'date', 'payment_method', 'status', 'tax', 'notes', 'items']
+
+
+def detect_format(filename):
+    """Guess the input format from a file name."""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if name.endswith('.json'):
+        return 'json'
+    raise ImportFormatError('Cannot tell the format from the file name; use .csv, .ndjson or .json.')
+
+
+def _read_csv(stream):
+    for number, row in enumerate(csv.DictReader(stream), start=1):
+        # Empty cells mean "use the default", not an empty string
+        record = {key: value for key, value in row.items() if key and value not in ('', None)}
+        if 'items' in record:
+            try:
+                record['items'] = json.loads(record['items'])
+            except ValueError as exc:
+                yield number, ImportFormatError(f'items is not valid JSON: {exc}')
+                continue
+        yield number, record
+
+
+def _read_ndjson(stream):
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as exc:
+            yield number, ImportFormatError(f'Invalid JSON: {exc}')
+
+
+def _read_json_array(stream, buffer_size=64 * 1024):
+    """Yield the objects of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = stream.read(buffer_size).lstrip()
+    if not buffer.startswith('['):
+        raise ImportFormatError('Expected a JSON array.')
+    buffer = buffer[1:]
+    eof = False
+    number = 0
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if buffer.startswith(']'):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except ValueError:
+            if eof:
+                raise ImportFormatError(f'Malformed JSON after record {number}.')
+            more = stream.read(buffer_size)
+            eof = not more
+            buffer += more
+            continue
+        number += 1
+        yield number, record
+        buffer = buffer[end:]
+
+
+READERS = {'csv': _read_csv, 'ndjson': _read_ndjson, 'json': _read_json_array}
+
+
+def _group_flat_items(records):
+    """
+    Fold flat rows (``item_description``, ``item_quantity`` ...) back into
+    documents with an ``items`` list. Consecutive rows sharing an ``id`` are
+    one document; rows without an ``id`` are a document each.
+    """
+    def key(entry):
+        number, record = entry
+        return number if isinstance(record, Exception) or not record.get('id') else ('id', record['id'])
+
+    for _, rows in groupby(records, key=key):
+        rows = list(rows)
+        number, first = rows[0]
+        if isinstance(first, Exception) or 'item_description' not in first:
+            yield from rows
+            continue
+        document = {k: v for k, v in first.items() if not k.startswith('item_')}
+        document['items'] = [
+            {k[len('item_'):]: v for k, v in record.items() if k.startswith('item_')}
+            for _, record in rows if record.get('item_description')
+        ]
+        yield number, document
+
+
+def read_records(stream, fmt):
+    """
+    Yield ``(row number, record)`` pairs from a binary file. Rows that
+    cannot be parsed are yielded as exceptions.
+    """
+    records = READERS[fmt](io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    if fmt == 'csv':
+        records = _group_flat_items(records)
+    return records
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for entry in iterable:
+        chunk.append(entry)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _until_unreadable(records):
+    """Turn a fatal parse error into a last error row so earlier rows still import."""
+    try:
+        yield from records
+    except (ImportFormatError, UnicodeDecodeError, csv.Error) as exc:
+        yield None, exc
+
+
+class Importer:
+    """Validate and bulk insert records of one model, one chunk at a time."""
+    model = None
+    serializer_class = None
+
+    def __init__(self, chunk_size=None, max_errors=None):
+        self.chunk_size = chunk_size or getattr(settings, 'IMPORT_CHUNK_SIZE', 1000)
+        self.max_errors = max_errors if max_errors is not None else getattr(settings, 'IMPORT_MAX_ERRORS', 1000)
+
+    def run(self, records):
+        """Import ``(row number, record)`` pairs and return a report."""
+        report = {'rows': 0, 'created': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+        self.months = set()
+        started = time.monotonic()
+        try:
+            for chunk in _chunked(_until_unreadable(records), self.chunk_size):
+                report['rows'] += len(chunk)
+                valid = []
+                for number, record in chunk:
+                    errors = self.validate(record)
+                    if errors:
+                        self._fail(report, number, errors)
+                    else:
+                        valid.append((number, record))
+                if valid:
+                    self.import_chunk(valid, report)
+        finally:
+            for month in sorted(self.months):
+                rollups.refresh_month(month, models=[self.model])
+
+        elapsed = time.monotonic() - started
+        report['seconds'] = round(elapsed, 3)
+        report['rows_per_second'] = round(report['rows'] / elapsed, 1) if elapsed else None
+        return report
+
+    def _fail(self, report, number, errors):
+        report['failed'] += 1
+        if len(report['errors']) < self.max_errors:
+            report['errors'].append({'row': number, 'errors': errors})
+
+    def validate(self, record):
+        """Return the errors for ``record`` or replace it by its validated data."""
+        if isinstance(record, Exception):
+            return str(record)
+        if not isinstance(record, dict):
+            return 'Expected an object.'
+        serializer = self.serializer_class(data=record)
+        if not serializer.is_valid():
+            return serializer.errors
+        record.clear()
+        record.update(serializer.validated_data)
+        return None
+
+    def import_chunk(self, valid, report):
+        """Insert one chunk of validated ``(row number, data)`` pairs."""
+        prepared = self.prepare(valid, report)
+        if not prepared:
+            return
+        try:
+            with transaction.atomic():
+                self.insert(prepared)
+                search.index(self.model, [instance.pk for _, instance, *_ in prepared])
+        except DatabaseError as exc:
+            for number, *_ in prepared:
+                self._fail(report, number, f'Database error: {exc}')
+            return
+        response_cache.invalidate(self.model)
+        report['created'] += len(prepared)
+        self.months.update(rollups.month_start(instance.created_at) for _, instance, *_ in prepared)
+
+
+class ClientImporter(Importer):
+    model = Client
+    serializer_class = ClientImportSerializer
+
+    def prepare(self, valid, report):
+        emails = {data['email'] for _, data in valid}
+        seen = set(Client.objects.filter(email__in=emails).values_list('email', flat=True))
+        prepared = []
+        for number, data in valid:
+            if data['email'] in seen:
+                report['skipped'] += 1
+                continue
+            seen.add(data['email'])
+            prepared.append((number, Client(**data)))
+        return prepared
+
+    def insert(self, prepared):
+        Client.objects.bulk_create([client for _, client in prepared])
+
+
+class DocumentImporter(Importer):
+    item_model = None
+
+    def prepare(self, valid, report):
+        emails = {data['client_email'] for _, data in valid}
+        clients = dict(Client.objects.filter(email__in=emails).values_list('email', 'id'))
+        prepared = []
+        for number, data in valid:
+            client_id = clients.get(data.pop('client_email'))
+            if client_id is None:
+                self._fail(report, number, {'client_email': ['No client with this email.']})
+                continue
+            items = [self._build_item(item) for item in data.pop('items')]
+            prepared.append((number, self.build(client_id, data, items), items))
+        return prepared
+
+    def insert(self, prepared):
+        number_field = f'{self.model._meta.model_name}_number'
+        numbers = allocate_numbers(self.model.NUMBER_PREFIX, len(prepared))
+        for (_, document, _), number in zip(prepared, numbers):
+            setattr(document, number_field, number)
+        self.model.objects.bulk_create([document for _, document, _ in prepared])
+
+        parent = self.model._meta.model_name
+        for _, document, items in prepared:
+            for item in items:
+                setattr(item, parent, document)
+        self.item_model.objects.bulk_create([item for _, _, items in prepared for item in items])
+        client_totals.refresh({document.client_id for _, document, _ in prepared})
+
+    def _build_item(self, data):
+        data.pop('id', None)
+        item = self.item_model(**data)
+        item.total = item.quantity * item.unit_price
+        return item
+
+    def build(self, client_id, data, items):
+        subtotal = sum((item.total for item in items), Decimal('0'))
+        data['subtotal'] = subtotal
+        data['total'] = subtotal + data.get('tax', Decimal('0'))
+        return self.model(client_id=client_id, **data)
+
+
+class QuotationImporter(DocumentImporter):
+    model = Quotation
+    item_model = QuotationItem
+    serializer_class = QuotationImportSerializer
+
+    def build(self, client_id, data, items):
+        # The model default is a datetime, which a DateField cannot bulk insert
+        data.setdefault('date', timezone.localdate())
+        return super().build(client_id, data, items)
+
+
+class ReceiptImporter(DocumentImporter):
+    model = Receipt
+    item_model = ReceiptItem
+    serializer_class = ReceiptImportSerializer
+
+
+IMPORTERS = {
+    'clients': ClientImporter,
+    'quotations': QuotationImporter,
+    'receipts': ReceiptImporter,
+}
+
+
+def import_file(kind, stream, fmt, **options):
+    """Import clients, quotations or receipts from a binary file and return the report."""
+    return IMPORTERS[kind](**options).run(read_records(stream, fmt))
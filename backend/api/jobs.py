@@ -0,0 +1,216 @@
+"""
+A small database-backed job queue.
+
+Handlers are registered with ``@register('kind')`` (see ``api.tasks``) and
+jobs are queued with ``enqueue``. The ``run_jobs`` management command claims
+due jobs and runs them on a thread or process pool. A claim is a
+conditional ``UPDATE``, so any number of workers can poll the same table.
+Failed jobs are retried with exponential backoff until ``max_attempts`` is
+reached.
+
+A claim leases the job for ``JOB_LEASE_SECONDS``, and the worker renews the
+lease while the handler runs. A job whose worker died is picked up again
+once its lease (``locked_until``) expires, or marked failed if it has no
+attempts left. Each claim bumps ``attempts``, which identifies it: a worker
+records its outcome only if the job is still running under its attempt, so
+a worker that lost its lease never overwrites the new owner's result.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def register(kind):
+    """Register the decorated function as the handler for ``kind`` jobs."""
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(kind, payload=None, user=None, max_attempts=None):
+    if kind not in _handlers:
+        raise ValueError(f'No job handler registered for {kind!r}')
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        created_by=user if user is not None and user.is_authenticated else None,
+        max_attempts=max_attempts or _setting('JOB_MAX_ATTEMPTS', 5),
+    )
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed ``attempts`` times."""
+    base = _setting('JOB_RETRY_BACKOFF', 30)
+    return min(base * 2 ** (attempts - 1), _setting('JOB_RETRY_BACKOFF_MAX', 3600))
+
+
+def claim():
+    """Atomically mark the next due job as running and return it, or ``None``."""
+    now = timezone.now()
+    expired = Q(status='RUNNING', locked_until__lt=now)
+    abandoned = Job.objects.filter(expired, attempts__gte=F('max_attempts')).update(
+        status='FAILED', locked_until=None, updated_at=now,
+        last_error='The worker stopped renewing its lease and no attempts are left.',
+    )
+    if abandoned:
+        logger.error('%s jobs failed permanently: their worker lost its lease on the last attempt', abandoned)
+    due = Q(status='QUEUED', run_after__lte=now) | (expired & Q(attempts__lt=F('max_attempts')))
+    lease = now + timedelta(seconds=_setting('JOB_LEASE_SECONDS', 600))
+    candidates = Job.objects.filter(due).order_by('run_after', 'id').values_list('id', flat=True)[:10]
+    for job_id in candidates:
+        claimed = Job.objects.filter(due, pk=job_id).update(
+            status='RUNNING', attempts=F('attempts') + 1, locked_until=lease, updated_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def _owned(job):
+    """The job's row, if it is still running under this claim."""
+    return Job.objects.filter(pk=job.pk, status='RUNNING', attempts=job.attempts)
+
+
+@contextmanager
+def _lease_renewed(job):
+    """Extend the job's lease every third of ``JOB_LEASE_SECONDS`` until the block exits."""
+    seconds = _setting('JOB_LEASE_SECONDS', 600)
+    stop = threading.Event()
+
+    def renew():
+        try:
+            while not stop.wait(seconds / 3):
+                try:
+                    if not _owned(job).update(locked_until=timezone.now() + timedelta(seconds=seconds)):
+                        return
+                except DatabaseError:
+                    logger.warning('Could not renew the lease of job %s', job.pk, exc_info=True)
+        finally:
+            # The connections of this thread
+            connections.close_all()
+
+    thread = threading.Thread(target=renew, name=f'job-{job.pk}-lease', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run(job):
+    """Execute a claimed job and record the outcome."""
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f'No job handler registered for {job.kind!r}')
+        with _lease_renewed(job):
+            job.result = handler(**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = 'FAILED'
+            logger.error('Job %s failed permanently after %s attempts', job.pk, job.attempts)
+        else:
+            job.status = 'QUEUED'
+            job.run_after = timezone.now() + timedelta(seconds=backoff(job.attempts))
+            logger.warning('Job %s failed, retrying at %s', job.pk, job.run_after)
+    else:
+        job.status = 'SUCCEEDED'
+        job.last_error = ''
+    job.locked_until = None
+    recorded = _owned(job).update(
+        status=job.status, result=job.result, last_error=job.last_error, run_after=job.run_after,
+        locked_until=None, updated_at=timezone.now(),
+    )
+    if not recorded:
+        logger.error('Job %s attempt %s lost its lease; its outcome was discarded', job.pk, job.attempts)
+        job.refresh_from_db()
+    return job
+
+
+def run_by_id(job_id):
+    """Entry point for pool workers: run an already claimed job."""
+    try:
+        return run(Job.objects.get(pk=job_id)).status
+    finally:
+        close_old_connections()
+
+
+def work(workers=None, pool=None, once=False, poll_interval=1.0, max_jobs=None):
+    """
+    Claim and run jobs until stopped.
+
+    ``pool`` is ``'thread'``, ``'process'`` or ``'inline'`` (run in the
+    calling thread, mainly for tests). With ``once`` the loop exits as soon
+    as the queue has no due jobs left. Returns the number of jobs run.
+    """
+    workers = workers or _setting('JOB_WORKERS', 4)
+    pool = pool or _setting('JOB_POOL', 'thread')
+    processed = 0
+
+    if pool == 'inline':
+        while max_jobs is None or processed < max_jobs:
+            job = claim()
+            if job is None:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+            run(job)
+            processed += 1
+        return processed
+
+    if pool == 'process':
+        # Spawned (not forked) workers never share the parent's DB connections.
+        # django.setup must run before api.jobs is imported in the child.
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job-worker')
+
+    in_flight = set()
+    try:
+        while max_jobs is None or processed < max_jobs:
+            job = claim() if len(in_flight) < workers else None
+            if job is not None:
+                in_flight.add(executor.submit(run_by_id, job.pk))
+                processed += 1
+                continue
+            if not in_flight and once:
+                break
+            done, in_flight = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    logger.error('Job worker crashed', exc_info=future.exception())
+            if not done and not in_flight:
+                time.sleep(poll_interval)
+    finally:
+        executor.shutdown(wait=True)
+        close_old_connections()
+    return processed
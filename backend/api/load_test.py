@@ -0,0 +1,253 @@
+"""
+Concurrency load test of the async endpoints under a real ASGI server.
+
+One uvicorn worker serves ``billing_system.asgi`` from a child process, on
+one event loop. A local SMTP stand-in accepts every message after
+``smtp_delay`` seconds, like a remote relay.
+Each case is then run at increasing concurrency: ``concurrency`` clients
+send requests back to back until ``requests`` have completed, and the
+latency of each one is recorded.
+
+A case holds a concurrency level while its p95 stays within ``degrade``
+times the p95 of one client and no request fails. The report gives the
+highest level each case holds.
+
+PDF cases cycle through different documents, so most requests render cold.
+Run it against a database filled by ``seed_billing``. It needs ``uvicorn``
+and ``httpx``, which the application itself does not. The server runs with
+the current settings plus overrides: PDFs and cached responses go to a
+temporary directory, emails go to the stand-in, and ``CONN_MAX_AGE`` is 0
+as ASGI needs. The benchmark user is deleted afterwards.
+"""
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .benchmark import percentile, scratch_caches
+from .models import Quotation, Receipt
+
+LEVELS = (1, 5, 10, 25, 50, 100)
+USERNAME = 'load-test-runner'
+
+
+class SMTPStandIn:
+    """Minimal SMTP server that accepts every message after ``delay`` seconds."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.messages = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._session, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _session(self, reader, writer):
+        writer.write(b'220 localhost SMTP stand-in\r\n')
+        try:
+            while line := await reader.readline():
+                command = line[:4].upper()
+                if command == b'DATA':
+                    writer.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+                    await writer.drain()
+                    while await reader.readline() not in (b'.\r\n', b''):
+                        pass
+                    await asyncio.sleep(self.delay)
+                    self.messages += 1
+                    writer.write(b'250 OK: queued\r\n')
+                elif command == b'QUIT':
+                    writer.write(b'221 Bye\r\n')
+                    break
+                else:
+                    # EHLO/HELO, MAIL, RCPT, RSET, NOOP
+                    writer.write(b'250 OK\r\n')
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+class ASGIServer:
+    """
+    ``uvicorn billing_system.asgi:application`` in a child process, so the
+    load generator does not compete with it for the GIL. ``overrides`` are
+    settings written to a module that imports the current settings.
+    """
+
+    def __init__(self, directory, overrides):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            self.port = probe.getsockname()[1]
+        lines = [f'from {settings.SETTINGS_MODULE} import *  # noqa: F401,F403']
+        lines.extend(f'{name} = {value!r}' for name, value in overrides.items())
+        Path(directory, 'load_test_settings.py').write_text('\n'.join(lines) + '\n')
+        self.env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'load_test_settings',
+            'PYTHONPATH': os.pathsep.join([directory, str(settings.BASE_DIR), os.environ.get('PYTHONPATH', '')]),
+        }
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'billing_system.asgi:application',
+             '--host', '127.0.0.1', '--port', str(self.port), '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=self.env,
+        )
+        deadline = time.monotonic() + 30
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError('The ASGI server did not start; is uvicorn installed?')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return self
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.__exit__()
+                    raise RuntimeError('The ASGI server did not start in 30 seconds.')
+                time.sleep(0.1)
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+def cases():
+    """``(name, method, path for request n)`` of every case."""
+    quotations, receipts = (
+        list(model.objects.order_by('-created_at').values_list('pk', flat=True)[:1000])
+        for model in (Quotation, Receipt)
+    )
+    if not (quotations and receipts):
+        raise ValueError('The load test needs quotations and receipts; run seed_billing first.')
+
+    def cycle(name, pks, suffix=''):
+        return lambda index: reverse(name, args=[pks[index % len(pks)]]) + suffix
+
+    return [
+        ('dashboard', 'GET', lambda index: reverse('dashboard')),
+        ('quotations.pdf', 'GET', cycle('quotation-pdf', quotations)),
+        ('receipts.pdf', 'GET', cycle('receipt-pdf', receipts)),
+        ('quotations.send_email', 'POST', cycle('quotation-send-email', quotations, '?wait=1')),
+    ]
+
+
+async def _level(client, method, path, concurrency, requests, offset):
+    """Latencies (ms) and status codes of ``requests`` sent by ``concurrency`` clients."""
+    remaining = iter(range(requests))
+    timings, statuses = [], Counter()
+
+    async def worker():
+        for index in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path(offset + index))
+                statuses[str(response.status_code)] += 1
+            except Exception as exc:
+                statuses[type(exc).__name__] += 1
+            timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return timings, statuses, time.perf_counter() - started
+
+
+async def _run_cases(base_url, token, selected, levels, requests):
+    import httpx
+    results = []
+    for name, method, path in selected:
+        offset, rows = 0, []
+        for concurrency in levels:
+            # A fresh pool per level: connections idle past uvicorn's keep-alive are closed under it
+            async with httpx.AsyncClient(
+                base_url=base_url, headers={'Authorization': f'Bearer {token}'}, timeout=60,
+                limits=httpx.Limits(max_connections=concurrency),
+            ) as client:
+                timings, statuses, seconds = await _level(client, method, path, concurrency, requests, offset)
+            offset += requests
+            rows.append({
+                'concurrency': concurrency,
+                'requests': requests,
+                'status': dict(statuses),
+                'p50_ms': round(percentile(timings, 50), 1),
+                'p95_ms': round(percentile(timings, 95), 1),
+                'mean_ms': round(statistics.fmean(timings), 1),
+                'requests_per_second': round(requests / seconds, 1),
+            })
+        results.append({'name': name, 'method': method, 'levels': rows})
+    return results
+
+
+def _holds(levels, degrade):
+    """Highest concurrency whose p95 is within ``degrade`` times that of the first level, without errors."""
+    baseline = levels[0]['p95_ms']
+    held = None
+    for level in levels:
+        if set(level['status']) - {'200', '202'} or level['p95_ms'] > baseline * degrade:
+            break
+        held = level['concurrency']
+    return held
+
+
+def run(levels=LEVELS, requests=100, smtp_delay=0.05, degrade=2.0, only=None):
+    """Load test every case (or those whose name starts with ``only``) and return the report."""
+    import httpx  # noqa: F401  fail before starting anything
+    levels = sorted(set(levels))
+    selected = [case for case in cases() if not only or any(case[0].startswith(prefix) for prefix in only)]
+    smtp = SMTPStandIn(delay=smtp_delay)
+
+    async def main(scratch, token):
+        smtp_port = await smtp.start()
+        overrides = {
+            'PDF_CACHE_DIR': f'{scratch}/pdf',
+            'CACHES': scratch_caches(f'{scratch}/caches'),
+            'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': '127.0.0.1',
+            'EMAIL_PORT': smtp_port,
+            'EMAIL_USE_TLS': False,
+            'EMAIL_USE_SSL': False,
+            'EMAIL_HOST_USER': '',
+            'EMAIL_HOST_PASSWORD': '',
+            # Nearly every request is slow at the top levels
+            'SLOW_REQUEST_MS': 60 * 1000,
+            # Every ASGI request opens its own connections
+            'DATABASES': {
+                alias: {**config, 'CONN_MAX_AGE': 0} for alias, config in settings.DATABASES.items()
+            },
+        }
+        try:
+            with ASGIServer(scratch, overrides) as server:
+                return await _run_cases(f'http://127.0.0.1:{server.port}', token, selected, levels, requests)
+        finally:
+            await smtp.stop()
+
+    user = User.objects.create_user(USERNAME)
+    try:
+        with tempfile.TemporaryDirectory() as scratch:
+            results = asyncio.run(main(scratch, str(AccessToken.for_user(user))))
+    finally:
+        user.delete()
+
+    for result in results:
+        result['holds_concurrency'] = _holds(result['levels'], degrade)
+    return {
+        'smtp_delay_ms': round(smtp_delay * 1000, 1),
+        'smtp_messages': smtp.messages,
+        'degrade': degrade,
+        'results': results,
+    }
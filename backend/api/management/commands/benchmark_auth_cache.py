@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from api.benchmark import compare, run
+
+HOT = ['clients.list', 'quotations.list', 'receipts.list', 'dashboard']
+
+
+class Command(BaseCommand):
+    help = 'Compare hot endpoints with the JWT user read from the database and from the user cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50, help='Requests per endpoint')
+        parser.add_argument('--only', nargs='+', metavar='PREFIX', default=HOT,
+                            help='Only cases whose name starts with PREFIX')
+        parser.add_argument('--json', action='store_true', help='Print the comparison as JSON')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        try:
+            with override_settings(AUTH_USER_CACHE_SECONDS=0):
+                uncached = run(repeat=options['repeat'], only=options['only'])
+            cached = run(repeat=options['repeat'], only=options['only'])
+        except ValueError as exc:
+            raise CommandError(exc)
+        changes = compare(uncached, cached)
+
+        if options['json']:
+            self.stdout.write(json.dumps(changes, indent=2))
+            return
+        for change in changes:
+            (old_p50, new_p50), (old_queries, new_queries) = change['p50_ms'], change['queries']
+            self.stdout.write(
+                f"{change['name']:<26} p50 {old_p50:>8.2f} -> {new_p50:>8.2f} ms ({change['p50_ratio']}x)  "
+                f"queries {old_queries} -> {new_queries}"
+            )
@@ -0,0 +1,73 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.models import Client, Quotation, Receipt
+
+
+def _time(client, url, repeat, **headers):
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = client.get(url, **headers)
+            timings.append((time.perf_counter() - started) * 1000)
+    return response, statistics.median(timings), len(ctx.captured_queries)
+
+
+class Command(BaseCommand):
+    help = 'Compare full GETs of the list/detail endpoints with conditional GETs answered by 304'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per case')
+        parser.add_argument('--page-size', type=int, default=200)
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        client = APIClient()
+        # An unsaved user is enough for IsAuthenticated and writes nothing
+        client.force_authenticate(User(username='benchmark'))
+
+        urls = [
+            reverse(f'{name}-list') + f"?page_size={options['page_size']}"
+            for name in ('client', 'quotation', 'receipt')
+        ]
+        for model in (Client, Quotation, Receipt):
+            pk = model.objects.values_list('pk', flat=True).first()
+            if pk is not None:
+                urls.append(reverse(f'{model._meta.model_name}-detail', args=[pk]))
+
+        results = []
+        for url in urls:
+            full, full_ms, full_queries = _time(client, url, options['repeat'])
+            cached, cached_ms, cached_queries = _time(
+                client, url, options['repeat'], HTTP_IF_NONE_MATCH=full['ETag'],
+            )
+            results.append({
+                'url': url,
+                'full_ms': round(full_ms, 3),
+                'full_queries': full_queries,
+                'full_bytes': len(full.content),
+                'not_modified_ms': round(cached_ms, 3),
+                'not_modified_queries': cached_queries,
+                'not_modified_status': cached.status_code,
+                'speedup': round(full_ms / cached_ms, 1) if cached_ms else None,
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write(
+                f"{result['url']:<40} 200: {result['full_ms']:>8.2f} ms {result['full_queries']:>2} queries "
+                f"{result['full_bytes']:>8} B | {result['not_modified_status']}: "
+                f"{result['not_modified_ms']:>7.2f} ms {result['not_modified_queries']:>2} queries "
+                f"({result['speedup']}x)"
+            )
@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import compare, run
+
+
+class Command(BaseCommand):
+    help = 'Measure p50/p95/p99 latency and query counts of every API endpoint (run seed_billing first)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Requests per endpoint')
+        parser.add_argument('--only', nargs='+', metavar='PREFIX', help='Only cases whose name starts with PREFIX')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+        parser.add_argument('--compare', metavar='BASELINE', help='Report saved from another commit to compare with')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        try:
+            report = run(repeat=options['repeat'], only=options['only'])
+        except ValueError as exc:
+            raise CommandError(exc)
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                report['comparison'] = compare(json.load(baseline), report)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for result in report['results']:
+            self.stdout.write(
+                f"{result['name']:<26} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+                f"p99 {result['p99_ms']:>9.2f} ms  {result['queries']:>3} queries  {result['status']}"
+            )
+        for change in report.get('comparison', []):
+            (old_p50, new_p50), (old_queries, new_queries) = change['p50_ms'], change['queries']
+            self.stdout.write(
+                f"{change['name']:<26} p50 {old_p50:>9.2f} -> {new_p50:>9.2f} ms ({change['p50_ratio']}x)  "
+                f"queries {old_queries} -> {new_queries}"
+            )
@@ -0,0 +1,81 @@
+import json
+import re
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.filters import filter_list
+from api.models import Client, Quotation, Receipt
+from api.pagination import KeysetPagination
+
+
+def _cases():
+    today = timezone.localdate()
+    month_ago = today - timedelta(days=30)
+    client_id = Client.objects.values_list('id', flat=True).first() or 1
+    return [
+        ('quotations ?status=SENT', Quotation, {'status': 'SENT'}, None),
+        ('quotations ?client=', Quotation, {'client': client_id}, None),
+        ('quotations ?date_from=&ordering=-date', Quotation, {'date_from': month_ago}, ('-date', '-id')),
+        ('quotations ?total_min=1000&ordering=-total', Quotation, {'total_min': Decimal('1000')}, ('-total', '-id')),
+        ('receipts ?status=PAID', Receipt, {'status': 'PAID'}, None),
+        ('receipts ?client=', Receipt, {'client': client_id}, None),
+        ('receipts ?payment_method=CASH&date_from=', Receipt, {'payment_method': 'CASH', 'date_from': month_ago}, None),
+        ('receipts ?date_from=&date_to=', Receipt, {'date_from': month_ago, 'date_to': today}, None),
+        ('receipts ?created_from=', Receipt, {'created_from': month_ago}, None),
+        ('receipts ?total_min=1000&ordering=-total', Receipt, {'total_min': Decimal('1000')}, ('-total', '-id')),
+        ('clients ?created_from=', Client, {'created_from': month_ago}, None),
+        ('clients ?total_paid_min=1000&ordering=-total_paid', Client, {'total_paid_min': Decimal('1000')},
+         ('-total_paid', '-id')),
+        ('clients ?last_payment_from=&ordering=-last_payment_at', Client, {'last_payment_from': month_ago},
+         ('-last_payment_at', '-id')),
+        ('clients ?has_open_quotations=true', Client, {'has_open_quotations': True}, ('-open_quotation_count', '-id')),
+    ]
+
+
+def full_scans(plan, table):
+    """Plan lines that read every row of ``table`` instead of searching an index."""
+    return [line for line in plan.splitlines() if re.search(rf'\bSCAN {table}\b', line)]
+
+
+class Command(BaseCommand):
+    help = 'Time the filtered list queries and check that each one searches an index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+        parser.add_argument('--check', action='store_true', help='Fail if any query does a full table scan')
+
+    def handle(self, *args, **options):
+        results = []
+        for name, model, filters, ordering in _cases():
+            queryset = filter_list(model.objects.all(), filters)
+            queryset = queryset.order_by(*(ordering or KeysetPagination.ordering))[:KeysetPagination.page_size + 1]
+            plan = queryset.explain()
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            results.append({
+                'query': name,
+                'plan': plan.splitlines(),
+                'full_scan': bool(full_scans(plan, model._meta.db_table)),
+                'median_ms': round(statistics.median(timings), 3),
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            for result in results:
+                marker = self.style.ERROR('FULL SCAN') if result['full_scan'] else self.style.SUCCESS('index')
+                self.stdout.write(f"{result['median_ms']:>9.3f} ms  {marker:<9}  {result['query']}")
+                for line in result['plan']:
+                    self.stdout.write(f'              {line}')
+
+        if options['check'] and any(result['full_scan'] for result in results):
+            raise CommandError('Some filtered queries do a full table scan.')
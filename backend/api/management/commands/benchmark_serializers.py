@@ -0,0 +1,69 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.readers import ValuesReader
+from api.renderers import FastJSONRenderer, orjson
+from api.views import ClientViewSet, QuotationViewSet, ReceiptViewSet
+
+
+def _time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = 'Compare ModelSerializer + JSONRenderer with the values() read path and the orjson renderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows serialized per model')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        results = []
+        for viewset in (ClientViewSet, QuotationViewSet, ReceiptViewSet):
+            queryset = viewset.queryset.order_by('-created_at', '-id')
+            serializer_class = viewset.serializer_class
+            reader = ValuesReader(serializer_class)
+            count = queryset[:rows].count()
+            if not count:
+                raise CommandError('No rows to serialize; run seed_billing first.')
+
+            serialized, serializer_ms = _time(lambda: serializer_class(queryset[:rows], many=True).data, repeat)
+            lean, values_ms = _time(lambda: reader.rows(reader.queryset(queryset)[:rows]), repeat)
+            expected, json_ms = _time(lambda: JSONRenderer().render(serialized), repeat)
+            rendered, fast_ms = _time(lambda: FastJSONRenderer().render(lean), repeat)
+            results.append({
+                'model': queryset.model._meta.model_name,
+                'rows': count,
+                'bytes': len(expected),
+                'identical': rendered == expected and JSONRenderer().render(lean) == expected,
+                'serializer_ms': round(serializer_ms, 1),
+                'values_ms': round(values_ms, 1),
+                'json_render_ms': round(json_ms, 1),
+                'fast_render_ms': round(fast_ms, 1),
+                'speedup': round((serializer_ms + json_ms) / (values_ms + fast_ms), 1),
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps({'orjson': orjson is not None, 'results': results}, indent=2))
+            return
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; FastJSONRenderer uses the json module'))
+        for result in results:
+            marker = self.style.SUCCESS('identical') if result['identical'] else self.style.ERROR('DIFFERENT')
+            self.stdout.write(
+                f"{result['model']:<10} {result['rows']:>6} rows {result['bytes'] / 1024:>8.0f} KiB  "
+                f"serializer {result['serializer_ms']:>7.1f} + render {result['json_render_ms']:>6.1f} ms | "
+                f"values {result['values_ms']:>6.1f} + render {result['fast_render_ms']:>5.1f} ms  "
+                f"({result['speedup']}x, {marker})"
+            )
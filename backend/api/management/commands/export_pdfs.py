@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.filters import DocumentFilterSerializer, filter_documents
+from api.models import Quotation, Receipt
+from api.utils.pdf_export import stream_pdf_zip
+
+MODELS = {'quotations': Quotation, 'receipts': Receipt}
+
+
+class Command(BaseCommand):
+    help = 'Render every quotation or receipt matching a filter into a ZIP of PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('document', choices=list(MODELS))
+        parser.add_argument('--output', help='Archive path (default: <document>.zip)')
+        parser.add_argument('--status', help='e.g. SENT or PAID')
+        parser.add_argument('--date-from', help='YYYY-MM-DD, inclusive')
+        parser.add_argument('--date-to', help='YYYY-MM-DD, inclusive')
+        parser.add_argument('--client', type=int, help='Client id')
+        parser.add_argument('--workers', type=int, help='Rendering processes')
+
+    def handle(self, *args, **options):
+        model = MODELS[options['document']]
+        filters = DocumentFilterSerializer(
+            data={
+                key: options[key] for key in ('status', 'date_from', 'date_to', 'client')
+                if options[key] is not None
+            },
+            model=model,
+        )
+        if not filters.is_valid():
+            raise CommandError(filters.errors)
+
+        queryset = filter_documents(model.objects.all(), filters.validated_data)
+        count = queryset.count()
+        output = options['output'] or f"{options['document']}.zip"
+        started = time.monotonic()
+        with open(output, 'wb') as archive:
+            for chunk in stream_pdf_zip(queryset, workers=options['workers'], pool='process'):
+                archive.write(chunk)
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {count} PDFs to {output} in {elapsed:.1f}s ({rate:.1f} documents/s)'
+        ))
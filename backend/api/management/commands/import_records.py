@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import FORMATS, IMPORTERS, ImportFormatError, detect_format, import_file
+
+
+class Command(BaseCommand):
+    help = 'Bulk import clients, quotations or receipts from a CSV, NDJSON or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, help='Records per transaction')
+        parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            fmt = options['format'] or detect_format(options['path'])
+        except ImportFormatError as exc:
+            raise CommandError(exc)
+
+        with open(options['path'], 'rb') as stream:
+            report = import_file(options['kind'], stream, fmt, chunk_size=options['chunk_size'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, default=str))
+            return
+        for error in report['errors']:
+            self.stdout.write(f"Row {error['row']}: {json.dumps(error['errors'], default=str)}")
+        style = self.style.SUCCESS if not report['failed'] else self.style.WARNING
+        self.stdout.write(style(
+            f"{report['rows']} rows: created {report['created']}, skipped {report['skipped']}, "
+            f"failed {report['failed']} in {report['seconds']}s ({report['rows_per_second']} rows/s)"
+        ))
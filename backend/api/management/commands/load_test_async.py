@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.load_test import LEVELS, run
+
+
+class Command(BaseCommand):
+    help = 'Load test the async PDF/email/read endpoints under uvicorn against a local SMTP stand-in'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--levels', type=int, nargs='+', default=list(LEVELS), help='Concurrent clients per step')
+        parser.add_argument('--requests', type=int, default=100, help='Requests per case and level')
+        parser.add_argument('--smtp-delay', type=float, default=50,
+                            help='Milliseconds the SMTP stand-in takes per message')
+        parser.add_argument('--degrade', type=float, default=2.0,
+                            help='p95 growth over one client at which latency counts as degraded')
+        parser.add_argument('--only', nargs='+', metavar='PREFIX', help='Only cases whose name starts with PREFIX')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or min(options['levels']) < 1:
+            raise CommandError('--requests and --levels must be at least 1')
+        try:
+            report = run(
+                levels=options['levels'], requests=options['requests'], smtp_delay=options['smtp_delay'] / 1000,
+                degrade=options['degrade'], only=options['only'],
+            )
+        except ImportError as exc:
+            raise CommandError(f'{exc}; the load test needs: pip install uvicorn httpx')
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for result in report['results']:
+            self.stdout.write(f"{result['method']} {result['name']}")
+            for level in result['levels']:
+                self.stdout.write(
+                    f"  {level['concurrency']:>4} concurrent  p50 {level['p50_ms']:>8.1f} ms  "
+                    f"p95 {level['p95_ms']:>8.1f} ms  {level['requests_per_second']:>7.1f} req/s  {level['status']}"
+                )
+            self.stdout.write(f"  holds {result['holds_concurrency']} concurrent before p95 > {report['degrade']}x")
+        self.stdout.write(
+            f"SMTP stand-in received {report['smtp_messages']} messages ({report['smtp_delay_ms']} ms each)"
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api import sync
+
+
+class Command(BaseCommand):
+    help = 'Delete deletion tombstones older than TOMBSTONE_RETENTION_DAYS'
+
+    def handle(self, *args, **options):
+        deleted = sync.prune()
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} tombstones older than {sync.horizon():%Y-%m-%d %H:%M}'))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import search
+
+
+class Command(BaseCommand):
+    help = 'Recreate the full-text search index from the client, quotation and receipt tables'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        counts = search.rebuild()
+        if counts is None:
+            self.stdout.write('The database has no full-text index; search matches the tables directly.')
+            return
+        elapsed = time.monotonic() - started
+        summary = ', '.join(f'{count} {kind}s' for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Indexed {summary} in {elapsed:.1f}s'))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import client_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute every client's billing totals from its quotations and receipts and fix any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drifted clients without fixing them')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        drifted = client_totals.refresh(dry_run=options['dry_run'])
+        elapsed = time.monotonic() - started
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(drifted)} clients with drifted totals in {elapsed:.1f}s'))
+        if drifted and options['verbosity'] > 1:
+            self.stdout.write('Client ids: ' + ', '.join(str(pk) for pk in drifted))
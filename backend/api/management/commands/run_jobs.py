@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (e.g. quotation and receipt emails)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'JOB_WORKERS', 4),
+            help='Number of jobs to run concurrently',
+        )
+        parser.add_argument(
+            '--pool', choices=['thread', 'process', 'inline'],
+            default=getattr(settings, 'JOB_POOL', 'thread'),
+            help='Run jobs on a thread pool, a process pool or in this thread',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait between polls when the queue is empty',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once no due jobs are left instead of polling forever',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Running jobs on a {options['pool']} pool with {options['workers']} worker(s)"
+        )
+        try:
+            processed = jobs.work(
+                workers=options['workers'],
+                pool=options['pool'],
+                once=options['once'],
+                poll_interval=options['poll_interval'],
+            )
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} job(s)'))
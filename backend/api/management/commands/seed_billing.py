@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.seed import seed
+
+
+class Command(BaseCommand):
+    help = 'Insert synthetic clients, quotations and receipts in bulk (for load testing and benchmarks)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=100)
+        parser.add_argument('--quotations', type=int, default=1000)
+        parser.add_argument('--receipts', type=int, default=1000)
+        parser.add_argument('--items', type=int, nargs=2, default=[1, 6], metavar=('MIN', 'MAX'),
+                            help='Line items per document')
+        parser.add_argument('--days', type=int, default=365, help='Spread creation dates over this many days')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert and transaction')
+        parser.add_argument('--seed', type=int, help='Random seed, for repeatable data')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        low, high = options['items']
+        if not 0 <= low <= high:
+            raise CommandError('--items MIN MAX needs 0 <= MIN <= MAX')
+        try:
+            report = seed(
+                clients=options['clients'], quotations=options['quotations'], receipts=options['receipts'],
+                items=(low, high), days=options['days'], batch_size=options['batch_size'], seed=options['seed'],
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['clients']} clients, {report['quotations']} quotations and "
+            f"{report['receipts']} receipts in {report['seconds']}s"
+        ))
@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from api.tasks import bulk_send_emails
+
+
+class Command(BaseCommand):
+    help = 'Email every quotation or receipt matching a filter over pooled SMTP connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('document', choices=['quotations', 'receipts'])
+        parser.add_argument('--status', help='e.g. SENT or PAID')
+        parser.add_argument('--date-from', help='YYYY-MM-DD, inclusive')
+        parser.add_argument('--date-to', help='YYYY-MM-DD, inclusive')
+        parser.add_argument('--client', type=int, help='Client id')
+        parser.add_argument('--render-workers', type=int, help='Threads rendering PDFs')
+        parser.add_argument('--connections', type=int, help='SMTP connections to send over')
+        parser.add_argument('--json', action='store_true', help='Print the per-message report as JSON')
+
+    def handle(self, *args, **options):
+        filters = {
+            key: options[key] for key in ('status', 'date_from', 'date_to', 'client')
+            if options[key] is not None
+        }
+        try:
+            report = bulk_send_emails(
+                options['document'].rstrip('s'),
+                filters,
+                render_workers=options['render_workers'],
+                connections=options['connections'],
+            )
+        except ValidationError as exc:
+            raise CommandError(exc.detail)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for result in report['results']:
+            line = f"{result['number']}: {result['status']}"
+            if result.get('error'):
+                line += f" ({result['error']})"
+            self.stdout.write(line)
+        style = self.style.SUCCESS if not report['failed'] else self.style.WARNING
+        self.stdout.write(style(f"Sent {report['sent']}, failed {report['failed']}"))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api import db_router
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database over a SQLite read replica stand-in'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='replica', help='Alias of the replica to overwrite')
+
+    def handle(self, *args, **options):
+        if options['database'] not in connections:
+            raise CommandError(
+                f"No database alias {options['database']!r}; set SQLITE_REPLICA to the replica file."
+            )
+        started = time.monotonic()
+        try:
+            path = db_router.sync_sqlite_replica(options['database'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f'Copied the primary to {path} in {time.monotonic() - started:.1f}s'))
@@ -0,0 +1,225 @@
+"""
+In-process request and task metrics, exported in the Prometheus text format.
+
+``api.middleware.MetricsMiddleware`` times every request and counts its
+database queries. Work worth watching on its own (PDF rendering, SMTP) is
+wrapped in ``timed``. Each timer feeds a histogram and, when it runs inside
+a request, also that request's ``Server-Timing`` header.
+
+The series live in the memory of each worker process. With several workers,
+every process must be scraped separately (or run with a single worker), and
+the series start again from zero on restart, which Prometheus handles for
+counters and histograms.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+# Upper bounds in seconds; +Inf is implied
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += amount
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, key, value
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._lock = threading.Lock()
+        # labels -> [count per bucket (not cumulative), sum]
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f'{self.name}_bucket', key + (('le', _number(bound)),), cumulative
+            yield f'{self.name}_sum', key, total
+            yield f'{self.name}_count', key, cumulative
+
+    def snapshot(self, **labels):
+        """``(count, sum)`` of one series, mostly for tests and benchmarks."""
+        with self._lock:
+            counts, total = self._series.get(tuple(sorted(labels.items())), ([0], 0.0))
+            return sum(counts), total
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args)
+            return metric
+
+    def counter(self, name, documentation):
+        return self._get_or_create(Counter, name, documentation)
+
+    def histogram(self, name, documentation, buckets=DURATION_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, buckets)
+
+    def clear(self):
+        """Reset every series to zero (the metrics stay registered)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    'billing_http_request_duration_seconds', 'Time spent handling a request, by view and method.',
+)
+REQUEST_QUERIES = registry.histogram(
+    'billing_http_request_db_queries', 'Database queries run per request, by view and method.',
+    QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_DURATION = registry.histogram(
+    'billing_http_request_db_duration_seconds', 'Time spent in the database per request, by view and method.',
+)
+REQUESTS = registry.counter('billing_http_requests_total', 'Requests handled, by view, method and status code.')
+PDF_RENDER_DURATION = registry.histogram(
+    'billing_pdf_render_duration_seconds', 'Time spent rendering a PDF, by document type.',
+)
+EMAIL_SEND_DURATION = registry.histogram(
+    'billing_email_send_duration_seconds', 'Time spent handing an email to the SMTP server, by document type.',
+)
+
+
+class RequestTimings:
+    """What one request spent where, for its ``Server-Timing`` header."""
+
+    def __init__(self):
+        self.queries = 0
+        self.durations = defaultdict(float)
+
+    def add(self, name, seconds):
+        self.durations[name] += seconds
+
+
+_current = ContextVar('request_timings', default=None)
+
+
+def start_request():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    ``execute_wrapper`` on every database connection (``api.signals``):
+    counts the query and its time towards the request running it, if any.
+    Going by the request's context, not by connection, also catches queries
+    that async views run in ``sync_to_async`` threads.
+    """
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.add('db', perf_counter() - start)
+
+
+@contextmanager
+def timed(metric, server_timing=None, **labels):
+    """
+    Observe the time spent in the block (or decorated function) in the
+    histogram ``metric``. Inside a request the time is also added to its
+    ``Server-Timing`` entry named ``server_timing``.
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - start
+        metric.observe(elapsed, **labels)
+        timings = _current.get()
+        if timings is not None and server_timing:
+            timings.add(server_timing, elapsed)
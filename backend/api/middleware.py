@@ -0,0 +1,134 @@
+import logging
+from contextlib import contextmanager
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import db_router, metrics
+
+logger = logging.getLogger('api.slow_requests')
+
+
+def _view_name(request):
+    """Route name used as the ``view`` label; bounded, unlike the path."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route or 'unnamed'
+
+
+class MetricsMiddleware:
+    """
+    Times each request and counts its database queries and time spent in
+    the database (``metrics.record_query``, so it works with
+    ``DEBUG = False``).
+
+    The numbers go into ``api.metrics`` and a ``Server-Timing`` header
+    (``total``, ``db`` and any ``timed`` block such as ``pdf`` or
+    ``smtp``). Requests slower than ``SLOW_REQUEST_MS`` are logged as
+    warnings on ``api.slow_requests``. Streaming responses are measured
+    up to the first byte.
+
+    Both middlewares here run sync or async to match the handler, so under
+    ASGI they do not push the async views (``api.async_views``) onto a
+    thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    @contextmanager
+    def _measure(self):
+        timings, token = metrics.start_request()
+        try:
+            yield timings
+        finally:
+            metrics.end_request(token)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = perf_counter()
+        with self._measure() as timings:
+            response = self.get_response(request)
+        return self._record(request, response, timings, perf_counter() - start)
+
+    async def __acall__(self, request):
+        start = perf_counter()
+        with self._measure() as timings:
+            response = await self.get_response(request)
+        return self._record(request, response, timings, perf_counter() - start)
+
+    def _record(self, request, response, timings, elapsed):
+        labels = {'view': _view_name(request), 'method': request.method}
+        db_seconds = timings.durations.get('db', 0.0)
+        metrics.REQUEST_DURATION.observe(elapsed, **labels)
+        metrics.REQUEST_QUERIES.observe(timings.queries, **labels)
+        metrics.REQUEST_DB_DURATION.observe(db_seconds, **labels)
+        metrics.REQUESTS.inc(status=response.status_code, **labels)
+
+        entries = [
+            f'total;dur={elapsed * 1000:.1f}',
+            f'db;dur={db_seconds * 1000:.1f};desc="{timings.queries} queries"',
+        ]
+        entries.extend(
+            f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.durations.items() if name != 'db'
+        )
+        response['Server-Timing'] = ', '.join(entries)
+
+        if elapsed * 1000 >= getattr(settings, 'SLOW_REQUEST_MS', 1000):
+            logger.warning(
+                'Slow request: %s %s -> %s in %.0f ms (%s queries, %.0f ms in the database)',
+                request.method, request.get_full_path(), response.status_code,
+                elapsed * 1000, timings.queries, db_seconds * 1000,
+            )
+        return response
+
+
+class DatabaseRoutingMiddleware:
+    """
+    Scopes ``api.db_router`` decisions to the request and pins the user to
+    the primary database after a request that wrote.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        routing, token = db_router.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.end_request(token)
+        self._pin(request, routing)
+        return response
+
+    async def __acall__(self, request):
+        routing, token = db_router.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.end_request(token)
+        self._pin(request, routing)
+        return response
+
+    def _pin(self, request, routing):
+        # DRF copies the authenticated user onto the Django request
+        user_id = getattr(getattr(request, 'user', None), 'pk', None)
+        if routing.wrote and user_id is not None and db_router.replicas():
+            db_router.pin(user_id)
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:46
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_monthly_stats(apps, schema_editor):
+    MonthlyStats = apps.get_model('api', 'MonthlyStats')
+    buckets = defaultdict(dict)
+
+    def month_rows(model_name, **aggregates):
+        model = apps.get_model('api', model_name)
+        rows = (
+            model.objects.annotate(month=TruncMonth('created_at'))
+            .values('month').annotate(**aggregates).order_by()
+        )
+        for row in rows:
+            month = row.pop('month').date().replace(day=1)
+            buckets[month].update(row)
+
+    month_rows('Client', new_clients=Count('id'))
+    month_rows(
+        'Quotation',
+        quotations=Count('id'),
+        pending_quotations=Count('id', filter=Q(status__in=['DRAFT', 'SENT'])),
+    )
+    month_rows('Receipt', receipts=Count('id'), revenue=Sum('total'))
+
+    MonthlyStats.objects.bulk_create([
+        MonthlyStats(month=month, **{**values, 'revenue': values.get('revenue') or Decimal('0')})
+        for month, values in buckets.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_client_email_alter_client_phone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('new_clients', models.PositiveIntegerField(default=0)),
+                ('quotations', models.PositiveIntegerField(default=0)),
+                ('pending_quotations', models.PositiveIntegerField(default=0)),
+                ('receipts', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['created_at'], name='api_client_created_c50471_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quotation',
+            index=models.Index(fields=['created_at'], name='api_quotati_created_0841b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['created_at'], name='api_receipt_created_e7552d_idx'),
+        ),
+        migrations.RunPython(backfill_monthly_stats, migrations.RunPython.noop),
+    ]
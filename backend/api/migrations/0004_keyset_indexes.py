@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_monthlystats'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='client',
+            name='api_client_created_c50471_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='quotation',
+            name='api_quotati_created_0841b1_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='receipt',
+            name='api_receipt_created_e7552d_idx',
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['created_at', 'id'], name='api_client_created_4d5e49_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quotation',
+            index=models.Index(fields=['created_at', 'id'], name='api_quotati_created_b246b4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['created_at', 'id'], name='api_receipt_created_6bae86_idx'),
+        ),
+    ]
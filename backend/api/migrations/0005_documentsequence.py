@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    DocumentSequence = apps.get_model('api', 'DocumentSequence')
+    for prefix, model_name, field in (
+        ('QT', 'Quotation', 'quotation_number'),
+        ('RC', 'Receipt', 'receipt_number'),
+    ):
+        model = apps.get_model('api', model_name)
+        numbers = model.objects.values_list(field, flat=True).iterator()
+        last_value = max((int(number.split('-')[1]) for number in numbers), default=0)
+        DocumentSequence.objects.create(prefix=prefix, last_value=last_value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('prefix', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('last_value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
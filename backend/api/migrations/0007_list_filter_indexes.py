@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['name', 'id'], name='api_client_name_af6b72_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quotation',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='api_quotati_status_91f0e5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quotation',
+            index=models.Index(fields=['client', 'created_at', 'id'], name='api_quotati_client__a8a1a1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quotation',
+            index=models.Index(fields=['date', 'id'], name='api_quotati_date_98ba78_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quotation',
+            index=models.Index(fields=['valid_until', 'id'], name='api_quotati_valid_u_dbf5e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quotation',
+            index=models.Index(fields=['total', 'id'], name='api_quotati_total_0f4526_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='api_receipt_status_48d56c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['client', 'created_at', 'id'], name='api_receipt_client__5a20c5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['payment_method', 'date', 'id'], name='api_receipt_payment_fa52a6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['date', 'id'], name='api_receipt_date_d87002_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['total', 'id'], name='api_receipt_total_ccc798_idx'),
+        ),
+    ]
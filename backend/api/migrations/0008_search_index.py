@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE api_search_index USING fts5("
+        "kind UNINDEXED, object_id UNINDEXED, title, client, body, "
+        "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+    )
+    client_details = "c.name || ' ' || c.company || ' ' || c.email"
+    schema_editor.execute(
+        "INSERT INTO api_search_index (rowid, kind, object_id, title, client, body) "
+        "SELECT d.id * 3 + 0, 'client', d.id, d.name, d.company || ' ' || d.email, '' FROM api_client d"
+    )
+    schema_editor.execute(
+        "INSERT INTO api_search_index (rowid, kind, object_id, title, client, body) "
+        f"SELECT d.id * 3 + 1, 'quotation', d.id, d.quotation_number, {client_details}, "
+        "d.notes || ' ' || d.terms || ' ' || COALESCE((SELECT group_concat(i.description, ' ') "
+        "FROM api_quotationitem i WHERE i.quotation_id = d.id), '') "
+        "FROM api_quotation d JOIN api_client c ON c.id = d.client_id"
+    )
+    schema_editor.execute(
+        "INSERT INTO api_search_index (rowid, kind, object_id, title, client, body) "
+        f"SELECT d.id * 3 + 2, 'receipt', d.id, d.receipt_number, {client_details}, "
+        "d.notes || ' ' || COALESCE((SELECT group_concat(i.description, ' ') "
+        "FROM api_receiptitem i WHERE i.receipt_id = d.id), '') "
+        "FROM api_receipt d JOIN api_client c ON c.id = d.client_id"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS api_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_list_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-deleted_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['updated_at', 'id'], name='api_client_updated_db5faa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quotation',
+            index=models.Index(fields=['updated_at', 'id'], name='api_quotati_updated_0a31fc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['updated_at', 'id'], name='api_receipt_updated_a50afc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['model', 'deleted_at'], name='api_tombsto_model_6abb81_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:33
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_client_totals(apps, schema_editor):
+    Client = apps.get_model('api', 'Client')
+    Quotation = apps.get_model('api', 'Quotation')
+    Receipt = apps.get_model('api', 'Receipt')
+    paid = Receipt.objects.filter(client=OuterRef('pk'), status='PAID').order_by().values('client')
+    open_quotations = (
+        Quotation.objects.filter(client=OuterRef('pk'), status__in=['DRAFT', 'SENT']).order_by().values('client')
+    )
+    Client.objects.update(
+        receipt_count=Coalesce(Subquery(paid.annotate(value=Count('pk')).values('value')), 0),
+        total_paid=Coalesce(
+            Subquery(paid.annotate(value=Sum('total')).values('value')), Decimal('0'),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+        open_quotation_count=Coalesce(Subquery(open_quotations.annotate(value=Count('pk')).values('value')), 0),
+        last_payment_at=Subquery(paid.annotate(value=Max('date')).values('value')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_tombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='last_payment_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='open_quotation_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='receipt_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='total_paid',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['total_paid', 'id'], name='api_client_total_p_e5ad34_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['receipt_count', 'id'], name='api_client_receipt_147932_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['open_quotation_count', 'id'], name='api_client_open_qu_e2aae3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['last_payment_at', 'id'], name='api_client_last_pa_248364_idx'),
+        ),
+        migrations.RunPython(populate_client_totals, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,49 @@
-from django.db import models
+from django.db import connections, models, router
 from django.utils import timezone
 import uuid
 
 
+class DocumentSequenceManager(models.Manager):
+    def reserve(self, prefix, count=1, connection=None):
+        """
+        Atomically advance the sequence for ``prefix`` by ``count`` and
+        return the last value of the reserved block.
+
+        This is a single ``UPDATE ... RETURNING`` statement, so concurrent
+        callers can never be handed the same number.
+        """
+        if connection is None:
+            connection = connections[router.db_for_write(self.model)]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET "last_value" = "last_value" + %s '
+                f'WHERE "prefix" = %s RETURNING "last_value"',
+                [count, prefix],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                # First document with this prefix: create the row, then retry
+                cursor.execute(
+                    f'INSERT INTO {table} ("prefix", "last_value") VALUES (%s, 0) '
+                    f'ON CONFLICT ("prefix") DO NOTHING',
+                    [prefix],
+                )
+                return self.reserve(prefix, count, connection)
+        return row[0]
+
+
+class DocumentSequence(models.Model):
+    """Last number handed out for each document prefix (QT, RC)"""
+    prefix = models.CharField(max_length=10, primary_key=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    objects = DocumentSequenceManager()
+
+    def __str__(self):
+        return f"{self.prefix}-{self.last_value:05d}"
+
+
 class Client(models.Model):
     """Client model for storing customer information"""
     name = models.CharField(max_length=200)
@@ -10,17 +51,44 @@ class Client(models.Model):
     phone = models.CharField(max_length=50)
     address = models.TextField(blank=True)
     company = models.CharField(max_length=200, blank=True)
+    # Billing aggregates, maintained by api.client_totals
+    receipt_count = models.PositiveIntegerField(default=0, editable=False)
+    total_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    open_quotation_count = models.PositiveIntegerField(default=0, editable=False)
+    last_payment_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['updated_at', 'id']),
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['total_paid', 'id']),
+            models.Index(fields=['receipt_count', 'id']),
+            models.Index(fields=['open_quotation_count', 'id']),
+            models.Index(fields=['last_payment_at', 'id']),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Quotation(models.Model):
+class LoadedClientMixin:
+    """
+    Remembers the client a document had when it was loaded, so moving it to
+    another client can update both clients' aggregates.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_client_id = instance.__dict__.get('client_id')
+        return instance
+
+
+class Quotation(LoadedClientMixin, models.Model):
     """Quotation model for managing event quotations"""
     STATUS_CHOICES = [
         ('DRAFT', 'Draft'),
@@ -28,6 +96,7 @@ class Quotation(models.Model):
         ('ACCEPTED', 'Accepted'),
         ('REJECTED', 'Rejected'),
     ]
+    NUMBER_PREFIX = 'QT'
 
     quotation_number = models.CharField(max_length=50, unique=True, editable=False)
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='quotations')
@@ -44,20 +113,25 @@ class Quotation(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        # Every list filter is an equality prefix followed by the keyset
+        # ordering columns, so a filtered page is one index range scan
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['updated_at', 'id']),
+            models.Index(fields=['status', 'created_at', 'id']),
+            models.Index(fields=['client', 'created_at', 'id']),
+            models.Index(fields=['date', 'id']),
+            models.Index(fields=['valid_until', 'id']),
+            models.Index(fields=['total', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.quotation_number} - {self.client.name}"
 
     def save(self, *args, **kwargs):
         if not self.quotation_number:
-            # Generate unique quotation number
-            last_quotation = Quotation.objects.order_by('-id').first()
-            if last_quotation:
-                last_num = int(last_quotation.quotation_number.split('-')[1])
-                new_num = last_num + 1
-            else:
-                new_num = 1
-            self.quotation_number = f'QT-{new_num:05d}'
+            from .numbering import next_number
+            self.quotation_number = next_number(self.NUMBER_PREFIX)
         super().save(*args, **kwargs)
 
 
@@ -77,7 +151,7 @@ class QuotationItem(models.Model):
         return f"{self.description} - {self.quotation.quotation_number}"
 
 
-class Receipt(models.Model):
+class Receipt(LoadedClientMixin, models.Model):
     """Receipt model for managing payments"""
     STATUS_CHOICES = [
         ('PAID', 'Paid'),
@@ -92,6 +166,7 @@ class Receipt(models.Model):
         ('MOBILE_MONEY', 'Mobile Money'),
         ('CHECK', 'Check'),
     ]
+    NUMBER_PREFIX = 'RC'
 
     receipt_number = models.CharField(max_length=50, unique=True, editable=False)
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='receipts')
@@ -107,20 +182,24 @@ class Receipt(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        # See Quotation.Meta
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['updated_at', 'id']),
+            models.Index(fields=['status', 'created_at', 'id']),
+            models.Index(fields=['client', 'created_at', 'id']),
+            models.Index(fields=['payment_method', 'date', 'id']),
+            models.Index(fields=['date', 'id']),
+            models.Index(fields=['total', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.receipt_number} - {self.client.name}"
 
     def save(self, *args, **kwargs):
         if not self.receipt_number:
-            # Generate unique receipt number
-            last_receipt = Receipt.objects.order_by('-id').first()
-            if last_receipt:
-                last_num = int(last_receipt.receipt_number.split('-')[1])
-                new_num = last_num + 1
-            else:
-                new_num = 1
-            self.receipt_number = f'RC-{new_num:05d}'
+            from .numbering import next_number
+            self.receipt_number = next_number(self.NUMBER_PREFIX)
         super().save(*args, **kwargs)
 
 
@@ -138,3 +217,66 @@ class ReceiptItem(models.Model):
 
     def __str__(self):
         return f"{self.description} - {self.receipt.receipt_number}"
+
+
+class MonthlyStats(models.Model):
+    """Per-month dashboard rollup maintained by the signals in api.signals"""
+    month = models.DateField(unique=True)
+    new_clients = models.PositiveIntegerField(default=0)
+    quotations = models.PositiveIntegerField(default=0)
+    pending_quotations = models.PositiveIntegerField(default=0)
+    receipts = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-month']
+
+    def __str__(self):
+        return self.month.strftime('%Y-%m')
+
+
+class Job(models.Model):
+    """Background job executed by the run_jobs management command"""
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        'auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class Tombstone(models.Model):
+    """Deleted client, quotation or receipt, kept so delta syncs see the deletion"""
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-deleted_at']
+        indexes = [models.Index(fields=['model', 'deleted_at'])]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
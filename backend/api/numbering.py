@@ -0,0 +1,77 @@
+"""
+Document number allocation for quotations (QT-) and receipts (RC-).
+
+Numbers come from the ``DocumentSequence`` table, one row per prefix, which
+is advanced with a single atomic ``UPDATE ... RETURNING``.
+
+With ``DOCUMENT_NUMBER_BLOCK_SIZE`` greater than 1 each worker process
+reserves that many numbers at a time and hands them out from memory. The
+block is reserved on a separate autocommit connection so that it survives a
+rollback of the caller's transaction. Numbers stay unique but are no longer
+gap-free or strictly ordered across processes. Keep the default of 1 on
+SQLite, where that extra connection has to wait for any open write
+transaction.
+"""
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router
+
+from .models import DocumentSequence
+
+
+def format_number(prefix, value):
+    return f'{prefix}-{value:05d}'
+
+
+class NumberAllocator:
+    def __init__(self, block_size=None):
+        self._block_size = block_size
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    @property
+    def block_size(self):
+        if self._block_size is not None:
+            return self._block_size
+        return getattr(settings, 'DOCUMENT_NUMBER_BLOCK_SIZE', 1)
+
+    def allocate(self, prefix, count=1):
+        """Return a ``range`` of ``count`` fresh numbers for ``prefix``."""
+        if self.block_size <= 1 or count >= self.block_size:
+            last = DocumentSequence.objects.reserve(prefix, count)
+            return range(last - count + 1, last + 1)
+
+        with self._lock:
+            next_value, end = self._blocks.get(prefix, (1, 0))
+            if end - next_value + 1 < count:
+                end = self._reserve_block(prefix)
+                next_value = end - self.block_size + 1
+            self._blocks[prefix] = (next_value + count, end)
+        return range(next_value, next_value + count)
+
+    def _reserve_block(self, prefix):
+        alias = router.db_for_write(DocumentSequence) or DEFAULT_DB_ALIAS
+        connection = connections.create_connection(alias)
+        try:
+            return DocumentSequence.objects.reserve(prefix, self.block_size, connection)
+        finally:
+            connection.close()
+
+    def reset(self):
+        """Forget reserved blocks (the unused numbers are skipped)."""
+        with self._lock:
+            self._blocks.clear()
+
+
+allocator = NumberAllocator()
+
+
+def next_number(prefix):
+    """Allocate one formatted document number, e.g. ``QT-00042``."""
+    return format_number(prefix, allocator.allocate(prefix)[0])
+
+
+def allocate_numbers(prefix, count):
+    """Allocate ``count`` formatted document numbers in one reservation."""
+    return [format_number(prefix, value) for value in allocator.allocate(prefix, count)]
@@ -0,0 +1,177 @@
+"""
+Keyset pagination for the billing list endpoints.
+
+DRF's ``CursorPagination`` only keys on the first ordering field and falls
+back to an OFFSET to step over rows that share that value. Here the cursor
+carries the full position of the last row, one value per ordering field, and
+the next page is selected with a lexicographic ``WHERE`` on those values, so
+every page is a bounded index range scan regardless of how deep it is.
+
+Nullable ordering fields (a client's ``last_payment_at``) sort NULL as the
+smallest value in both directions, so NULLs come first ascending and last
+descending on every database, and the cursor can hold a NULL position.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections.abc import Mapping
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _reverse(ordering):
+    return tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+
+def _encode_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on a unique, composite ordering such as
+    ``('-created_at', '-id')``.
+
+    The primary key is appended to any ordering that does not already end
+    with it so that positions are unique and rows inserted concurrently are
+    never skipped or repeated.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(super().get_ordering(request, queryset, view))
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            descending = ordering[-1].startswith('-')
+            ordering += ('-id' if descending else 'id',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = [queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+        self.cursor = self.decode_cursor(request)
+
+        reverse = bool(self.cursor and self.cursor['reverse'])
+        ordering = _reverse(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*self._order_by(ordering))
+        if self.cursor is not None:
+            queryset = queryset.filter(self._after(ordering, self.cursor['position']))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        # Taken now: rows from values() are turned into the output in place
+        self.first_position, self.last_position = (
+            (self._get_position_from_instance(self.page[0], self.ordering),
+             self._get_position_from_instance(self.page[-1], self.ordering))
+            if self.page else (None, None)
+        )
+        return self.page
+
+    def _order_by(self, ordering):
+        """``ordering`` with NULLs placed as the smallest value of nullable fields."""
+        expressions = []
+        for name, field in zip(ordering, self.fields):
+            if not field.null:
+                expressions.append(name)
+            elif name.startswith('-'):
+                expressions.append(F(name[1:]).desc(nulls_last=True))
+            else:
+                expressions.append(F(name).asc(nulls_first=True))
+        return expressions
+
+    def _after(self, ordering, position):
+        """Build ``(f1, f2, ...) > (v1, v2, ...)`` honouring each field's direction."""
+        condition = Q()
+        equal = Q()
+        for name, field, value in zip(ordering, self.fields, position):
+            attr = name.lstrip('-')
+            descending = name.startswith('-')
+            if value is None:
+                # NULL is the smallest value: only non-NULLs follow it ascending
+                if not descending:
+                    condition |= equal & Q(**{f'{attr}__isnull': False})
+                equal &= Q(**{f'{attr}__isnull': True})
+                continue
+            beyond = Q(**{f'{attr}__lt' if descending else f'{attr}__gt': value})
+            if descending and field.null:
+                beyond |= Q(**{f'{attr}__isnull': True})
+            condition |= equal & beyond
+            equal &= Q(**{attr: value})
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for field in self.fields:
+            if isinstance(instance, Mapping):
+                value = instance[field.attname] if field.attname in instance else instance[field.name]
+            else:
+                value = getattr(instance, field.attname)
+            position.append(_encode_value(value))
+        return position
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            raw_position = payload['p']
+            if len(raw_position) != len(self.fields):
+                raise ValueError('cursor does not match ordering')
+            position = [field.to_python(value) for field, value in zip(self.fields, raw_position)]
+            return {'position': position, 'reverse': bool(payload.get('r'))}
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position, reverse=False):
+        payload = {'p': position}
+        if reverse:
+            payload['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.last_position)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.first_position, reverse=True)
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Page numbers for ranked search results, which have no stable keyset to
+    paginate on. Searches are selective and rarely paged deeply.
+    """
+    page_size = getattr(settings, 'SEARCH_PAGE_SIZE', 20)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
@@ -0,0 +1,175 @@
+"""
+Read path for the client, quotation and receipt lists without model
+instances or per-row serializer calls.
+
+A ``ValuesReader`` is built from the viewset's ``ModelSerializer``. It reads
+the page with ``.values()``: the client's name and email are annotated from
+the join and line items come from one extra query, grouped by document.
+Each row is then turned into the dict the serializer would produce, same
+keys in the same order. Every column has a converter that is picked once per
+reader:
+
+* text, integer, choice and primary key columns are passed through as read;
+* decimals already at the field's scale (what the database returns) are
+  formatted directly; anything else goes through the DRF field;
+* ISO 8601 datetimes are converted to the field's time zone, looked up
+  once per reader rather than once per value;
+* dates and any other field use the DRF field's ``to_representation``.
+
+Only ``list`` takes this path (``ValuesListMixin``). Writes and ``retrieve``
+keep the regular serializers. ``?fields=`` / ``?expand=`` (``api.fieldsets``)
+narrow the columns read.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import ISO_8601
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+PASSTHROUGH = (
+    serializers.CharField, serializers.IntegerField, serializers.ChoiceField, serializers.PrimaryKeyRelatedField,
+)
+
+
+def _decimal(field):
+    """``DecimalField.to_representation``, minus the quantize for values already at scale."""
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    exponent = -field.decimal_places
+
+    def convert(value):
+        if isinstance(value, Decimal) and value.as_tuple().exponent == exponent:
+            return format(value, 'f')
+        return field.to_representation(value)
+    return convert
+
+
+def _datetime(field):
+    """``DateTimeField.to_representation`` with the time zone looked up once, not per value."""
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if not isinstance(value, datetime) or timezone.is_naive(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def _converter(field):
+    if isinstance(field, serializers.DecimalField):
+        return _decimal(field)
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime(field)
+    if isinstance(field, PASSTHROUGH):
+        return None
+    return field.to_representation
+
+
+class ValuesReader:
+    """
+    Serializes ``.values()`` rows exactly like ``serializer_class(many=True).data``.
+    ``fields`` limits the output to those names (see ``api.fieldsets``);
+    ``extra`` are model columns read but not output, such as the ordering
+    a cursor is built from.
+    """
+
+    def __init__(self, serializer_class, context=None, fields=None, extra=()):
+        serializer = serializer_class(context=context or {})
+        self.model = serializer.Meta.model
+        self.annotations = {}
+        self.columns = []
+        self.converters = []
+        self.nested = {}
+        # (key in the output, key in the values() row) in serializer order
+        self.layout = []
+        for name, field in serializer.fields.items():
+            if field.write_only or (fields is not None and name not in fields):
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                self.nested[name] = ValuesReader(type(field.child), context)
+                self.layout.append((name, name))
+                continue
+            column = field.source
+            if '.' in column:
+                column = name
+                self.annotations[name] = F(field.source.replace('.', '__'))
+            self.columns.append(column)
+            self.layout.append((name, column))
+            convert = _converter(field)
+            if convert is not None:
+                self.converters.append((column, convert))
+        if self.nested:
+            extra = ['id', *extra]
+        self.columns.extend(column for column in dict.fromkeys(extra) if column not in self.columns)
+        # values() rows already have the right keys in the right order
+        self.in_order = (
+            not self.nested and len(self.columns) == len(self.layout)
+            and all(name == column for name, column in self.layout)
+        )
+
+    def queryset(self, queryset):
+        """``queryset`` narrowed to the values this reader needs."""
+        queryset = queryset.prefetch_related(None)
+        if self.annotations:
+            queryset = queryset.annotate(**self.annotations)
+        return queryset.values(*self.columns)
+
+    def _children(self, name, parent_ids):
+        """Rows of the ``name`` relation per parent id, in primary key order like the prefetch."""
+        reader = self.nested[name]
+        parent = self.model._meta.get_field(name).field.name
+        queryset = reader.queryset(reader.model.objects.filter(**{f'{parent}__in': parent_ids}).order_by('pk'))
+        children = list(queryset.values(*reader.columns, parent))
+        parents = [row.pop(parent) for row in children]
+        grouped = {pk: [] for pk in parent_ids}
+        for parent_id, row in zip(parents, reader.rows(children)):
+            grouped[parent_id].append(row)
+        return grouped
+
+    def rows(self, rows):
+        """The representation of ``rows`` (from ``queryset``), in order."""
+        rows = list(rows)
+        ids = [row['id'] for row in rows]
+        nested = {name: self._children(name, ids) for name in self.nested} if rows else {}
+        results = []
+        for row in rows:
+            for column, convert in self.converters:
+                value = row[column]
+                if value is not None:
+                    row[column] = convert(value)
+            if not self.in_order:
+                for name, children in nested.items():
+                    row[name] = children[row['id']]
+                row = {name: row[column] for name, column in self.layout}
+            results.append(row)
+        return results
+
+
+class ValuesListMixin:
+    """Serves ``list`` through a ``ValuesReader`` of the viewset's serializer."""
+
+    def get_reader(self, queryset):
+        fields = self.get_field_selection() if hasattr(self, 'get_field_selection') else None
+        extra = []
+        if fields is not None and self.paginator is not None:
+            # The cursor is built from the ordering columns of the last row
+            extra = [name.lstrip('-') for name in self.paginator.get_ordering(self.request, queryset, self)]
+        return ValuesReader(self.get_serializer_class(), self.get_serializer_context(), fields, extra)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        reader = self.get_reader(queryset)
+        queryset = reader.queryset(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(reader.rows(page))
+        return Response(reader.rows(queryset))
@@ -0,0 +1,87 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` encoding with orjson when it is installed, with the
+    same output byte for byte except for two cases the billing payloads
+    never hit:
+
+    * floats in exponent notation come out as ``1e-7`` rather than
+      ``1e-07``;
+    * NaN and infinite floats become ``null``, where DRF's strict encoder
+      raises ``ValueError``.
+
+    Datetimes, decimals, lazy strings and anything else orjson does not
+    handle natively go through DRF's ``JSONEncoder``, so ``Z`` suffixes and
+    decimals come out as before. Falls back to the standard encoder without
+    orjson, for indented output (``; indent=`` in the Accept header) and for
+    values orjson rejects, such as integers beyond 64 bits.
+    """
+    _options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+    _default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self._default, option=self._options)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped by JSONRenderer for JavaScript embedding
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class BinaryRenderer(BaseRenderer):
+    """
+    Lets content negotiation accept a non-JSON media type on actions that
+    return a ``FileResponse`` or ``StreamingHttpResponse``. Those responses
+    bypass rendering; error payloads are still encoded as JSON.
+    """
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return JSONRenderer().render(data)
+
+
+class PDFRenderer(BinaryRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class ZIPRenderer(BinaryRenderer):
+    media_type = 'application/zip'
+    format = 'zip'
+
+
+class CSVRenderer(BinaryRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(BinaryRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Prometheus text exposition format; error payloads stay JSON."""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        return JSONRenderer().render(data)
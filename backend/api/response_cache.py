@@ -0,0 +1,200 @@
+"""
+Per-user cache of rendered ``GET`` responses of the client, quotation and
+receipt endpoints.
+
+Entries are stored in the ``RESPONSE_CACHE_ALIAS`` cache. By default that
+is a file-based cache, which every worker process on the host shares.
+Switch it to locmem for a single-process server. The cache's
+``MAX_ENTRIES`` bounds its size, and the backend culls old entries past
+that.
+
+Invalidation is by generation. Every cached response records the current
+token of the generations it depends on:
+
+* a list depends on its model (any row added, changed or deleted) and on
+  the models it embeds (``etag_related``: a document list shows client
+  names);
+* a detail depends on that one object.
+
+``api.signals`` replaces the tokens on ``post_save`` / ``post_delete`` of
+clients, quotations, receipts and their line items. It replaces them again
+once the transaction commits, so a response rendered from the old rows
+while the write was in flight is never kept. A client change also bumps
+the details of that client's documents, which show its name. Bulk writes
+that skip signals (``api.imports``, ``api.seed``) call ``invalidate``
+themselves. A generation evicted from the cache gets a fresh token, so an
+eviction can only cause a miss, never a stale hit.
+
+A hit costs one ``get_many`` and no database query. It still honours
+``If-None-Match`` / ``If-Modified-Since`` with the stored validators.
+
+A response read from a lagging replica (``api.db_router``) may predate a
+write whose invalidation already happened, so it is only kept for the
+replica sticky period.
+"""
+import hashlib
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.http import HttpResponse
+
+from . import db_router, metrics
+
+HEADERS = ['Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Vary']
+
+LOOKUPS = metrics.registry.counter(
+    'billing_response_cache_lookups_total', 'Response cache lookups, by model and result (hit, miss, stale).',
+)
+
+
+def _cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'responses')]
+
+
+def enabled():
+    return getattr(settings, 'RESPONSE_CACHE_ENABLED', True)
+
+
+def _generation_key(model_name, pk=None):
+    return f'gen:{model_name}' if pk is None else f'gen:{model_name}:{pk}'
+
+
+def _new_token():
+    return uuid.uuid4().hex[:16]
+
+
+def generations(keys):
+    """Current token of each generation key, creating the missing ones."""
+    cache = _cache()
+    tokens = cache.get_many(keys)
+    missing = {key: _new_token() for key in keys if key not in tokens}
+    for key, token in missing.items():
+        # add() so concurrent first readers agree on one token
+        if not cache.add(key, token, timeout=None):
+            token = cache.get(key) or token
+        tokens[key] = token
+    return tokens
+
+
+def invalidate(model, pks=None):
+    """
+    Invalidate the lists of ``model`` and, if given, the details of ``pks``.
+    Safe to call outside a request and for models without cached responses.
+    """
+    keys = [_generation_key(model._meta.model_name)]
+    keys.extend(_generation_key(model._meta.model_name, pk) for pk in pks or ())
+    _cache().set_many({key: _new_token() for key in keys}, timeout=None)
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.stores = 0
+
+    def record(self, model_name, result):
+        with self._lock:
+            setattr(self, result, getattr(self, result) + 1)
+        if result != 'stores':
+            LOOKUPS.inc(model=model_name, result={'hits': 'hit', 'misses': 'miss', 'stale': 'stale'}[result])
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = self.stale = self.stores = 0
+
+    def as_dict(self):
+        cache_settings = settings.CACHES.get(getattr(settings, 'RESPONSE_CACHE_ALIAS', 'responses'), {})
+        with self._lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                'enabled': enabled(),
+                'backend': cache_settings.get('BACKEND'),
+                'max_entries': cache_settings.get('OPTIONS', {}).get('MAX_ENTRIES', 300),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'stores': self.stores,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+stats = Stats()
+
+
+class ResponseCacheMixin:
+    """
+    Serves ``list`` and ``retrieve`` from the response cache. Goes before
+    ``ConditionalGetMixin`` in the bases, so a hit also skips its validator
+    query.
+    """
+
+    def _entry_key(self, request):
+        user = request.user.pk if request.user.is_authenticated else 'anonymous'
+        variant = f'{request.accepted_renderer.format}:{request.get_full_path()}'
+        return f'response:{user}:{hashlib.sha256(variant.encode()).hexdigest()[:32]}'
+
+    def _dependencies(self, pk=None):
+        model_name = self.queryset.model._meta.model_name
+        if pk is not None:
+            return [_generation_key(model_name, pk)]
+        related = [self.queryset.model._meta.get_field(name).related_model for name in self.etag_related]
+        return [_generation_key(model_name)] + [_generation_key(model._meta.model_name) for model in related]
+
+    def _from_cache(self, entry):
+        response = HttpResponse(entry['content'], status=entry['status'])
+        for name, value in entry['headers'].items():
+            response[name] = value
+        return response
+
+    def _cached(self, request, dependencies, render):
+        model_name = self.queryset.model._meta.model_name
+        if not enabled():
+            return render()
+
+        cache = _cache()
+        key = self._entry_key(request)
+        tokens = generations(dependencies)
+        entry = cache.get(key)
+        if entry is not None and entry['dependencies'] == tokens:
+            stats.record(model_name, 'hits')
+            return self._conditional(
+                (entry['etag'], entry['last_modified']), lambda: self._from_cache(entry),
+            )
+        stats.record(model_name, 'stale' if entry is not None else 'misses')
+
+        response = render()
+        if response.status_code == 200 and not response.streaming:
+            etag, last_modified = getattr(self, '_validators', (None, None))
+            timeout = db_router.sticky_seconds() if db_router.reading_from_replica() else DEFAULT_TIMEOUT
+
+            def store(rendered):
+                cache.set(key, {
+                    'dependencies': tokens,
+                    'status': rendered.status_code,
+                    'content': rendered.content,
+                    'headers': {name: rendered[name] for name in HEADERS if rendered.has_header(name)},
+                    'etag': etag,
+                    'last_modified': last_modified,
+                }, timeout=timeout)
+                stats.record(model_name, 'stores')
+
+            # Stored once rendered, so a hit skips the renderer too
+            response.add_post_render_callback(store)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(
+            request, self._dependencies(), lambda: super(ResponseCacheMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self._cached(
+            request, self._dependencies(pk),
+            lambda: super(ResponseCacheMixin, self).retrieve(request, *args, **kwargs),
+        )
@@ -0,0 +1,132 @@
+"""
+Monthly dashboard rollups.
+
+Every client, quotation and receipt belongs to the month of its ``created_at``
+(which never changes), so a write only ever invalidates a single bucket. The
+signal handlers in ``api.signals`` call ``refresh_month`` for that bucket and
+the dashboard reads a handful of ``MonthlyStats`` rows instead of the raw
+tables.
+"""
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Client, MonthlyStats, Quotation, Receipt
+
+PENDING_QUOTATION_STATUSES = ('DRAFT', 'SENT')
+
+
+def month_start(value):
+    """Return the first day of the (local) month containing ``value``."""
+    if isinstance(value, datetime):
+        value = timezone.localtime(value) if timezone.is_aware(value) else value
+        value = value.date()
+    return value.replace(day=1)
+
+
+def _month_bounds(month):
+    start = timezone.make_aware(datetime.combine(month, time.min))
+    if month.month == 12:
+        following = month.replace(year=month.year + 1, month=1)
+    else:
+        following = month.replace(month=month.month + 1)
+    end = timezone.make_aware(datetime.combine(following, time.min))
+    return start, end
+
+
+def _client_counters(start, end):
+    return {
+        'new_clients': Client.objects.filter(created_at__gte=start, created_at__lt=end).count(),
+    }
+
+
+def _quotation_counters(start, end):
+    totals = Quotation.objects.filter(created_at__gte=start, created_at__lt=end).aggregate(
+        quotations=Count('id'),
+        pending_quotations=Count('id', filter=Q(status__in=PENDING_QUOTATION_STATUSES)),
+    )
+    return totals
+
+
+def _receipt_counters(start, end):
+    totals = Receipt.objects.filter(created_at__gte=start, created_at__lt=end).aggregate(
+        receipts=Count('id'),
+        revenue=Sum('total'),
+    )
+    totals['revenue'] = totals['revenue'] or Decimal('0')
+    return totals
+
+
+COUNTERS = {
+    Client: _client_counters,
+    Quotation: _quotation_counters,
+    Receipt: _receipt_counters,
+}
+
+
+def refresh_month(month, models=None):
+    """
+    Recompute the rollup bucket for ``month``.
+
+    ``models`` limits the work to the counters owned by those models; by
+    default every counter of the bucket is recomputed.
+    """
+    month = month_start(month)
+    start, end = _month_bounds(month)
+    values = {}
+    for model in models or COUNTERS:
+        values.update(COUNTERS[model](start, end))
+    MonthlyStats.objects.update_or_create(month=month, defaults=values)
+
+
+def rebuild():
+    """Recompute every bucket from scratch, e.g. after bulk inserts."""
+    months = set()
+    for model in COUNTERS:
+        months.update(
+            month_start(row['month'])
+            for row in model.objects.annotate(month=TruncMonth('created_at'))
+            .values('month').distinct().order_by()
+        )
+    MonthlyStats.objects.exclude(month__in=months).delete()
+    for month in sorted(months):
+        refresh_month(month)
+
+
+DASHBOARD_TOTALS = {
+    'total_clients': Sum('new_clients'),
+    'total_quotations': Sum('quotations'),
+    'pending_quotations': Sum('pending_quotations'),
+    'total_receipts': Sum('receipts'),
+    'total_revenue': Sum('revenue'),
+}
+
+
+def _dashboard(totals, this_month):
+    return {
+        'total_clients': totals['total_clients'] or 0,
+        'new_clients_this_month': this_month.new_clients if this_month else 0,
+        'total_quotations': totals['total_quotations'] or 0,
+        'pending_quotations': totals['pending_quotations'] or 0,
+        'total_receipts': totals['total_receipts'] or 0,
+        'receipts_this_month': this_month.receipts if this_month else 0,
+        'total_revenue': totals['total_revenue'] or Decimal('0'),
+        'revenue_this_month': this_month.revenue if this_month else Decimal('0'),
+    }
+
+
+def dashboard_stats(now=None):
+    """Return the dashboard figures from the rollup table."""
+    current = month_start(now or timezone.now())
+    totals = MonthlyStats.objects.aggregate(**DASHBOARD_TOTALS)
+    return _dashboard(totals, MonthlyStats.objects.filter(month=current).first())
+
+
+async def adashboard_stats(now=None):
+    """``dashboard_stats`` with the async ORM."""
+    current = month_start(now or timezone.now())
+    totals = await MonthlyStats.objects.aaggregate(**DASHBOARD_TOTALS)
+    return _dashboard(totals, await MonthlyStats.objects.filter(month=current).afirst())
@@ -0,0 +1,251 @@
+"""
+Full-text search over clients, quotations and receipts (SQLite FTS5).
+
+``api_search_index`` is an FTS5 table with one row per client, quotation and
+receipt. Each row has three weighted columns:
+
+* ``title``: the client name or the document number;
+* ``client``: the document's client name, company and email, or a client's
+  company and email;
+* ``body``: quotation notes and terms, receipt notes, and the descriptions
+  of every line item.
+
+A query like ``marquee tent acme`` therefore finds the quotation whose items
+mention a marquee tent and whose client is ACME. The rowid is derived from
+the object's type and primary key, so a row is replaced with a rowid lookup
+and never a scan. Rows are rebuilt with ``INSERT ... SELECT`` straight from
+the billing tables.
+
+``api.signals`` keeps the index current. A document is reindexed once its
+transaction commits, because the serializers write line items after saving
+the parent. Bulk writes that skip signals (``api.imports``) call ``index``
+themselves. ``rebuild_search_index`` recreates every row.
+
+FTS5 is SQLite only, and migration 0008 creates the table only there. On
+other databases indexing does nothing, and ``SearchResults`` falls back to
+case-insensitive ``LIKE`` matching of the same columns. That fallback is
+unranked, has no snippets, and scans the tables.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import CharField, Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Concat
+
+from .models import Client, Quotation, QuotationItem, Receipt, ReceiptItem
+
+TABLE = 'api_search_index'
+KINDS = {Client: 'client', Quotation: 'quotation', Receipt: 'receipt'}
+# bm25 weights for kind, object_id, title, client, body
+WEIGHTS = (0.0, 0.0, 10.0, 5.0, 1.0)
+
+_CLIENT_DETAILS = "{c}.name || ' ' || {c}.company || ' ' || {c}.email"
+
+
+def _rowid_sql(model, alias):
+    return f'{alias}.id * {len(KINDS)} + {list(KINDS).index(model)}'
+
+
+def _select_sql(model):
+    """``SELECT`` producing the index rows of ``model``; the main table is aliased ``d``."""
+    table = model._meta.db_table
+    if model is Client:
+        return (
+            f"SELECT {_rowid_sql(model, 'd')}, 'client', d.id, d.name, d.company || ' ' || d.email, '' "
+            f'FROM {table} d'
+        )
+    item_model = QuotationItem if model is Quotation else ReceiptItem
+    body = "d.notes || ' ' || d.terms" if model is Quotation else 'd.notes'
+    items = (
+        f"(SELECT group_concat(i.description, ' ') FROM {item_model._meta.db_table} i "
+        f'WHERE i.{model._meta.model_name}_id = d.id)'
+    )
+    return (
+        f"SELECT {_rowid_sql(model, 'd')}, '{KINDS[model]}', d.id, d.{model._meta.model_name}_number, "
+        f"{_CLIENT_DETAILS.format(c='c')}, {body} || ' ' || COALESCE({items}, '') "
+        f'FROM {table} d JOIN {Client._meta.db_table} c ON c.id = d.client_id'
+    )
+
+
+def available(connection):
+    """Whether ``connection`` has the FTS5 index table."""
+    return connection.vendor == 'sqlite'
+
+
+def _replace(model, where, params):
+    """Delete and re-insert the index rows of the ``model`` rows matching ``where``."""
+    connection = connections[router.db_for_write(model)]
+    if not available(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid IN '
+            f"(SELECT {_rowid_sql(model, 'd')} FROM {model._meta.db_table} d WHERE {where})",
+            params,
+        )
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, kind, object_id, title, client, body) {_select_sql(model)} WHERE {where}',
+            params,
+        )
+
+
+def index(model, pks):
+    """(Re)index the given clients, quotations or receipts."""
+    if not available(connections[router.db_for_write(model)]):
+        return
+    pks = list(pks)
+    for start in range(0, len(pks), 500):
+        chunk = pks[start:start + 500]
+        _replace(model, f'd.id IN ({", ".join(["%s"] * len(chunk))})', chunk)
+
+
+def index_client(client_id):
+    """Reindex a client and every document that shows its details."""
+    if not available(connections[router.db_for_write(Client)]):
+        return
+    index(Client, [client_id])
+    for model in (Quotation, Receipt):
+        _replace(model, 'd.client_id = %s', [client_id])
+
+
+def remove(model, pk):
+    connection = connections[router.db_for_write(model)]
+    if not available(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            [pk * len(KINDS) + list(KINDS).index(model)],
+        )
+
+
+def rebuild():
+    """
+    Recreate the whole index and return the number of rows per type, or
+    ``None`` if the database has no index.
+    """
+    connection = connections[router.db_for_write(Client)]
+    if not available(connection):
+        return None
+    counts = {}
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        for model, kind in KINDS.items():
+            cursor.execute(f'INSERT INTO {TABLE} (rowid, kind, object_id, title, client, body) {_select_sql(model)}')
+            counts[kind] = cursor.rowcount
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return counts
+
+
+def match_query(text):
+    """
+    Turn free text into an FTS5 query: every word must match, and the last
+    one may be a prefix (search as you type). Returns ``None`` if ``text``
+    has no words.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _like_queryset(text, kind, using):
+    """
+    Results of ``text`` without the FTS5 index: every word must occur in one
+    of the indexed columns. Returns ``(type, object_id, title, details)`` rows.
+    """
+    words = re.findall(r'\w+', text)
+    rows = []
+    for model, name in KINDS.items():
+        if kind and kind != name:
+            continue
+        if model is Client:
+            fields = ['name', 'company', 'email']
+            title = F('name')
+            details = Concat('company', Value(' '), 'email', output_field=CharField())
+        else:
+            number = f'{model._meta.model_name}_number'
+            fields = [number, 'notes', 'client__name', 'client__company', 'client__email']
+            if model is Quotation:
+                fields.append('terms')
+            title = F(number)
+            details = Concat(
+                'client__name', Value(' '), 'client__company', Value(' '), 'client__email', output_field=CharField(),
+            )
+            item_model = QuotationItem if model is Quotation else ReceiptItem
+        condition = Q()
+        for word in words:
+            matches = Q()
+            for field in fields:
+                matches |= Q(**{f'{field}__icontains': word})
+            if model is not Client:
+                matches |= Exists(item_model.objects.filter(
+                    **{model._meta.model_name: OuterRef('pk'), 'description__icontains': word}
+                ))
+            condition &= matches
+        rows.append(model.objects.using(using).filter(condition).annotate(
+            type=Value(name, output_field=CharField()), object_id=F('pk'), title=title, details=details,
+        ).order_by().values_list('type', 'object_id', 'title', 'details'))
+    first, *rest = rows
+    return first.union(*rest, all=True).order_by('type', 'object_id') if rest else first.order_by('object_id')
+
+
+class SearchResults:
+    """
+    Lazily evaluated, ranked search results. Supports ``count()`` and
+    slicing, which is all ``django.core.paginator.Paginator`` needs.
+    """
+
+    def __init__(self, text, kind=None):
+        self.query = match_query(text)
+        self.kind = kind
+        self.connection = connections[router.db_for_read(Client)]
+        self.fallback = None
+        if self.query is not None and not available(self.connection):
+            self.fallback = _like_queryset(text, kind, self.connection.alias)
+
+    def _where(self):
+        where, params = f'{TABLE} MATCH %s', [self.query]
+        if self.kind:
+            where += ' AND kind = %s'
+            params.append(self.kind)
+        return where, params
+
+    def count(self):
+        if self.query is None:
+            return 0
+        if self.fallback is not None:
+            return self.fallback.count()
+        where, params = self._where()
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {TABLE} WHERE {where}', params)
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if self.query is None:
+            return []
+        if self.fallback is not None:
+            return [
+                {'type': kind, 'id': pk, 'title': title, 'client': details, 'snippet': '', 'rank': None}
+                for kind, pk, title, details in self.fallback[index]
+            ]
+        start = index.start or 0
+        limit = -1 if index.stop is None else max(index.stop - start, 0)
+        where, params = self._where()
+        weights = ', '.join(str(weight) for weight in WEIGHTS)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT kind, object_id, title, client, '
+                f"snippet({TABLE}, -1, '<mark>', '</mark>', '…', 12), bm25({TABLE}, {weights}) AS rank "
+                f'FROM {TABLE} WHERE {where} ORDER BY rank, rowid LIMIT %s OFFSET %s',
+                params + [limit, start],
+            )
+            columns = ['type', 'id', 'title', 'client', 'snippet', 'rank']
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
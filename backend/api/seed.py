@@ -0,0 +1,199 @@
+"""
+Synthetic billing data at production-like volume.
+
+Clients, quotations and receipts are generated in batches and written with
+``bulk_create``. A few clients get most of the documents, as in real
+books. Dates are spread over the last ``days`` days, and statuses,
+payment methods and line items follow fixed distributions. The same
+``seed`` produces the same data (client emails included, so repeat it only
+on an empty database).
+
+``bulk_create`` skips ``save()`` and the signals, so the seed also does
+what they would have done: it hands out document numbers in one block
+(``allocate_numbers``), backdates ``created_at`` / ``updated_at``
+(``auto_now_add`` would stamp every row with the current time), reindexes
+the new rows for search, recomputes the clients' billing totals, rebuilds
+the dashboard rollups and invalidates the cached list responses.
+"""
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from . import client_totals, response_cache, rollups, search
+from .models import Client, Quotation, QuotationItem, Receipt, ReceiptItem
+from .numbering import allocate_numbers
+
+CATALOGUE = [
+    ('Wedding photography, full day', Decimal('1500.00')),
+    ('Videography package', Decimal('2000.00')),
+    ('Flower decoration', Decimal('800.00')),
+    ('Catering per guest', Decimal('35.00')),
+    ('DJ and sound system', Decimal('1200.00')),
+    ('Marquee tent 10x20m', Decimal('950.00')),
+    ('Chair hire', Decimal('4.50')),
+    ('Round table hire', Decimal('12.00')),
+    ('Stage lighting', Decimal('600.00')),
+    ('MC services', Decimal('400.00')),
+    ('Transport per trip', Decimal('150.00')),
+    ('Cleanup crew', Decimal('300.00')),
+]
+FIRST_NAMES = [
+    'Amina', 'Brian', 'Carol', 'David', 'Esther', 'Felix', 'Grace', 'Hassan', 'Irene', 'James', 'Kevin', 'Lucy',
+]
+LAST_NAMES = ['Otieno', 'Wanjiru', 'Smith', 'Kamau', 'Mwangi', 'Achieng', 'Brown', 'Njoroge', 'Okafor', 'Mutua']
+COMPANIES = ['', '', 'Acme Events', 'Globex', 'Initech', 'Umbrella Weddings', 'Stark Conferences', 'Wayne Galas']
+QUOTATION_STATUSES = {'DRAFT': 30, 'SENT': 35, 'ACCEPTED': 25, 'REJECTED': 10}
+RECEIPT_STATUSES = {'PAID': 80, 'PENDING': 15, 'CANCELLED': 5}
+PAYMENT_METHODS = {'MOBILE_MONEY': 35, 'BANK_TRANSFER': 25, 'CARD': 20, 'CASH': 15, 'CHECK': 5}
+TAX_RATE = Decimal('0.16')
+
+
+def _pick(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _batches(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+class Seeder:
+    def __init__(self, days=365, items=(1, 6), batch_size=1000, seed=None):
+        self.rng = random.Random(seed)
+        self.now = timezone.now()
+        self.days = days
+        self.items = items
+        self.batch_size = batch_size
+
+    def _timestamps(self, count):
+        """``count`` ascending times in the window, so ids and numbers follow creation order."""
+        start = self.now - timedelta(days=self.days)
+        span = (self.now - start).total_seconds()
+        return [start + timedelta(seconds=offset) for offset in sorted(self.rng.uniform(0, span) for _ in range(count))]
+
+    def _backdate(self, model, instances, timestamps):
+        rows = []
+        for instance, created in zip(instances, timestamps):
+            updated = min(created + timedelta(minutes=self.rng.choice([0, 0, 5, 90, 60 * 24 * 3])), self.now)
+            instance.created_at, instance.updated_at = created, updated
+            rows.append((created, updated, instance.pk))
+        # One prepared UPDATE run per row; bulk_update's CASE expressions
+        # cost more to build than the inserts themselves
+        connection = connections[router.db_for_write(model)]
+        adapt = connection.ops.adapt_datetimefield_value
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {connection.ops.quote_name(model._meta.db_table)} '
+                f'SET created_at = %s, updated_at = %s WHERE id = %s',
+                [(adapt(created), adapt(updated), pk) for created, updated, pk in rows],
+            )
+
+    def clients(self, count):
+        run = f'{self.rng.getrandbits(32):08x}'
+        created = []
+        timeline = self._timestamps(count)
+        for start, size in _batches(count, self.batch_size):
+            timestamps = timeline[start:start + size]
+            batch = []
+            for n in range(start, start + size):
+                first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+                batch.append(Client(
+                    name=f'{first} {last}',
+                    email=f'{first}.{last}.{run}.{n}@example.com'.lower(),
+                    phone=f'+2547{self.rng.randrange(10 ** 8):08d}',
+                    address=f'{self.rng.randrange(1, 400)} {self.rng.choice(LAST_NAMES)} Road',
+                    company=self.rng.choice(COMPANIES),
+                ))
+            with transaction.atomic():
+                Client.objects.bulk_create(batch)
+                self._backdate(Client, batch, timestamps)
+                search.index(Client, [client.pk for client in batch])
+            created.extend(batch)
+        return created
+
+    def _line_items(self, item_model):
+        items = []
+        for description, price in self.rng.sample(CATALOGUE, min(self.rng.randint(*self.items), len(CATALOGUE))):
+            quantity = self.rng.randint(50, 300) if price < 50 else self.rng.randint(1, 3)
+            items.append(item_model(
+                description=description, quantity=quantity, unit_price=price, total=quantity * price,
+            ))
+        return items
+
+    def documents(self, model, count, clients):
+        """``count`` quotations or receipts spread over ``clients``, heaviest first."""
+        item_model = QuotationItem if model is Quotation else ReceiptItem
+        parent = model._meta.model_name
+        # Zipf-like: the k-th client is picked with weight 1/k
+        weights = [1 / rank for rank in range(1, len(clients) + 1)]
+        owners = self.rng.choices(clients, weights=weights, k=count)
+        # Never before the client existed, and still in creation order
+        timeline = sorted(
+            ((max(created_at, owner.created_at), owner) for created_at, owner in zip(self._timestamps(count), owners)),
+            key=lambda pair: pair[0],
+        )
+        created = 0
+        for start, size in _batches(count, self.batch_size):
+            batch = timeline[start:start + size]
+            timestamps = [created_at for created_at, _ in batch]
+            documents, items = [], []
+            for created_at, owner in batch:
+                document_items = self._line_items(item_model)
+                subtotal = sum((item.total for item in document_items), Decimal('0'))
+                tax = (subtotal * TAX_RATE).quantize(Decimal('0.01'))
+                fields = {'client': owner, 'subtotal': subtotal, 'tax': tax, 'total': subtotal + tax}
+                if model is Quotation:
+                    fields.update(
+                        date=created_at.date(),
+                        valid_until=created_at.date() + timedelta(days=self.rng.choice([14, 30, 30, 60])),
+                        status=_pick(self.rng, QUOTATION_STATUSES),
+                    )
+                else:
+                    fields.update(
+                        date=created_at,
+                        status=_pick(self.rng, RECEIPT_STATUSES),
+                        payment_method=_pick(self.rng, PAYMENT_METHODS),
+                    )
+                documents.append(model(**fields))
+                items.append(document_items)
+
+            with transaction.atomic():
+                numbers = allocate_numbers(model.NUMBER_PREFIX, size)
+                for document, number in zip(documents, numbers):
+                    setattr(document, f'{parent}_number', number)
+                model.objects.bulk_create(documents)
+                self._backdate(model, documents, timestamps)
+                for document, document_items in zip(documents, items):
+                    for item in document_items:
+                        setattr(item, parent, document)
+                item_model.objects.bulk_create([item for document_items in items for item in document_items])
+                search.index(model, [document.pk for document in documents])
+            created += size
+        return created
+
+
+def seed(clients=100, quotations=1000, receipts=1000, **options):
+    """Insert synthetic data and return how many rows of each kind were created."""
+    started = time.monotonic()
+    seeder = Seeder(**options)
+    new_clients = seeder.clients(clients)
+    owners = new_clients or list(Client.objects.all())
+    if not owners and (quotations or receipts):
+        raise ValueError('Quotations and receipts need at least one client.')
+    seeder.rng.shuffle(owners)
+    report = {
+        'clients': len(new_clients),
+        'quotations': seeder.documents(Quotation, quotations, owners) if quotations else 0,
+        'receipts': seeder.documents(Receipt, receipts, owners) if receipts else 0,
+    }
+    if quotations or receipts:
+        client_totals.refresh(client.pk for client in owners)
+    rollups.rebuild()
+    for model in (Client, Quotation, Receipt):
+        response_cache.invalidate(model)
+    report['seconds'] = round(time.monotonic() - started, 3)
+    return report
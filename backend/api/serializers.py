@@ -1,25 +1,147 @@
+from decimal import Decimal
+
+from django.db import transaction
 from rest_framework import serializers
-from .models import Client, Quotation, QuotationItem, Receipt, ReceiptItem
+from .models import Client, Job, Quotation, QuotationItem, Receipt, ReceiptItem
+from .signals import items_saved_with_parent
+
+
+class SparseFieldsSerializerMixin:
+    """Keeps only the fields named in the ``fields`` argument (all of them when it is ``None``)."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Client
-        fields = ['id', 'name', 'email', 'phone', 'address', 'company', 'created_at', 'updated_at']
+        fields = [
+            'id', 'name', 'email', 'phone', 'address', 'company',
+            'receipt_count', 'total_paid', 'open_quotation_count', 'last_payment_at',
+            'created_at', 'updated_at',
+        ]
+
+
+class LineItemsSerializerMixin:
+    """
+    Persists the nested ``items`` of a quotation or receipt.
+
+    New lines are written with a single ``bulk_create``. On update, lines
+    are matched by ``id`` so only changed rows are updated and only removed
+    rows are deleted. Totals are computed in the same pass, so the parent is
+    saved exactly once.
+    """
+    item_model = None
+    item_fields = ['description', 'quantity', 'unit_price']
+
+    def validate_items(self, items):
+        if self.instance is None:
+            # Ids only identify existing lines; on create they are ignored
+            for item in items:
+                item.pop('id', None)
+            return items
+
+        existing = {item.pk for item in self.instance.items.all()}
+        ids = [item['id'] for item in items if item.get('id') is not None]
+        unknown = sorted(set(ids) - existing)
+        if unknown:
+            raise serializers.ValidationError(
+                f'Items {unknown} do not belong to this document.'
+            )
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError('Each item id may only appear once.')
+        return items
+
+    def _build_item(self, parent, item_data):
+        item = self.item_model(**{parent._meta.model_name: parent}, **item_data)
+        item.total = item.quantity * item.unit_price
+        return item
+
+    @transaction.atomic
+    def create(self, validated_data):
+        items_data = validated_data.pop('items')
+        subtotal = sum(
+            (item['quantity'] * item['unit_price'] for item in items_data), Decimal('0')
+        )
+        validated_data['subtotal'] = subtotal
+        validated_data['total'] = subtotal + validated_data.get('tax', Decimal('0'))
+        instance = self.Meta.model.objects.create(**validated_data)
+        self.item_model.objects.bulk_create(
+            [self._build_item(instance, item_data) for item_data in items_data]
+        )
+        return instance
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        items_data = validated_data.pop('items', None)
+
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+
+        if items_data is not None:
+            # Saving the parent below bumps its updated_at and runs the
+            # document receivers once for all the lines
+            with items_saved_with_parent():
+                instance.subtotal = self._sync_items(instance, items_data)
+        instance.total = instance.subtotal + instance.tax
+        instance.save()
+        return instance
+
+    def _sync_items(self, instance, items_data):
+        """Apply the submitted lines as a diff and return the new subtotal"""
+        existing = {item.pk: item for item in instance.items.all()}
+        to_create, to_update = [], []
+        subtotal = Decimal('0')
+
+        for item_data in items_data:
+            item_id = item_data.pop('id', None)
+            line_total = item_data['quantity'] * item_data['unit_price']
+            subtotal += line_total
+
+            item = existing.pop(item_id, None)
+            if item is None:
+                to_create.append(self._build_item(instance, item_data))
+                continue
+            if item.total != line_total or any(
+                getattr(item, field) != value for field, value in item_data.items()
+            ):
+                for field, value in item_data.items():
+                    setattr(item, field, value)
+                item.total = line_total
+                to_update.append(item)
+
+        if existing:
+            self.item_model.objects.filter(pk__in=list(existing)).delete()
+        if to_update:
+            self.item_model.objects.bulk_update(to_update, self.item_fields + ['total'])
+        if to_create:
+            self.item_model.objects.bulk_create(to_create)
+
+        # The prefetched lines no longer match the database
+        getattr(instance, '_prefetched_objects_cache', {}).pop('items', None)
+        return subtotal
 
 
 class QuotationItemSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+
     class Meta:
         model = QuotationItem
         fields = ['id', 'description', 'quantity', 'unit_price', 'total']
         read_only_fields = ['total']
 
 
-class QuotationSerializer(serializers.ModelSerializer):
+class QuotationSerializer(SparseFieldsSerializerMixin, LineItemsSerializerMixin, serializers.ModelSerializer):
     items = QuotationItemSerializer(many=True)
     client_name = serializers.CharField(source='client.name', read_only=True)
     client_email = serializers.CharField(source='client.email', read_only=True)
 
+    item_model = QuotationItem
+
     class Meta:
         model = Quotation
         fields = [
@@ -29,59 +151,23 @@ class QuotationSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['quotation_number']
 
-    def create(self, validated_data):
-        items_data = validated_data.pop('items')
-        quotation = Quotation.objects.create(**validated_data)
-        
-        # Calculate totals
-        subtotal = 0
-        for item_data in items_data:
-            item = QuotationItem.objects.create(quotation=quotation, **item_data)
-            subtotal += item.total
-        
-        quotation.subtotal = subtotal
-        quotation.total = subtotal + quotation.tax
-        quotation.save()
-        
-        return quotation
-
-    def update(self, instance, validated_data):
-        items_data = validated_data.pop('items', None)
-        
-        # Update quotation fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        
-        # Update items if provided
-        if items_data is not None:
-            # Delete existing items
-            instance.items.all().delete()
-            
-            # Create new items
-            subtotal = 0
-            for item_data in items_data:
-                item = QuotationItem.objects.create(quotation=instance, **item_data)
-                subtotal += item.total
-            
-            instance.subtotal = subtotal
-            instance.total = subtotal + instance.tax
-        
-        instance.save()
-        return instance
-
 
 class ReceiptItemSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+
     class Meta:
         model = ReceiptItem
         fields = ['id', 'description', 'quantity', 'unit_price', 'total']
         read_only_fields = ['total']
 
 
-class ReceiptSerializer(serializers.ModelSerializer):
+class ReceiptSerializer(SparseFieldsSerializerMixin, LineItemsSerializerMixin, serializers.ModelSerializer):
     items = ReceiptItemSerializer(many=True)
     client_name = serializers.CharField(source='client.name', read_only=True)
     client_email = serializers.CharField(source='client.email', read_only=True)
 
+    item_model = ReceiptItem
+
     class Meta:
         model = Receipt
         fields = [
@@ -91,42 +177,12 @@ class ReceiptSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['receipt_number']
 
-    def create(self, validated_data):
-        items_data = validated_data.pop('items')
-        receipt = Receipt.objects.create(**validated_data)
-        
-        # Calculate totals
-        subtotal = 0
-        for item_data in items_data:
-            item = ReceiptItem.objects.create(receipt=receipt, **item_data)
-            subtotal += item.total
-        
-        receipt.subtotal = subtotal
-        receipt.total = subtotal + receipt.tax
-        receipt.save()
-        
-        return receipt
 
-    def update(self, instance, validated_data):
-        items_data = validated_data.pop('items', None)
-        
-        # Update receipt fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        
-        # Update items if provided
-        if items_data is not None:
-            # Delete existing items
-            instance.items.all().delete()
-            
-            # Create new items
-            subtotal = 0
-            for item_data in items_data:
-                item = ReceiptItem.objects.create(receipt=instance, **item_data)
-                subtotal += item.total
-            
-            instance.subtotal = subtotal
-            instance.total = subtotal + instance.tax
-        
-        instance.save()
-        return instance
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'status', 'attempts', 'max_attempts', 'run_after',
+            'result', 'last_error', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
@@ -0,0 +1,211 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial, wraps
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import authentication, client_totals, metrics, response_cache, rollups, search, sync
+from .models import Client, Quotation, QuotationItem, Receipt, ReceiptItem
+from .utils.pdf_cache import pdf_cache
+
+_skip_item_receivers = ContextVar('items_saved_with_parent', default=False)
+
+
+@contextmanager
+def items_saved_with_parent():
+    """
+    Skip the line item receivers for item writes in this block. For callers
+    that save the parent document afterwards: its own receivers bump
+    ``updated_at``, invalidate the caches and reindex it once, instead of
+    once per item.
+    """
+    token = _skip_item_receivers.set(True)
+    try:
+        yield
+    finally:
+        _skip_item_receivers.reset(token)
+
+
+def _per_item(handler):
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not _skip_item_receivers.get():
+            handler(*args, **kwargs)
+    return wrapper
+
+
+@receiver(post_save, sender=Client, dispatch_uid='rollups_client_saved')
+@receiver(post_delete, sender=Client, dispatch_uid='rollups_client_deleted')
+@receiver(post_save, sender=Quotation, dispatch_uid='rollups_quotation_saved')
+@receiver(post_delete, sender=Quotation, dispatch_uid='rollups_quotation_deleted')
+@receiver(post_save, sender=Receipt, dispatch_uid='rollups_receipt_saved')
+@receiver(post_delete, sender=Receipt, dispatch_uid='rollups_receipt_deleted')
+def update_monthly_stats(sender, instance, **kwargs):
+    """Keep the dashboard bucket of the saved/deleted row up to date"""
+    if instance.created_at is None:
+        return
+    rollups.refresh_month(instance.created_at, models=[sender])
+
+
+@receiver(post_save, sender=Quotation, dispatch_uid='pdf_cache_quotation_saved')
+@receiver(post_delete, sender=Quotation, dispatch_uid='pdf_cache_quotation_deleted')
+@receiver(post_save, sender=Receipt, dispatch_uid='pdf_cache_receipt_saved')
+@receiver(post_delete, sender=Receipt, dispatch_uid='pdf_cache_receipt_deleted')
+def invalidate_document_pdf(sender, instance, **kwargs):
+    """Drop cached PDFs of the saved/deleted document"""
+    pdf_cache.invalidate(sender._meta.model_name, instance.pk)
+
+
+@receiver(post_save, sender=QuotationItem, dispatch_uid='pdf_cache_quotation_item_saved')
+@receiver(post_delete, sender=QuotationItem, dispatch_uid='pdf_cache_quotation_item_deleted')
+@_per_item
+def invalidate_quotation_item_pdf(sender, instance, **kwargs):
+    pdf_cache.invalidate('quotation', instance.quotation_id)
+
+
+@receiver(post_save, sender=ReceiptItem, dispatch_uid='pdf_cache_receipt_item_saved')
+@receiver(post_delete, sender=ReceiptItem, dispatch_uid='pdf_cache_receipt_item_deleted')
+@_per_item
+def invalidate_receipt_item_pdf(sender, instance, **kwargs):
+    pdf_cache.invalidate('receipt', instance.receipt_id)
+
+
+@receiver(post_save, sender=Client, dispatch_uid='search_client_saved')
+def index_client(sender, instance, **kwargs):
+    """Reindex the client and the documents that show its name"""
+    search.index_client(instance.pk)
+
+
+@receiver(post_save, sender=Quotation, dispatch_uid='search_quotation_saved')
+@receiver(post_save, sender=Receipt, dispatch_uid='search_receipt_saved')
+def index_document(sender, instance, **kwargs):
+    # Line items are written after the parent is saved; index once they are in
+    transaction.on_commit(partial(search.index, sender, [instance.pk]))
+
+
+@receiver(post_save, sender=QuotationItem, dispatch_uid='search_quotation_item_saved')
+@receiver(post_delete, sender=QuotationItem, dispatch_uid='search_quotation_item_deleted')
+@_per_item
+def index_quotation_of_item(sender, instance, **kwargs):
+    transaction.on_commit(partial(search.index, Quotation, [instance.quotation_id]))
+
+
+@receiver(post_save, sender=ReceiptItem, dispatch_uid='search_receipt_item_saved')
+@receiver(post_delete, sender=ReceiptItem, dispatch_uid='search_receipt_item_deleted')
+@_per_item
+def index_receipt_of_item(sender, instance, **kwargs):
+    transaction.on_commit(partial(search.index, Receipt, [instance.receipt_id]))
+
+
+@receiver(post_delete, sender=Client, dispatch_uid='search_client_deleted')
+@receiver(post_delete, sender=Quotation, dispatch_uid='search_quotation_deleted')
+@receiver(post_delete, sender=Receipt, dispatch_uid='search_receipt_deleted')
+def remove_from_search(sender, instance, **kwargs):
+    search.remove(sender, instance.pk)
+
+
+@receiver(post_save, sender=QuotationItem, dispatch_uid='touch_quotation_item_saved')
+@receiver(post_delete, sender=QuotationItem, dispatch_uid='touch_quotation_item_deleted')
+@receiver(post_save, sender=ReceiptItem, dispatch_uid='touch_receipt_item_saved')
+@receiver(post_delete, sender=ReceiptItem, dispatch_uid='touch_receipt_item_deleted')
+@_per_item
+def touch_document_of_item(sender, instance, **kwargs):
+    """An item change is a change of its document (ETags, delta sync)"""
+    parent = 'quotation' if sender is QuotationItem else 'receipt'
+    document_model = Quotation if sender is QuotationItem else Receipt
+    document_model.objects.filter(pk=getattr(instance, f'{parent}_id')).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Client, dispatch_uid='tombstone_client_deleted')
+@receiver(post_delete, sender=Quotation, dispatch_uid='tombstone_quotation_deleted')
+@receiver(post_delete, sender=Receipt, dispatch_uid='tombstone_receipt_deleted')
+def record_tombstone(sender, instance, **kwargs):
+    """Log the deletion for delta syncs (also runs for cascaded deletes)"""
+    sync.record_deletion(sender, instance.pk)
+
+
+def _invalidate_responses(model, pks):
+    response_cache.invalidate(model, pks)
+    # Again once committed: a response rendered from the old rows in the
+    # meantime was stored under the first new token
+    transaction.on_commit(partial(response_cache.invalidate, model, pks))
+
+
+@receiver(post_save, sender=Client, dispatch_uid='response_cache_client_saved')
+@receiver(post_delete, sender=Client, dispatch_uid='response_cache_client_deleted')
+@receiver(post_save, sender=Quotation, dispatch_uid='response_cache_quotation_saved')
+@receiver(post_delete, sender=Quotation, dispatch_uid='response_cache_quotation_deleted')
+@receiver(post_save, sender=Receipt, dispatch_uid='response_cache_receipt_saved')
+@receiver(post_delete, sender=Receipt, dispatch_uid='response_cache_receipt_deleted')
+def invalidate_cached_responses(sender, instance, created=False, **kwargs):
+    _invalidate_responses(sender, [instance.pk])
+    if sender is Client and kwargs.get('signal') is post_save and not created:
+        # Document details show the client's name and email
+        for document_model in (Quotation, Receipt):
+            pks = list(document_model.objects.filter(client_id=instance.pk).values_list('pk', flat=True))
+            if pks:
+                _invalidate_responses(document_model, pks)
+
+
+@receiver(post_save, sender=QuotationItem, dispatch_uid='response_cache_quotation_item_saved')
+@receiver(post_delete, sender=QuotationItem, dispatch_uid='response_cache_quotation_item_deleted')
+@receiver(post_save, sender=ReceiptItem, dispatch_uid='response_cache_receipt_item_saved')
+@receiver(post_delete, sender=ReceiptItem, dispatch_uid='response_cache_receipt_item_deleted')
+@_per_item
+def invalidate_cached_document_of_item(sender, instance, **kwargs):
+    if sender is QuotationItem:
+        _invalidate_responses(Quotation, [instance.quotation_id])
+    else:
+        _invalidate_responses(Receipt, [instance.receipt_id])
+
+
+@receiver(post_save, sender=Quotation, dispatch_uid='client_totals_quotation_saved')
+@receiver(post_delete, sender=Quotation, dispatch_uid='client_totals_quotation_deleted')
+@receiver(post_save, sender=Receipt, dispatch_uid='client_totals_receipt_saved')
+@receiver(post_delete, sender=Receipt, dispatch_uid='client_totals_receipt_deleted')
+def refresh_client_totals(sender, instance, origin=None, **kwargs):
+    """Recompute the aggregates of the document's client (and its previous one)"""
+    if isinstance(origin, Client):
+        # The client itself is being deleted
+        return
+    client_totals.refresh([instance.client_id, getattr(instance, '_loaded_client_id', None)])
+    # A later save compares against this client
+    instance._loaded_client_id = instance.client_id
+
+
+def _invalidate_users(user_ids):
+    authentication.invalidate(user_ids)
+    # Again once committed, like the response cache
+    transaction.on_commit(partial(authentication.invalidate, user_ids))
+
+
+@receiver(post_save, sender=User, dispatch_uid='auth_cache_user_saved')
+@receiver(post_delete, sender=User, dispatch_uid='auth_cache_user_deleted')
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Covers password changes, deactivation and ``last_login`` updates"""
+    _invalidate_users([getattr(instance, jwt_settings.USER_ID_FIELD)])
+
+
+@receiver(m2m_changed, sender=User.groups.through, dispatch_uid='auth_cache_user_groups_changed')
+@receiver(m2m_changed, sender=User.user_permissions.through, dispatch_uid='auth_cache_user_permissions_changed')
+def invalidate_cached_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        _invalidate_users([getattr(instance, jwt_settings.USER_ID_FIELD)])
+    elif pk_set:
+        users = User.objects.filter(pk__in=pk_set).values_list(jwt_settings.USER_ID_FIELD, flat=True)
+        _invalidate_users(list(users))
+
+
+@receiver(connection_created, dispatch_uid='metrics_count_queries')
+def count_queries(sender, connection, **kwargs):
+    """Count every query towards the request that runs it (``metrics.record_query``)"""
+    if metrics.record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.record_query)
@@ -0,0 +1,94 @@
+"""
+Delta sync for the client, quotation and receipt lists.
+
+``GET /api/quotations/?updated_since=<synced_at>`` returns only the rows
+changed since that time, oldest change first. The first page also lists the
+ids deleted since then. Every list response carries a ``synced_at`` to send
+back on the next sync.
+
+Deletions come from ``Tombstone`` rows, which ``api.signals`` writes on
+every delete, cascades included. Tombstones older than
+``TOMBSTONE_RETENTION_DAYS`` are removed by ``prune_tombstones``. A sync
+older than that would miss deletions, so it gets ``410 Gone`` and the
+client reloads everything.
+
+The window is widened by ``DELTA_SYNC_OVERLAP_SECONDS`` so a row written by
+a transaction that commits just after a sync is picked up by the next one.
+A few rows may be sent twice.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Subquery
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.response import Response
+
+from .models import Tombstone
+
+
+def window_start(since):
+    """Earliest ``updated_at`` / ``deleted_at`` included in a sync from ``since``."""
+    return since - timedelta(seconds=getattr(settings, 'DELTA_SYNC_OVERLAP_SECONDS', 2))
+
+
+def horizon(now=None):
+    """Syncs from before this time may have missed pruned tombstones."""
+    return (now or timezone.now()) - timedelta(days=getattr(settings, 'TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def record_deletion(model, pk):
+    Tombstone.objects.create(model=model._meta.model_name, object_id=pk)
+
+
+def deleted_since(model, since):
+    return list(
+        Tombstone.objects.filter(model=model._meta.model_name, deleted_at__gte=window_start(since))
+        .order_by('deleted_at').values_list('object_id', flat=True)
+    )
+
+
+def latest_deletion(model):
+    """Scalar subquery for the time of the most recent deletion of ``model``."""
+    return Subquery(
+        Tombstone.objects.filter(model=model._meta.model_name)
+        .order_by('-deleted_at').values('deleted_at')[:1]
+    )
+
+
+def prune(now=None):
+    """Delete tombstones older than the retention period; returns how many."""
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=horizon(now)).delete()
+    return deleted
+
+
+class DeltaSyncMixin:
+    """
+    ``?updated_since=`` on ``list``. The filter itself is applied by
+    ``ListFilterBackend``; this orders the changes oldest first and adds
+    ``synced_at`` and ``deleted`` to the response.
+    """
+
+    def list(self, request, *args, **kwargs):
+        synced_at = timezone.now()
+        since = request.query_params.get('updated_since')
+        if since is not None:
+            try:
+                since = serializers.DateTimeField().to_internal_value(since)
+            except serializers.ValidationError as exc:
+                raise serializers.ValidationError({'updated_since': exc.detail})
+            if since < horizon(synced_at):
+                return Response(
+                    {'detail': 'updated_since is older than the deletion log; reload the full list.'},
+                    status=status.HTTP_410_GONE,
+                )
+            # Oldest change first, so rows edited while paging show up again on a later page
+            self.ordering = ['updated_at']
+
+        response = super().list(request, *args, **kwargs)
+        first_page = self.paginator is None or self.paginator.cursor_query_param not in request.query_params
+        if isinstance(response.data, dict) and first_page:
+            response.data['synced_at'] = synced_at
+            if since is not None:
+                response.data['deleted'] = deleted_since(self.queryset.model, since)
+        return response
@@ -0,0 +1,43 @@
+"""Job handlers run by the background worker (see api.jobs)."""
+from .filters import DocumentFilterSerializer, filter_documents
+from .jobs import register
+from .models import Quotation, Receipt
+
+
+@register('send_quotation_email')
+def send_quotation_email(quotation_id):
+    from .utils.email_service import send_quotation_email
+    quotation = Quotation.objects.select_related('client').prefetch_related('items').get(pk=quotation_id)
+    send_quotation_email(quotation)
+    return {'quotation_number': quotation.quotation_number, 'to': quotation.client.email}
+
+
+@register('send_receipt_email')
+def send_receipt_email(receipt_id):
+    from .utils.email_service import send_receipt_email
+    receipt = Receipt.objects.select_related('client').prefetch_related('items').get(pk=receipt_id)
+    send_receipt_email(receipt)
+    return {'receipt_number': receipt.receipt_number, 'to': receipt.client.email}
+
+
+def _bulk_targets():
+    from .utils.email_service import send_bulk_quotation_emails, send_bulk_receipt_emails
+    return {
+        'quotation': (Quotation, send_bulk_quotation_emails),
+        'receipt': (Receipt, send_bulk_receipt_emails),
+    }
+
+
+@register('bulk_send_emails')
+def bulk_send_emails(document, filters=None, **options):
+    """Email every quotation or receipt matching ``filters``; one result per document"""
+    model, send = _bulk_targets()[document]
+    serializer = DocumentFilterSerializer(data=filters or {}, model=model)
+    serializer.is_valid(raise_exception=True)
+    queryset = filter_documents(model.objects.order_by('id'), serializer.validated_data)
+    results = send(queryset, **options)
+    return {
+        'sent': sum(1 for result in results if result['status'] == 'sent'),
+        'failed': sum(1 for result in results if result['status'] == 'failed'),
+        'results': results,
+    }
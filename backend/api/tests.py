@@ -1,3 +1,1977 @@
-from django.test import TestCase
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.db import close_old_connections, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from . import jobs, numbering, renderers, rollups, search
+from .models import Client, DocumentSequence, Job, MonthlyStats, Quotation, QuotationItem, Receipt, ReceiptItem
+from .pagination import KeysetPagination
+from .serializers import QuotationSerializer
+
+
+def setUpModule():
+    # Keep rendered PDFs out of the project's cache directory
+    global _pdf_cache_dir, _pdf_cache_settings
+    _pdf_cache_dir = tempfile.TemporaryDirectory()
+    _pdf_cache_settings = override_settings(
+        PDF_CACHE_DIR=_pdf_cache_dir.name,
+        # Rolled back test data sends no signals; ResponseCacheTests turns it on
+        RESPONSE_CACHE_ENABLED=False,
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-responses'},
+        },
+    )
+    _pdf_cache_settings.enable()
+
+
+def tearDownModule():
+    _pdf_cache_settings.disable()
+    _pdf_cache_dir.cleanup()
+
+
+def make_client(**kwargs):
+    n = Client.objects.count() + 1
+    defaults = {'name': f'Client {n}', 'email': f'client{n}@example.com', 'phone': '555-0100'}
+    defaults.update(kwargs)
+    return Client.objects.create(**defaults)
+
+
+def make_quotation(client, **kwargs):
+    defaults = {'valid_until': date.today() + timedelta(days=30)}
+    defaults.update(kwargs)
+    return Quotation.objects.create(client=client, **defaults)
+
+
+def make_receipt(client, **kwargs):
+    defaults = {'payment_method': 'CASH'}
+    defaults.update(kwargs)
+    return Receipt.objects.create(client=client, **defaults)
+
+
+def add_items(document, count=2):
+    item_model = QuotationItem if isinstance(document, Quotation) else ReceiptItem
+    parent = 'quotation' if isinstance(document, Quotation) else 'receipt'
+    return [
+        item_model.objects.create(
+            **{parent: document}, description=f'Item {i}', quantity=i + 1, unit_price=Decimal('10.00')
+        )
+        for i in range(count)
+    ]
+
+
+class AuthenticatedAPITestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='staff', password='password123')
+        self.client.force_authenticate(self.user)
+
+
+class DashboardStatsTests(AuthenticatedAPITestCase):
+    def test_signals_keep_current_month_up_to_date(self):
+        acme = make_client(name='ACME')
+        make_quotation(acme, status='DRAFT')
+        accepted = make_quotation(acme, status='SENT')
+        make_receipt(acme, total=Decimal('100.00'))
+        receipt = make_receipt(acme, total=Decimal('50.50'))
+
+        accepted.status = 'ACCEPTED'
+        accepted.save()
+        receipt.delete()
+
+        stats = rollups.dashboard_stats()
+        self.assertEqual(stats['total_clients'], 1)
+        self.assertEqual(stats['new_clients_this_month'], 1)
+        self.assertEqual(stats['total_quotations'], 2)
+        self.assertEqual(stats['pending_quotations'], 1)
+        self.assertEqual(stats['total_receipts'], 1)
+        self.assertEqual(stats['receipts_this_month'], 1)
+        self.assertEqual(stats['total_revenue'], Decimal('100.00'))
+        self.assertEqual(stats['revenue_this_month'], Decimal('100.00'))
+
+    def test_older_months_count_towards_totals_only(self):
+        acme = make_client()
+        receipt = make_receipt(acme, total=Decimal('75.00'))
+        last_year = timezone.now() - timedelta(days=400)
+        Receipt.objects.filter(pk=receipt.pk).update(created_at=last_year)
+        rollups.rebuild()
+
+        stats = rollups.dashboard_stats()
+        self.assertEqual(MonthlyStats.objects.count(), 2)
+        self.assertEqual(stats['total_revenue'], Decimal('75.00'))
+        self.assertEqual(stats['revenue_this_month'], Decimal('0'))
+        self.assertEqual(stats['receipts_this_month'], 0)
+
+    def test_client_cascade_delete_updates_rollups(self):
+        acme = make_client()
+        make_quotation(acme)
+        make_receipt(acme, total=Decimal('20.00'))
+        acme.delete()
+
+        stats = rollups.dashboard_stats()
+        self.assertEqual(stats['total_clients'], 0)
+        self.assertEqual(stats['total_quotations'], 0)
+        self.assertEqual(stats['total_revenue'], Decimal('0'))
+
+    def test_endpoint_cost_is_independent_of_row_count(self):
+        acme = make_client()
+        for _ in range(5):
+            make_receipt(acme, total=Decimal('10.00'))
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_receipts'], 5)
+        self.assertEqual(response.data['total_revenue'], Decimal('50.00'))
+
+    def test_endpoint_requires_authentication(self):
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 401)
+
+
+class KeysetPaginationTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        acme = make_client()
+        self.receipts = [make_receipt(acme) for _ in range(7)]
+        # Force ties on created_at so the id tiebreak is exercised
+        tied = timezone.now()
+        Receipt.objects.filter(pk__in=[r.pk for r in self.receipts[2:5]]).update(created_at=tied)
+        self.expected = list(
+            Receipt.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        return seen, response
+
+    def test_pages_cover_every_row_once_in_order(self):
+        seen, _ = self.walk(reverse('receipt-list') + '?page_size=3')
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_link_returns_to_earlier_page(self):
+        first = self.client.get(reverse('receipt-list') + '?page_size=3')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [row['id'] for row in back.data['results']],
+            [row['id'] for row in first.data['results']],
+        )
+        self.assertIsNone(first.data['previous'])
+
+    def test_rows_inserted_between_pages_are_not_repeated(self):
+        first = self.client.get(reverse('receipt-list') + '?page_size=3')
+        make_receipt(Client.objects.get())
+        seen = [row['id'] for row in first.data['results']]
+        rest, _ = self.walk(first.data['next'])
+        self.assertEqual(seen + rest, self.expected)
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(KeysetPagination, 'max_page_size', 2):
+            response = self.client.get(reverse('receipt-list') + '?page_size=1000')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_queries_do_not_use_offset(self):
+        first = self.client.get(reverse('receipt-list') + '?page_size=3')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(first.data['next'])
+        self.assertFalse(any('OFFSET' in q['sql'].upper() for q in ctx.captured_queries))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('receipt-list') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryBudgetTests(AuthenticatedAPITestCase):
+    """
+    Query counts must not grow with the number of rows or line items. Every
+    budget includes the one ETag validator query (see api.conditional).
+    """
+
+    def seed(self, count):
+        for _ in range(count):
+            client = make_client()
+            add_items(make_quotation(client), count=3)
+            add_items(make_receipt(client), count=3)
+
+    def assertListBudget(self, url_name, budget):
+        self.seed(2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse(url_name))
+        self.seed(20)
+        with self.assertNumQueries(budget):
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(len(small.captured_queries), budget)
+        self.assertEqual(len(response.data['results']), 22)
+
+    def test_client_list(self):
+        self.assertListBudget('client-list', 2)
+
+    def test_quotation_list(self):
+        self.assertListBudget('quotation-list', 3)
+
+    def test_receipt_list(self):
+        self.assertListBudget('receipt-list', 3)
+
+    def test_quotation_detail(self):
+        quotation = make_quotation(make_client())
+        add_items(quotation, count=10)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('quotation-detail', args=[quotation.pk]))
+        self.assertEqual(len(response.data['items']), 10)
+
+    def test_receipt_detail(self):
+        receipt = make_receipt(make_client())
+        add_items(receipt, count=10)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('receipt-detail', args=[receipt.pk]))
+        self.assertEqual(len(response.data['items']), 10)
+
+    def test_str_uses_loaded_relations(self):
+        from .views import QuotationViewSet, ReceiptViewSet
+        self.seed(3)
+        for viewset in (QuotationViewSet, ReceiptViewSet):
+            documents = list(viewset.queryset.all())
+            with self.assertNumQueries(0):
+                for document in documents:
+                    str(document)
+                    for item in document.items.all():
+                        str(item)
+
+
+class LineItemPersistenceTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_client()
+
+    def payload(self, items, **extra):
+        data = {
+            'client': self.acme.pk,
+            'date': str(date.today()),
+            'valid_until': str(date.today() + timedelta(days=30)),
+            'tax': '5.00',
+            'items': items,
+        }
+        data.update(extra)
+        return data
+
+    def lines(self, count):
+        return [
+            {'description': f'Line {i}', 'quantity': 2, 'unit_price': '12.50'}
+            for i in range(count)
+        ]
+
+    def test_create_computes_totals_and_bulk_inserts(self):
+        response = self.client.post(reverse('quotation-list'), self.payload(self.lines(3)), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        quotation = Quotation.objects.get(pk=response.data['id'])
+        self.assertEqual(quotation.subtotal, Decimal('75.00'))
+        self.assertEqual(quotation.total, Decimal('80.00'))
+        self.assertEqual(
+            sorted(quotation.items.values_list('total', flat=True)), [Decimal('25.00')] * 3
+        )
+
+    def test_create_query_count_is_independent_of_line_count(self):
+        url = reverse('receipt-list')
+        extra = {'payment_method': 'CASH'}
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(url, self.payload(self.lines(2), **extra), format='json')
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(url, self.payload(self.lines(150), **extra), format='json')
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+        inserts = [q for q in many.captured_queries if q['sql'].startswith('INSERT INTO "api_receiptitem"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_update_diffs_items_by_id(self):
+        created = self.client.post(reverse('quotation-list'), self.payload(self.lines(3)), format='json').data
+        keep, change, drop = created['items']
+        items = [
+            keep,
+            {**change, 'quantity': 4},
+            {'description': 'Marquee tent', 'quantity': 1, 'unit_price': '500.00'},
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.put(
+                reverse('quotation-detail', args=[created['id']]), self.payload(items), format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+
+        quotation = Quotation.objects.get(pk=created['id'])
+        rows = {item.pk: item for item in quotation.items.all()}
+        self.assertIn(keep['id'], rows)
+        self.assertEqual(rows[change['id']].total, Decimal('50.00'))
+        self.assertNotIn(drop['id'], rows)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(quotation.subtotal, Decimal('575.00'))
+        self.assertEqual(quotation.total, Decimal('580.00'))
+
+        item_writes = [
+            q['sql'] for q in ctx.captured_queries
+            if '"api_quotationitem"' in q['sql'] and not q['sql'].startswith('SELECT')
+        ]
+        self.assertEqual(len(item_writes), 3)  # one DELETE, one UPDATE, one INSERT
+        # Item signals only bump updated_at; the document itself is saved once
+        parent_saves = [
+            q for q in ctx.captured_queries
+            if q['sql'].startswith('UPDATE "api_quotation"') and '"subtotal"' in q['sql']
+        ]
+        self.assertEqual(len(parent_saves), 1)
+
+    def test_removing_many_lines_touches_the_document_once(self):
+        created = self.client.post(reverse('quotation-list'), self.payload(self.lines(20)), format='json').data
+        url = reverse('quotation-detail', args=[created['id']])
+        with CaptureQueriesContext(connection) as ctx, \
+                mock.patch('api.signals.pdf_cache.invalidate') as invalidate_pdf, \
+                self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.put(url, self.payload(created['items'][:1]), format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        parent_writes = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "api_quotation"')]
+        self.assertEqual(len(parent_writes), 1)
+        invalidate_pdf.assert_called_once_with('quotation', created['id'])
+        reindexes = [c for c in callbacks if getattr(c, 'func', None) is search.index]
+        self.assertEqual(len(reindexes), 1)
+        self.assertEqual(Quotation.objects.get(pk=created['id']).items.count(), 1)
+
+        # Item writes outside the serializer still touch their document
+        before = Quotation.objects.get(pk=created['id']).updated_at
+        QuotationItem.objects.filter(quotation_id=created['id']).delete()
+        self.assertGreater(Quotation.objects.get(pk=created['id']).updated_at, before)
+
+    def test_update_rejects_foreign_item_ids(self):
+        other = make_quotation(self.acme)
+        foreign = add_items(other, count=1)[0]
+        created = self.client.post(reverse('quotation-list'), self.payload(self.lines(1)), format='json').data
+        items = [{'id': foreign.pk, 'description': 'Hijack', 'quantity': 1, 'unit_price': '1.00'}]
+        response = self.client.put(
+            reverse('quotation-detail', args=[created['id']]), self.payload(items), format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(QuotationItem.objects.get(pk=foreign.pk).description, 'Item 0')
+
+    def test_partial_update_without_items_recomputes_total(self):
+        created = self.client.post(reverse('quotation-list'), self.payload(self.lines(2)), format='json').data
+        response = self.client.patch(
+            reverse('quotation-detail', args=[created['id']]), {'tax': '10.00'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data['total']), Decimal('60.00'))
+
+
+class DocumentNumberTests(TestCase):
+    def setUp(self):
+        numbering.allocator.reset()
+
+    def test_numbers_come_from_the_sequence_table(self):
+        DocumentSequence.objects.filter(prefix='QT').update(last_value=41)
+        acme = make_client()
+        with self.assertNumQueries(1):
+            number = numbering.next_number('QT')
+        self.assertEqual(number, 'QT-00042')
+        self.assertEqual(make_quotation(acme).quotation_number, 'QT-00043')
+        self.assertEqual(make_receipt(acme).receipt_number, 'RC-00001')
+
+    def test_missing_sequence_row_is_created(self):
+        DocumentSequence.objects.all().delete()
+        self.assertEqual(numbering.next_number('RC'), 'RC-00001')
+        self.assertEqual(DocumentSequence.objects.get(prefix='RC').last_value, 1)
+
+    def test_rolled_back_insert_releases_its_number(self):
+        acme = make_client()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            make_quotation(acme)
+            raise RuntimeError
+        self.assertEqual(make_quotation(acme).quotation_number, 'QT-00001')
+
+    def test_allocate_numbers_reserves_a_contiguous_range(self):
+        self.assertEqual(numbering.allocate_numbers('QT', 3), ['QT-00001', 'QT-00002', 'QT-00003'])
+        self.assertEqual(numbering.next_number('QT'), 'QT-00004')
+
+
+class DocumentNumberBlockTests(TransactionTestCase):
+    def setUp(self):
+        self.allocator = numbering.NumberAllocator(block_size=5)
+
+    def test_block_is_reserved_once_per_block_size(self):
+        with self.assertNumQueries(0):
+            first = [self.allocator.allocate('QT')[0] for _ in range(5)]
+        self.assertEqual(first, [1, 2, 3, 4, 5])
+        self.assertEqual(DocumentSequence.objects.get(prefix='QT').last_value, 5)
+        self.assertEqual(self.allocator.allocate('QT')[0], 6)
+        self.assertEqual(DocumentSequence.objects.get(prefix='QT').last_value, 10)
+
+    def test_block_survives_caller_rollback(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.allocator.allocate('RC')
+            raise RuntimeError
+        self.assertEqual(DocumentSequence.objects.get(prefix='RC').last_value, 5)
+
+
+class ConcurrentDocumentNumberTests(TransactionTestCase):
+    workers = 8
+    per_worker = 10
+
+    def test_concurrent_creates_never_collide(self):
+        acme = make_client()
+
+        def create_documents(_):
+            try:
+                for _ in range(self.per_worker):
+                    with transaction.atomic():
+                        make_quotation(acme)
+                        make_receipt(acme)
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(create_documents, range(self.workers)))
+
+        expected = self.workers * self.per_worker
+        numbers = list(Quotation.objects.values_list('quotation_number', flat=True))
+        self.assertEqual(len(set(numbers)), expected)
+        self.assertEqual(
+            sorted(numbers), [numbering.format_number('QT', n) for n in range(1, expected + 1)]
+        )
+        self.assertEqual(Receipt.objects.values('receipt_number').distinct().count(), expected)
+
+
+def run_jobs(**options):
+    call_command('run_jobs', '--once', '--pool', options.pop('pool', 'inline'), stdout=StringIO(), **options)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailJobTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_client(email='acme@example.com')
+
+    def test_send_email_is_queued_and_sent_by_the_worker(self):
+        quotation = make_quotation(self.acme)
+        add_items(quotation)
+        response = self.client.post(reverse('quotation-send-email', args=[quotation.pk]))
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'QUEUED')
+        self.assertEqual(len(mail.outbox), 0)
+
+        run_jobs()
+
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['acme@example.com'])
+        self.assertIn(quotation.quotation_number, message.subject)
+        self.assertEqual(message.attachments[0][2], 'application/pdf')
+
+        status_response = self.client.get(response.data['status_url'])
+        self.assertEqual(status_response.data['status'], 'SUCCEEDED')
+        self.assertEqual(status_response.data['result']['to'], 'acme@example.com')
+
+    def test_receipt_email_job(self):
+        receipt = make_receipt(self.acme)
+        response = self.client.post(reverse('receipt-send-email', args=[receipt.pk]))
+        self.assertEqual(response.status_code, 202)
+        run_jobs()
+        self.assertEqual(Job.objects.get(pk=response.data['job_id']).status, 'SUCCEEDED')
+        self.assertIn(receipt.receipt_number, mail.outbox[0].subject)
+
+    @override_settings(JOB_RETRY_BACKOFF=10)
+    def test_failures_are_retried_with_backoff_then_marked_failed(self):
+        receipt = make_receipt(self.acme)
+        job = jobs.enqueue('send_receipt_email', {'receipt_id': receipt.pk}, max_attempts=2)
+
+        with mock.patch('api.utils.email_service.EmailMessage.send', side_effect=OSError('SMTP down')):
+            before = timezone.now()
+            run_jobs()
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'QUEUED')
+            self.assertEqual(job.attempts, 1)
+            self.assertIn('SMTP down', job.last_error)
+            self.assertGreaterEqual(job.run_after, before + timedelta(seconds=10))
+
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            run_jobs()
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'FAILED')
+            self.assertEqual(job.attempts, 2)
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        with self.settings(JOB_RETRY_BACKOFF=30, JOB_RETRY_BACKOFF_MAX=100):
+            self.assertEqual([jobs.backoff(n) for n in (1, 2, 3, 4)], [30, 60, 100, 100])
+
+    def test_expired_lease_is_reclaimed(self):
+        receipt = make_receipt(self.acme)
+        job = jobs.enqueue('send_receipt_email', {'receipt_id': receipt.pk})
+        Job.objects.filter(pk=job.pk).update(
+            status='RUNNING', attempts=1, locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'SUCCEEDED')
+        self.assertEqual(job.attempts, 2)
+
+    def test_worker_that_lost_its_lease_does_not_overwrite_the_new_owner(self):
+        taken_over = []
+
+        def handler():
+            if not taken_over:
+                # The lease runs out mid-run and another worker claims the job
+                Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+                taken_over.append(jobs.claim())
+            return {'done': True}
+
+        with mock.patch.dict(jobs._handlers, {'slow': handler}):
+            job = jobs.enqueue('slow', max_attempts=2)
+            with self.assertLogs('api.jobs', 'ERROR'):
+                first = jobs.run(jobs.claim())
+            self.assertEqual((first.status, first.attempts), ('RUNNING', 2))
+            job.refresh_from_db()
+            self.assertIsNone(job.result)
+
+            second = jobs.run(taken_over[0])
+        self.assertEqual((second.status, second.attempts), ('SUCCEEDED', 2))
+
+    def test_expired_lease_on_the_last_attempt_fails_the_job(self):
+        with mock.patch.dict(jobs._handlers, {'slow': lambda: None}):
+            job = jobs.enqueue('slow', max_attempts=1)
+            claimed = jobs.claim()
+            Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+            with self.assertLogs('api.jobs', 'ERROR'):
+                self.assertIsNone(jobs.claim())
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('FAILED', 1))
+            self.assertIn('lease', job.last_error)
+            # The original worker finishing late does not revive it
+            with self.assertLogs('api.jobs', 'ERROR'):
+                self.assertEqual(jobs.run(claimed).status, 'FAILED')
+
+    def test_jobs_are_private_to_their_creator(self):
+        receipt = make_receipt(self.acme)
+        job = jobs.enqueue('send_receipt_email', {'receipt_id': receipt.pk}, user=self.user)
+        other = User.objects.create_user(username='other', password='password123')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(reverse('job-detail', args=[job.pk])).status_code, 404)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class ThreadedJobWorkerTests(TransactionTestCase):
+    def test_thread_pool_drains_the_queue(self):
+        acme = make_client()
+        for _ in range(5):
+            jobs.enqueue('send_receipt_email', {'receipt_id': make_receipt(acme).pk})
+
+        run_jobs(pool='thread', workers=3)
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertFalse(Job.objects.exclude(status='SUCCEEDED').exists())
+
+
+class JobLeaseRenewalTests(TransactionTestCase):
+    @override_settings(JOB_LEASE_SECONDS=0.3)
+    def test_lease_is_renewed_while_the_handler_runs(self):
+        import time
+        leases = []
+
+        def handler():
+            for _ in range(3):
+                leases.append(Job.objects.get(pk=job.pk).locked_until)
+                time.sleep(0.25)
+            # Still ours: nobody could have claimed it
+            self.assertIsNone(jobs.claim())
+
+        with mock.patch.dict(jobs._handlers, {'slow': handler}):
+            job = jobs.enqueue('slow')
+            self.assertEqual(jobs.run(jobs.claim()).status, 'SUCCEEDED')
+        self.assertEqual(leases, sorted(set(leases)))
+        self.assertEqual(Job.objects.get(pk=job.pk).attempts, 1)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class BulkEmailTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_client(email='acme@example.com')
+        self.globex = make_client(email='globex@example.com')
+        self.paid = [make_receipt(self.acme, status='PAID') for _ in range(4)]
+        self.pending = make_receipt(self.globex, status='PENDING')
+        for receipt in self.paid:
+            add_items(receipt)
+
+    def test_bulk_send_action_queues_a_filtered_job(self):
+        response = self.client.post(reverse('receipt-bulk-send'), {'status': 'paid'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        run_jobs()
+
+        job = Job.objects.get(pk=response.data['job_id'])
+        self.assertEqual(job.status, 'SUCCEEDED')
+        self.assertEqual(job.result['sent'], 4)
+        self.assertEqual(
+            sorted(r['number'] for r in job.result['results']),
+            sorted(r.receipt_number for r in self.paid),
+        )
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_invalid_filters_are_rejected(self):
+        response = self.client.post(reverse('quotation-bulk-send'), {'status': 'PAID'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            reverse('quotation-bulk-send'),
+            {'date_from': '2025-02-01', 'date_to': '2025-01-01'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_messages_share_pooled_connections(self):
+        from django.core.mail import get_connection as real_get_connection
+        from .utils.email_service import send_bulk_receipt_emails
+
+        opened = []
+
+        def counting_get_connection(*args, **kwargs):
+            connection = real_get_connection(*args, **kwargs)
+            opened.append(connection)
+            return connection
+
+        with mock.patch('api.utils.email_service.get_connection', side_effect=counting_get_connection):
+            results = send_bulk_receipt_emails(Receipt.objects.all(), connections=2, batch_size=2)
+
+        self.assertEqual(len(opened), 2)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result['status'] == 'sent' for result in results))
+
+    def test_failures_are_reported_per_message(self):
+        from django.core.mail.backends.locmem import EmailBackend
+        from .utils.email_service import send_bulk_receipt_emails
+
+        original = EmailBackend.send_messages
+
+        def reject_globex(backend, messages):
+            if messages[0].to == ['globex@example.com']:
+                raise OSError('mailbox unavailable')
+            return original(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', reject_globex):
+            results = send_bulk_receipt_emails(Receipt.objects.all())
+
+        by_id = {result['id']: result for result in results}
+        self.assertEqual(by_id[self.pending.pk]['status'], 'failed')
+        self.assertIn('mailbox unavailable', by_id[self.pending.pk]['error'])
+        self.assertEqual(sum(r['status'] == 'sent' for r in results), 4)
+
+    def test_connection_that_cannot_open_fails_only_its_messages(self):
+        from django.core.mail.backends.locmem import EmailBackend
+        from .utils.email_service import send_bulk_receipt_emails
+
+        refused = EmailBackend()
+        refused.open = mock.Mock(side_effect=OSError('connection refused'))
+        pool = iter([EmailBackend(), refused])
+        with mock.patch('api.utils.email_service.get_connection', side_effect=lambda: next(pool)):
+            results = send_bulk_receipt_emails(Receipt.objects.order_by('pk'), connections=2, batch_size=5)
+
+        self.assertEqual(len(results), 5)
+        failed = [result for result in results if result['status'] == 'failed']
+        # Every other message of the batch went to the refused connection
+        self.assertEqual(len(failed), 2)
+        self.assertTrue(all('connection refused' in result['error'] for result in failed))
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_management_command_reports_each_message(self):
+        out = StringIO()
+        call_command('send_bulk_emails', 'receipts', '--client', str(self.globex.pk), stdout=out)
+        self.assertIn(f'{self.pending.receipt_number}: sent', out.getvalue())
+        self.assertIn('Sent 1, failed 0', out.getvalue())
+
+    def test_date_range_filter(self):
+        from .filters import filter_documents
+        old = make_quotation(self.acme, date=date(2024, 1, 15))
+        make_quotation(self.acme, date=date(2024, 3, 1))
+        filtered = filter_documents(
+            Quotation.objects.all(), {'date_from': date(2024, 1, 1), 'date_to': date(2024, 1, 31)}
+        )
+        self.assertEqual(list(filtered), [old])
+
+
+class PDFTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_client()
+
+    def read(self, response):
+        return response.content
+
+    def test_quotation_pdf_is_served(self):
+        quotation = make_quotation(self.acme)
+        add_items(quotation, count=3)
+        response = self.client.get(reverse('quotation-pdf', args=[quotation.pk]))
+        body = self.read(response)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(body.startswith(b'%PDF'))
+        self.assertIn(f'quotation_{quotation.pk}.pdf', response['Content-Disposition'])
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+
+    def test_receipt_pdf_download_and_pdf_accept_header(self):
+        receipt = make_receipt(self.acme)
+        response = self.client.get(
+            reverse('receipt-pdf', args=[receipt.pk]) + '?download=1', HTTP_ACCEPT='application/pdf'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        self.assertTrue(self.read(response).startswith(b'%PDF'))
+
+    def test_missing_document_is_a_json_404(self):
+        response = self.client.get(reverse('receipt-pdf', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_email_attaches_rendered_bytes(self):
+        from .utils.email_service import send_receipt_email
+        receipt = make_receipt(self.acme)
+        send_receipt_email(receipt)
+        name, content, mimetype = mail.outbox[0].attachments[0]
+        self.assertEqual(name, f'receipt_{receipt.pk}.pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
+
+
+class PDFCacheTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        from .utils.pdf_cache import PDFCache
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = PDFCache(directory=self.tmp.name)
+        patcher = mock.patch('api.utils.pdf_cache.pdf_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+        # The signal handlers hold their own reference to the shared cache
+        signal_patcher = mock.patch('api.signals.pdf_cache', self.cache)
+        signal_patcher.start()
+        self.addCleanup(signal_patcher.stop)
+
+        self.quotation = make_quotation(make_client())
+        self.items = add_items(self.quotation, count=2)
+
+    def fetch(self):
+        return self.client.get(reverse('quotation-pdf', args=[self.quotation.pk])).content
+
+    def test_second_request_is_served_from_cache(self):
+        with mock.patch('api.utils.pdf_cache.generate_quotation_pdf', return_value=b'%PDF-1') as render:
+            self.assertEqual(self.fetch(), b'%PDF-1')
+            self.assertEqual(self.fetch(), b'%PDF-1')
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_item_save_invalidates_entry(self):
+        self.fetch()
+        self.assertEqual(self.cache.stats()['entries'], 1)
+        item = self.items[0]
+        item.quantity = 9
+        item.save()
+        self.assertEqual(self.cache.stats()['entries'], 0)
+        self.fetch()
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_document_save_and_delete_invalidate_entry(self):
+        self.fetch()
+        self.quotation.save()
+        self.assertEqual(self.cache.stats()['entries'], 0)
+        self.fetch()
+        self.quotation.delete()
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_client_rename_changes_the_key(self):
+        before = self.cache.path_for(self.quotation)
+        self.quotation.client.name = 'Renamed'
+        self.assertNotEqual(self.cache.path_for(self.quotation), before)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        import os
+        import time
+        from .utils.pdf_cache import render_quotation_pdf
+
+        others = [make_quotation(self.quotation.client) for _ in range(2)]
+        with mock.patch('api.utils.pdf_cache.generate_quotation_pdf', return_value=b'x' * 100):
+            self.cache._max_bytes = 250
+            render_quotation_pdf(self.quotation)
+            render_quotation_pdf(others[0])
+            # Make the first entry the most recently used
+            old = time.time() - 60
+            os.utime(self.cache.path_for(others[0]), (old, old))
+            render_quotation_pdf(self.quotation)
+            render_quotation_pdf(others[1])
+
+        self.assertTrue(self.cache.path_for(self.quotation).exists())
+        self.assertFalse(self.cache.path_for(others[0]).exists())
+        self.assertTrue(self.cache.path_for(others[1]).exists())
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertLessEqual(self.cache.stats()['bytes'], 250)
+
+    def test_misses_within_budget_do_not_scan_the_directory(self):
+        from .utils.pdf_cache import render_quotation_pdf
+
+        others = [make_quotation(self.quotation.client) for _ in range(3)]
+        with mock.patch('api.utils.pdf_cache.generate_quotation_pdf', return_value=b'x' * 100), \
+                mock.patch.object(self.cache, '_entries', wraps=self.cache._entries) as scan:
+            self.cache._max_bytes = 350
+            for quotation in [self.quotation, *others[:2]]:
+                render_quotation_pdf(quotation)
+            # Only the first miss, which has no running total yet
+            self.assertEqual(scan.call_count, 1)
+            render_quotation_pdf(others[2])
+            self.assertEqual(scan.call_count, 2)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertEqual(self.client.get(reverse('pdf-cache-stats')).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('pdf-cache-stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hit_rate', response.data)
+
+
+class PDFExportTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_client()
+        self.other = make_client(name='Other', email='other@example.com')
+        self.paid = [make_receipt(self.acme, status='PAID') for _ in range(3)]
+        for receipt in self.paid:
+            add_items(receipt)
+        make_receipt(self.acme, status='PENDING')
+        make_receipt(self.other, status='PAID')
+
+    def unzip(self, data):
+        import io
+        import zipfile
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            return {name: archive.read(name) for name in archive.namelist()}
+
+    def test_endpoint_streams_filtered_pdfs_from_process_pool(self):
+        response = self.client.get(
+            reverse('receipt-export-pdfs'), {'status': 'paid', 'client': self.acme.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn('receipts.zip', response['Content-Disposition'])
+        members = self.unzip(b''.join(response.streaming_content))
+        self.assertEqual(set(members), {f'receipt_{receipt.pk}.pdf' for receipt in self.paid})
+        self.assertTrue(all(data.startswith(b'%PDF') for data in members.values()))
+
+    def test_exports_share_one_pool(self):
+        from .utils import pdf_export
+        executor = ThreadPoolExecutor(2)
+        self.addCleanup(executor.shutdown)
+        with mock.patch.object(pdf_export, '_shared_executor', None), \
+                mock.patch.object(pdf_export, '_executor', return_value=executor) as create:
+            for _ in range(2):
+                response = self.client.get(reverse('receipt-export-pdfs'), {'status': 'paid'})
+                self.assertEqual(len(self.unzip(b''.join(response.streaming_content))), 4)
+        create.assert_called_once()
+        # Still usable: the exports did not shut it down
+        self.assertEqual(executor.submit(len, 'ok').result(), 2)
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get(reverse('quotation-export-pdfs'), {'status': 'PAID'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_archive_is_yielded_incrementally_with_bounded_window(self):
+        from .utils.pdf_export import stream_pdf_zip
+        chunks = list(stream_pdf_zip(Receipt.objects.all(), workers=2, window=2, pool='thread'))
+        # Members are flushed as they complete, not once at the end
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(len(self.unzip(b''.join(chunks))), Receipt.objects.count())
+
+    def test_management_command_writes_archive(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f'{tmp}/receipts.zip'
+            out = StringIO()
+            with mock.patch('api.utils.pdf_export._executor', side_effect=lambda workers, pool: ThreadPoolExecutor(workers)):
+                call_command('export_pdfs', 'receipts', '--status', 'PAID', '--output', path, stdout=out)
+            with open(path, 'rb') as archive:
+                self.assertEqual(len(self.unzip(archive.read())), 4)
+        self.assertIn('Wrote 4 PDFs', out.getvalue())
+
+
+class StreamingExportTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_client(name='Acme, Inc.')
+        self.receipts = [make_receipt(self.acme, status='PAID') for _ in range(3)]
+        for receipt in self.receipts:
+            add_items(receipt, count=2)
+        self.bare = make_receipt(self.acme, status='PENDING')
+
+    def export(self, url, params=None, **extra):
+        response = self.client.get(url, params or {}, **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, ''.join(chunk.decode() for chunk in response.streaming_content)
+
+    def test_csv_with_flattened_items(self):
+        import csv
+        response, body = self.export(reverse('receipt-export'), {'format': 'csv', 'items': 'flat'})
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('receipts.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(body)))
+        # Two rows per receipt with items, one for the receipt without
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[0]['client_name'], 'Acme, Inc.')
+        self.assertEqual(rows[0]['item_description'], 'Item 0')
+        self.assertEqual(rows[-1]['receipt_number'], self.bare.receipt_number)
+        self.assertEqual(rows[-1]['item_id'], '')
+
+    def test_ndjson_with_nested_items_and_filter(self):
+        import json
+        response, body = self.export(
+            reverse('receipt-export'), {'status': 'PAID'}, HTTP_ACCEPT='application/x-ndjson'
+        )
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([r['id'] for r in records], [r.pk for r in self.receipts])
+        self.assertEqual(len(records[0]['items']), 2)
+        self.assertEqual(records[0]['items'][1]['total'], '20.00')
+        self.assertEqual(records[0]['client'], self.acme.pk)
+
+    def test_clients_export(self):
+        _, body = self.export(reverse('client-export'), {'format': 'csv'})
+        lines = body.splitlines()
+        self.assertEqual(lines[0], 'id,name,email,phone,address,company,created_at,updated_at')
+        self.assertEqual(len(lines), 2)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_reads_in_bounded_chunks(self):
+        from .exports import stream_export
+        with CaptureQueriesContext(connection) as ctx:
+            chunks = list(stream_export(Receipt.objects.all(), 'ndjson'))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(sum(chunk.count('\n') for chunk in chunks), 4)
+        # Documents and items per chunk, plus the final empty page
+        self.assertEqual(len(ctx.captured_queries), 5)
+        self.assertTrue(all('OFFSET' not in q['sql'] for q in ctx.captured_queries))
+
+    def test_invalid_items_layout_is_rejected(self):
+        response = self.client.get(reverse('quotation-export'), {'items': 'sideways'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkImportTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_client(email='acme@example.com')
+
+    def upload(self, kind, name, content, **data):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return self.client.post(
+            reverse(f'{kind}-import-records'),
+            {'file': SimpleUploadedFile(name, content.encode()), **data},
+            format='multipart',
+        )
+
+    def test_clients_are_deduplicated_on_email(self):
+        content = (
+            'name,email,phone,company\n'
+            'Acme again,acme@example.com,1,\n'
+            'Globex,globex@example.com,2,Globex Corp\n'
+            'Globex twice,globex@example.com,3,\n'
+            'Broken,not-an-email,4,\n'
+        )
+        response = self.upload('client', 'clients.csv', content)
+        self.assertEqual(response.status_code, 200)
+        report = response.data
+        self.assertEqual((report['rows'], report['created'], report['skipped'], report['failed']), (4, 1, 2, 1))
+        self.assertEqual(report['errors'][0]['row'], 4)
+        self.assertIn('email', report['errors'][0]['errors'])
+        self.assertEqual(Client.objects.get(email='globex@example.com').company, 'Globex Corp')
+        self.assertEqual(self.client.get(reverse('dashboard')).data['total_clients'], 2)
+
+    def test_receipts_import_in_chunks_with_block_numbers(self):
+        import json
+        records = [
+            {'client_email': 'acme@example.com', 'payment_method': 'CARD', 'tax': '1.00',
+             'items': [{'description': f'Line {i}', 'quantity': 2, 'unit_price': '5.00'}] * 3}
+            for i in range(10)
+        ]
+        records[4]['client_email'] = 'nobody@example.com'
+        content = '\n'.join(json.dumps(record) for record in records)
+
+        with override_settings(IMPORT_CHUNK_SIZE=5), CaptureQueriesContext(connection) as ctx:
+            response = self.upload('receipt', 'receipts.ndjson', content)
+
+        report = response.data
+        self.assertEqual((report['created'], report['failed']), (9, 1))
+        self.assertEqual(report['errors'][0], {'row': 5, 'errors': {'client_email': ['No client with this email.']}})
+        self.assertIsNotNone(report['rows_per_second'])
+        self.assertEqual(ReceiptItem.objects.count(), 27)
+        receipt = Receipt.objects.order_by('id').first()
+        self.assertEqual((receipt.subtotal, receipt.total), (Decimal('30.00'), Decimal('31.00')))
+        numbers = sorted(Receipt.objects.values_list('receipt_number', flat=True))
+        self.assertEqual(numbers, [f'RC-{n:05d}' for n in range(1, 10)])
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "api_receipt')]
+        # One parent and one item insert per chunk
+        self.assertEqual(len(inserts), 4)
+        self.assertEqual(self.client.get(reverse('dashboard')).data['total_receipts'], 9)
+
+    def test_flat_csv_export_round_trips_through_command(self):
+        import os
+        quotation = make_quotation(self.acme, date=date(2024, 5, 1), status='SENT')
+        add_items(quotation, count=3)
+        exported = self.client.get(reverse('quotation-export'), {'format': 'csv', 'items': 'flat'})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'quotations.csv')
+            with open(path, 'wb') as output:
+                output.writelines(exported.streaming_content)
+            out = StringIO()
+            call_command('import_records', 'quotations', path, stdout=out)
+
+        self.assertIn('created 1', out.getvalue())
+        copy = Quotation.objects.exclude(pk=quotation.pk).get()
+        self.assertNotEqual(copy.quotation_number, quotation.quotation_number)
+        self.assertEqual((copy.date, copy.status, copy.total), (quotation.date, 'SENT', Decimal('60.00')))
+        self.assertEqual(
+            list(copy.items.values_list('description', 'quantity')),
+            list(quotation.items.values_list('description', 'quantity')),
+        )
+
+    def test_json_array_is_read_incrementally(self):
+        import io
+        import json
+        from .imports import _read_json_array
+        records = [{'name': f'Client {i}', 'email': f'c{i}@example.com'} for i in range(20)]
+        stream = io.StringIO(json.dumps(records, indent=1))
+        self.assertEqual([record for _, record in _read_json_array(stream, buffer_size=16)], records)
+
+        response = self.upload('client', 'broken.json', '[{"name": "A", "email": "a@example.com", "phone": "1"}, {"na')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], None)
+
+    def test_unknown_format_is_rejected(self):
+        response = self.upload('client', 'clients.xlsx', 'x')
+        self.assertEqual(response.status_code, 400)
+
+
+class ListFilterTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_client()
+        self.other = make_client()
+        self.receipts = [
+            make_receipt(self.acme, status='PAID', payment_method='CASH', total=Decimal('50.00')),
+            make_receipt(self.acme, status='PENDING', payment_method='CARD', total=Decimal('150.00')),
+            make_receipt(self.other, status='PAID', payment_method='CARD', total=Decimal('250.00')),
+        ]
+        old = timezone.now() - timedelta(days=60)
+        Receipt.objects.filter(pk=self.receipts[0].pk).update(date=old, created_at=old)
+
+    def ids(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['id'] for row in response.data['results']]
+
+    def test_receipt_filters(self):
+        url = reverse('receipt-list')
+        paid, pending, other = (r.pk for r in self.receipts)
+        self.assertEqual(self.ids(url, status='paid'), [other, paid])
+        self.assertEqual(self.ids(url, payment_method='CARD'), [other, pending])
+        self.assertEqual(self.ids(url, client=self.acme.pk), [pending, paid])
+        self.assertEqual(self.ids(url, total_min='100', total_max='200'), [pending])
+        since = (timezone.localdate() - timedelta(days=7)).isoformat()
+        self.assertEqual(self.ids(url, date_from=since), [other, pending])
+        self.assertEqual(self.ids(url, created_to=since), [paid])
+
+    def test_ordering_is_keyset_paginated(self):
+        url = reverse('receipt-list')
+        response = self.client.get(url, {'ordering': '-total', 'page_size': 2})
+        self.assertEqual([row['total'] for row in response.data['results']], ['250.00', '150.00'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['total'] for row in response.data['results']], ['50.00'])
+
+    def test_client_filters_and_ordering(self):
+        url = reverse('client-list')
+        self.assertEqual(self.ids(url, ordering='name'), [self.acme.pk, self.other.pk])
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertEqual(self.ids(url, created_from=tomorrow), [])
+
+    def test_invalid_filters_are_rejected(self):
+        self.assertEqual(self.client.get(reverse('quotation-list'), {'payment_method': 'CASH'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('receipt-list'), {'status': 'SENT'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('receipt-list'), {'total_min': '5', 'total_max': '1'}).status_code, 400)
+
+    def test_filtered_queries_search_an_index(self):
+        import json
+        out = StringIO()
+        call_command('benchmark_list_filters', '--check', '--json', '--repeat', '1', stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertTrue(results)
+        for result in results:
+            self.assertFalse(result['full_scan'], result)
+            self.assertTrue(any('USING INDEX' in line for line in result['plan']), result)
+
+
+class SearchTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.acme = make_client(name='ACME Events', company='Acme Holdings')
+            self.globex = make_client(name='Globex', email='ops@globex.example')
+            self.tent = make_quotation(self.acme, notes='Garden wedding')
+            QuotationItem.objects.create(
+                quotation=self.tent, description='Marquee tent 10x20', quantity=1, unit_price=Decimal('900.00')
+            )
+            self.chairs = make_quotation(self.globex)
+            QuotationItem.objects.create(
+                quotation=self.chairs, description='Folding chairs', quantity=100, unit_price=Decimal('2.00')
+            )
+            self.receipt = make_receipt(self.acme, notes='Deposit for the marquee')
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('search'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_finds_document_by_item_and_client(self):
+        results = self.search('marquee tent acme')['results']
+        self.assertEqual([(r['type'], r['id']) for r in results], [('quotation', self.tent.pk)])
+        self.assertIn('<mark>Marquee</mark>', results[0]['snippet'])
+        self.assertTrue(results[0]['url'].endswith(f'/api/quotations/{self.tent.pk}/'))
+
+    def test_ranked_prefix_search_with_type_filter_and_pages(self):
+        data = self.search('acm')
+        # The client itself matches on its title column and ranks first
+        self.assertEqual((data['results'][0]['type'], data['results'][0]['id']), ('client', self.acme.pk))
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(self.search('acme', type='receipt')['count'], 1)
+        page = self.search('acme', page_size=2)
+        self.assertEqual(len(page['results']), 2)
+        self.assertIsNotNone(page['next'])
+
+    def test_signals_keep_index_current(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.globex.name = 'Initech'
+            self.globex.save()
+        self.assertEqual({r['type'] for r in self.search('initech')['results']}, {'client', 'quotation'})
+        # Both still match on the email address
+        self.assertEqual(self.search('globex')['count'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('quotation-detail', args=[self.chairs.pk]),
+                {'items': [{'description': 'Banquet tables', 'quantity': 10, 'unit_price': '5.00'}]},
+                format='json',
+            )
+        self.assertEqual(self.search('banquet')['count'], 1)
+        self.assertEqual(self.search('folding')['count'], 0)
+
+        self.tent.delete()
+        self.assertEqual(self.search('marquee tent')['count'], 0)
+
+    def test_rebuild_command_and_bad_queries(self):
+        from django.db import connection as db
+        with db.cursor() as cursor:
+            cursor.execute('DELETE FROM api_search_index')
+        self.assertEqual(self.search('marquee')['count'], 0)
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('2 quotations', out.getvalue())
+        self.assertEqual(self.search('marquee')['count'], 2)
+
+        self.assertEqual(self.client.get(reverse('search'), {'q': ' "* '}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('search'), {'q': 'x', 'type': 'job'}).status_code, 400)
+
+    def test_databases_without_fts5_skip_the_index_and_match_the_tables(self):
+        with mock.patch.object(search, 'available', return_value=False):
+            with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+                self.acme.save()
+                self.tent.delete()
+                QuotationItem.objects.create(
+                    quotation=self.chairs, description='Marquee poles', quantity=4, unit_price=Decimal('10.00')
+                )
+            self.assertFalse([q for q in ctx.captured_queries if 'api_search_index' in q['sql']])
+            self.assertIsNone(search.rebuild())
+
+            results = self.search('marquee')['results']
+            self.assertEqual(
+                [(r['type'], r['id']) for r in results], [('quotation', self.chairs.pk), ('receipt', self.receipt.pk)]
+            )
+            self.assertEqual(results[0]['client'], 'Globex  ops@globex.example')
+            self.assertEqual(self.search('acme events', type='client')['count'], 1)
+            self.assertEqual(self.search('acme marquee poles')['count'], 0)
+
+
+class ConditionalGetTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_client()
+        self.quotation = make_quotation(self.acme)
+        self.items = add_items(self.quotation)
+
+    def test_list_revalidates_without_serializing(self):
+        url = reverse('quotation-list')
+        first = self.client.get(url)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', first)
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        with mock.patch.object(QuotationSerializer, 'to_representation') as serialize, \
+                CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        serialize.assert_not_called()
+        # Authentication is forced, so the aggregate is the only query
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        # Filters and cursors are part of the validator
+        self.assertNotEqual(self.client.get(url, {'status': 'SENT'})['ETag'], first['ETag'])
+
+    def test_list_etag_changes_on_edit_and_delete(self):
+        url = reverse('client-list')
+        make_client()
+        etag = self.client.get(url)['ETag']
+        Client.objects.order_by('id').last().delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(url)['ETag']
+        self.acme.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_strong_etag_tracks_items_and_client(self):
+        url = reverse('quotation-detail', args=[self.quotation.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        item = self.items[0]
+        item.quantity = 7
+        item.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        self.acme.name = 'Renamed'
+        self.acme.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['client_name'], 'Renamed')
+
+    def test_if_modified_since_and_missing_object(self):
+        url = reverse('receipt-detail', args=[make_receipt(self.acme).pk])
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(reverse('receipt-detail', args=[999])).status_code, 404)
+
+    def test_benchmark_reports_not_modified(self):
+        import json
+        out = StringIO()
+        call_command('benchmark_conditional_get', '--json', '--repeat', '1', stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertTrue(all(result['not_modified_status'] == 304 for result in results))
+
+
+class DeltaSyncTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_client()
+        self.receipts = [make_receipt(self.acme) for _ in range(3)]
+        self.url = reverse('receipt-list')
+        self.synced_at = self.client.get(self.url).data['synced_at']
+        # Move the existing rows out of the overlap window
+        earlier = timezone.now() - timedelta(minutes=5)
+        Receipt.objects.update(updated_at=earlier)
+        Client.objects.update(updated_at=earlier)
+
+    def sync(self, **params):
+        return self.client.get(self.url, {'updated_since': self.synced_at, **params})
+
+    def test_only_changes_and_deletions_are_returned(self):
+        changed, deleted, _ = self.receipts
+        changed.notes = 'Updated'
+        changed.save()
+        deleted_id = deleted.pk
+        deleted.delete()
+        new = make_receipt(self.acme)
+
+        response = self.sync()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [changed.pk, new.pk])
+        self.assertEqual(response.data['deleted'], [deleted_id])
+        self.assertIn('synced_at', response.data)
+
+    def test_cascaded_deletes_leave_tombstones(self):
+        client_id, receipt_ids = self.acme.pk, sorted(r.pk for r in self.receipts)
+        self.acme.delete()
+        self.assertEqual(sorted(self.sync().data['deleted']), receipt_ids)
+        response = self.client.get(reverse('client-list'), {'updated_since': self.synced_at})
+        self.assertEqual(response.data['deleted'], [client_id])
+
+    def test_deletion_changes_the_delta_etag(self):
+        etag = self.sync()['ETag']
+        self.receipts[0].delete()
+        self.assertEqual(self.sync(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_deleted_ids_only_on_first_page(self):
+        for receipt in self.receipts:
+            receipt.save()
+        deleted_id = self.receipts[0].pk
+        self.receipts[0].delete()
+        first = self.sync(page_size=1)
+        self.assertEqual(first.data['deleted'], [deleted_id])
+        second = self.client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 1)
+        self.assertNotIn('deleted', second.data)
+
+    def test_expired_sync_and_pruning(self):
+        from .models import Tombstone
+        old = (timezone.now() - timedelta(days=31)).isoformat()
+        self.assertEqual(self.client.get(self.url, {'updated_since': old}).status_code, 410)
+        self.assertEqual(self.client.get(self.url, {'updated_since': 'yesterday'}).status_code, 400)
+
+        expired, kept = (receipt.pk for receipt in self.receipts[:2])
+        self.receipts[0].delete()
+        self.receipts[1].delete()
+        Tombstone.objects.filter(object_id=expired).update(deleted_at=timezone.now() - timedelta(days=40))
+        out = StringIO()
+        call_command('prune_tombstones', stdout=out)
+        self.assertIn('Pruned 1', out.getvalue())
+        self.assertEqual(list(Tombstone.objects.values_list('object_id', flat=True)), [kept])
+
+
+class MetricsTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        from . import metrics
+        self.metrics = metrics
+        metrics.registry.clear()
+
+    def server_timing(self, response):
+        return dict(
+            (entry.split(';')[0], entry.split(';', 1)[1]) for entry in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing_counts_queries(self):
+        make_client()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('client-list'))
+        timing = self.server_timing(response)
+        self.assertIn('total', timing)
+        self.assertIn(f'desc="{len(queries)} queries"', timing['db'])
+        count, _ = self.metrics.REQUEST_QUERIES.snapshot(view='client-list', method='GET')
+        self.assertEqual(count, 1)
+
+    def test_pdf_render_is_timed(self):
+        quotation = make_quotation(make_client())
+        response = self.client.get(reverse('quotation-pdf', args=[quotation.pk]))
+        self.assertIn('pdf', self.server_timing(response))
+        count, seconds = self.metrics.PDF_RENDER_DURATION.snapshot(kind='quotation')
+        self.assertEqual(count, 1)
+        self.assertGreater(seconds, 0)
+
+    def test_email_send_is_timed(self):
+        from .utils.email_service import send_quotation_email
+        send_quotation_email(make_quotation(make_client()))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(self.metrics.EMAIL_SEND_DURATION.snapshot(kind='quotation')[0], 1)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('api.slow_requests', 'WARNING') as logs:
+            self.client.get(reverse('client-list'))
+        self.assertIn('GET /api/clients/ -> 200', logs.output[0])
+
+    def test_metrics_endpoint(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.get(reverse('client-list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE billing_http_request_duration_seconds histogram', body)
+        self.assertIn(
+            'billing_http_request_duration_seconds_bucket{method="GET",view="client-list",le="+Inf"} 1', body,
+        )
+        self.assertIn('billing_http_requests_total{method="GET",status="200",view="client-list"} 1.0', body)
+
+
+class SeedAndBenchmarkTests(TestCase):
+    def test_seed_billing(self):
+        out = StringIO()
+        call_command(
+            'seed_billing', clients=20, quotations=60, receipts=40, items=[2, 3], days=90, batch_size=25, seed=7,
+            stdout=out,
+        )
+        self.assertIn('Created 20 clients, 60 quotations and 40 receipts', out.getvalue())
+        self.assertEqual(Client.objects.count(), 20)
+
+        oldest = timezone.now() - timedelta(days=90, minutes=1)
+        for model in (Quotation, Receipt):
+            documents = list(model.objects.order_by('pk').prefetch_related('items'))
+            numbers = [getattr(document, f'{model._meta.model_name}_number') for document in documents]
+            self.assertEqual(numbers, sorted(numbers))
+            self.assertEqual(len(set(numbers)), len(numbers))
+            for document in documents:
+                self.assertIn(len(document.items.all()), (2, 3))
+                self.assertEqual(document.subtotal, sum(item.total for item in document.items.all()))
+                self.assertEqual(document.total, document.subtotal + document.tax)
+                self.assertGreaterEqual(document.created_at, max(oldest, document.client.created_at))
+            created = [document.created_at for document in documents]
+            self.assertEqual(created, sorted(created))
+
+        self.assertEqual(sum(MonthlyStats.objects.values_list('quotations', flat=True)), 60)
+        from .search import SearchResults
+        self.assertEqual(SearchResults('', 'quotation').count(), 0)
+        self.assertEqual(SearchResults(Quotation.objects.first().quotation_number, 'quotation').count(), 1)
+
+    def test_benchmark_reports_and_rolls_back(self):
+        from .benchmark import run
+        call_command('seed_billing', clients=3, quotations=5, receipts=5, seed=1, stdout=StringIO())
+        counts = [model.objects.count() for model in (User, Client, Quotation, Receipt, Job)]
+
+        report = run(repeat=2, only=['auth.token_refresh', 'clients', 'quotations'])
+
+        self.assertEqual([model.objects.count() for model in (User, Client, Quotation, Receipt, Job)], counts)
+        results = {result['name']: result for result in report['results']}
+        self.assertNotIn('receipts.list', results)
+        self.assertEqual(results['clients.list']['status'], {'200': 2})
+        self.assertEqual(results['clients.delete']['status'], {'204': 2})
+        self.assertEqual(results['quotations.send_email']['status'], {'202': 2})
+        self.assertEqual(results['clients.detail']['path'], '/api/clients/{id}/')
+        for result in results.values():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreaterEqual(result['queries'], 0)
+        self.assertEqual(len(mail.outbox), 2)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import caches
+        from . import response_cache
+        caches['responses'].clear()
+        response_cache.stats.reset()
+        self.stats = response_cache.stats
+        self.acme = make_client(name='ACME')
+        self.quotation = make_quotation(self.acme)
+        add_items(self.quotation)
+
+    def get(self, url, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, **extra)
+        return response, len(ctx.captured_queries)
+
+    def test_hit_runs_no_queries(self):
+        url = reverse('quotation-list')
+        first, _ = self.get(url)
+        second, queries = self.get(url)
+        self.assertEqual(queries, 0)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=first['ETag'])[0].status_code, 304)
+        self.assertEqual(self.stats.as_dict()['hits'], 2)
+
+        # Per user and per query string
+        other = User.objects.create_user(username='other', password='password123')
+        self.client.force_authenticate(other)
+        self.assertGreater(self.get(url)[1], 0)
+        self.assertGreater(self.get(url + '?status=SENT')[1], 0)
+
+    def test_item_change_invalidates_document(self):
+        detail = reverse('quotation-detail', args=[self.quotation.pk])
+        client_detail = reverse('client-detail', args=[self.acme.pk])
+        for url in (detail, reverse('quotation-list'), client_detail):
+            self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            item = self.quotation.items.first()
+            item.quantity = 9
+            item.save()
+
+        response, queries = self.get(detail)
+        self.assertGreater(queries, 0)
+        self.assertEqual(response.json()['items'][0]['quantity'], 9)
+        self.assertEqual(self.get(reverse('quotation-list'))[0].json()['results'][0]['items'][0]['quantity'], 9)
+        # Unrelated entries stay cached
+        self.assertEqual(self.get(client_detail)[1], 0)
+
+    def test_client_change_invalidates_documents_showing_it(self):
+        other = make_quotation(make_client(name='Other'))
+        urls = [reverse('quotation-detail', args=[pk]) for pk in (self.quotation.pk, other.pk)]
+        for url in urls:
+            self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.acme.name = 'ACME Events'
+            self.acme.save()
+        self.assertEqual(self.get(urls[0])[0].json()['client_name'], 'ACME Events')
+        self.assertEqual(self.get(urls[1])[1], 0)
+
+    def test_delete_and_bulk_import_invalidate_lists(self):
+        url = reverse('client-list')
+        self.assertEqual(len(self.get(url)[0].json()['results']), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.acme.delete()
+        self.assertEqual(self.get(url)[0].json()['results'], [])
+
+        from .imports import import_file
+        import_file('clients', BytesIO(b'name,email,phone\nNew,new@example.com,1\n'), 'csv')
+        self.assertEqual(len(self.get(url)[0].json()['results']), 1)
+
+    def test_evicted_generation_never_serves_stale(self):
+        from django.core.cache import caches
+        url = reverse('client-list')
+        self.get(url)
+        caches['responses'].delete('gen:client')
+        Client.objects.filter(pk=self.acme.pk).update(name='Changed without signals')
+        self.assertEqual(self.get(url)[0].json()['results'][0]['name'], 'Changed without signals')
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'responses': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': tempfile.gettempdir() + '/billing-test-responses',
+            'OPTIONS': {'MAX_ENTRIES': 5, 'CULL_FREQUENCY': 2},
+        },
+    })
+    def test_file_backend_is_bounded(self):
+        from django.core.cache import caches
+        caches['responses'].clear()
+        for n in range(12):
+            self.get(reverse('client-list') + f'?page_size={n + 1}')
+        self.assertLessEqual(len(os.listdir(tempfile.gettempdir() + '/billing-test-responses')), 6)
+        caches['responses'].clear()
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('response-cache-stats')).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.get(reverse('client-list'))
+        self.get(reverse('client-list'))
+        response = self.client.get(reverse('response-cache-stats'))
+        self.assertEqual(response.data['hits'], 1)
+        self.assertEqual(response.data['hit_rate'], 0.5)
+
+
+class ClientTotalsTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_client()
+        self.other = make_client()
+
+    def totals(self, client):
+        client.refresh_from_db()
+        return client.receipt_count, client.total_paid, client.open_quotation_count, client.last_payment_at
+
+    def test_document_writes_keep_totals_current(self):
+        paid = make_receipt(self.acme, total=Decimal('100.00'))
+        make_receipt(self.acme, status='PENDING', total=Decimal('40.00'))
+        quotation = make_quotation(self.acme, status='SENT')
+        self.assertEqual(self.totals(self.acme), (1, Decimal('100.00'), 1, paid.date))
+
+        quotation.status = 'ACCEPTED'
+        quotation.save()
+        paid.status = 'CANCELLED'
+        paid.save()
+        self.assertEqual(self.totals(self.acme), (0, Decimal('0.00'), 0, None))
+
+        paid.status = 'PAID'
+        paid.client = self.other
+        paid.save()
+        self.assertEqual(self.totals(self.acme)[:2], (0, Decimal('0.00')))
+        self.assertEqual(self.totals(self.other)[:2], (1, Decimal('100.00')))
+
+        paid.delete()
+        self.assertEqual(self.totals(self.other), (0, Decimal('0.00'), 0, None))
+
+    def test_change_moves_client_etag(self):
+        url = reverse('client-detail', args=[self.acme.pk])
+        etag = self.client.get(url)['ETag']
+        Client.objects.filter(pk=self.acme.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        make_receipt(self.acme, total=Decimal('25.00'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_paid'], '25.00')
+        self.assertEqual(response.data['receipt_count'], 1)
+
+    def test_filters_and_null_safe_ordering(self):
+        third = make_client()
+        make_receipt(self.acme, total=Decimal('500.00'), date=timezone.now() - timedelta(days=10))
+        make_receipt(self.other, total=Decimal('50.00'))
+        make_quotation(self.other, status='DRAFT')
+        url = reverse('client-list')
+
+        def ids(**params):
+            return [row['id'] for row in self.client.get(url, params).data['results']]
+
+        self.assertEqual(ids(total_paid_min='100'), [self.acme.pk])
+        self.assertEqual(ids(has_open_quotations='true'), [self.other.pk])
+        self.assertEqual(ids(has_open_quotations='false', ordering='name'), [self.acme.pk, third.pk])
+        self.assertEqual(ids(min_receipts=1, ordering='name'), [self.acme.pk, self.other.pk])
+        since = (timezone.localdate() - timedelta(days=3)).isoformat()
+        self.assertEqual(ids(last_payment_from=since), [self.other.pk])
+        self.assertEqual(self.client.get(url, {'total_paid_min': '5', 'total_paid_max': '1'}).status_code, 400)
+
+        # Clients that never paid sort first ascending and last descending, across pages
+        for ordering, expected in [
+            ('last_payment_at', [third.pk, self.acme.pk, self.other.pk]),
+            ('-last_payment_at', [self.other.pk, self.acme.pk, third.pk]),
+        ]:
+            seen, page = [], self.client.get(url, {'ordering': ordering, 'page_size': 1})
+            while True:
+                seen.extend(row['id'] for row in page.data['results'])
+                if not page.data['next']:
+                    break
+                page = self.client.get(page.data['next'])
+            self.assertEqual(seen, expected, ordering)
+            previous = self.client.get(page.data['previous'])
+            self.assertEqual([row['id'] for row in previous.data['results']], expected[-2:-1])
+
+    def test_reconcile_fixes_drift(self):
+        make_receipt(self.acme, total=Decimal('80.00'))
+        Client.objects.filter(pk=self.acme.pk).update(total_paid=Decimal('1.00'), receipt_count=7)
+
+        out = StringIO()
+        call_command('reconcile_client_totals', '--dry-run', stdout=out)
+        self.assertIn('Found 1 clients', out.getvalue())
+        self.assertEqual(self.totals(self.acme)[:2], (7, Decimal('1.00')))
+
+        call_command('reconcile_client_totals', stdout=out)
+        self.assertIn('Fixed 1 clients', out.getvalue())
+        self.assertEqual(self.totals(self.acme)[:2], (1, Decimal('80.00')))
+
+    def test_bulk_import_refreshes_totals(self):
+        from .imports import import_file
+        record = (
+            f'{{"client_email": "{self.acme.email}", "payment_method": "CASH", '
+            '"items": [{"description": "Tent", "quantity": 2, "unit_price": "30.00"}]}\n'
+        )
+        report = import_file('receipts', BytesIO(record.encode()), 'ndjson')
+        self.assertEqual(report['created'], 1, report)
+        self.assertEqual(self.totals(self.acme)[:2], (1, Decimal('60.00')))
+
+    def test_refresh_locks_before_it_aggregates(self):
+        from . import client_totals
+        with CaptureQueriesContext(connection) as ctx:
+            client_totals.refresh([self.acme.pk])
+        lock, aggregate = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        # The aggregate must be a statement of its own, started once the lock is held
+        self.assertNotIn('api_receipt', lock)
+        self.assertIn('api_receipt', aggregate)
+
+
+class ValuesReadPathTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_client(address='', company='Acme')
+        quotation = make_quotation(self.acme, notes='Tent   hire', tax=Decimal('1.5'))
+        add_items(quotation, 3)
+        make_quotation(self.acme)
+        add_items(make_receipt(self.acme, total=Decimal('12.30')))
+        make_client(name='Zoë')
+
+    def test_lists_match_the_model_serializers(self):
+        from rest_framework.renderers import JSONRenderer
+        from .serializers import ClientSerializer, ReceiptSerializer
+        cases = [
+            ('client-list', ClientSerializer, Client.objects.all()),
+            ('quotation-list', QuotationSerializer, Quotation.objects.all()),
+            ('receipt-list', ReceiptSerializer, Receipt.objects.all()),
+        ]
+        with timezone.override('Africa/Nairobi'):
+            for name, serializer_class, queryset in cases:
+                response = self.client.get(reverse(name))
+                expected = serializer_class(queryset.order_by('-created_at', '-id'), many=True).data
+                results = response.content.split(b'"results":', 1)[1].rsplit(b',"synced_at"', 1)[0]
+                self.assertEqual(results, JSONRenderer().render(expected), name)
+
+    def test_list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(reverse('quotation-list')).status_code, 200)
+        # validators, page with the client joined, line items
+        self.assertEqual(len(ctx), 3)
+
+    def renderer_cases(self):
+        from rest_framework.renderers import JSONRenderer
+        data = {
+            'text': 'Zoë   "quoted"\n', 'amount': Decimal('1.50'), 'when': timezone.now(),
+            'day': date.today(), 'list': [1, None, True], 2: 'int key', 'big': 2 ** 70,
+        }
+        return data, JSONRenderer().render(data)
+
+    @skipUnless(renderers.orjson, 'orjson is not installed')
+    def test_orjson_renderer_matches_json_renderer(self):
+        data, expected = self.renderer_cases()
+        self.assertEqual(renderers.FastJSONRenderer().render(data), expected)
+        self.assertIn(b'\n', renderers.FastJSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_renderer_without_orjson_matches_json_renderer(self):
+        data, expected = self.renderer_cases()
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.FastJSONRenderer().render(data), expected)
+
+    def test_benchmark_reports_identical_output(self):
+        import json
+        out = StringIO()
+        call_command('benchmark_serializers', '--rows', '10', '--repeat', '1', '--json', stdout=out)
+        results = json.loads(out.getvalue())['results']
+        self.assertEqual([result['model'] for result in results], ['client', 'quotation', 'receipt'])
+        self.assertTrue(all(result['identical'] for result in results), results)
+
+
+class SparseFieldsTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_client()
+        self.quotations = [make_quotation(self.acme, total=Decimal(total)) for total in ('10.00', '30.00', '20.00')]
+        for quotation in self.quotations:
+            add_items(quotation)
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response, [query['sql'] for query in ctx.captured_queries]
+
+    def test_list_fields_and_expand(self):
+        url = reverse('quotation-list')
+        response, queries = self.get(url, fields='total,quotation_number')
+        self.assertEqual(list(response.data['results'][0]), ['id', 'quotation_number', 'total'])
+        # Validators and the page: no client join, no line items
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('api_client', queries[1])
+        self.assertNotIn('"notes"', queries[1])
+
+        response, queries = self.get(url, expand='client')
+        row = response.data['results'][0]
+        self.assertEqual(row['client_name'], self.acme.name)
+        self.assertNotIn('items', row)
+        self.assertEqual(len(queries), 2)
+
+        full = self.client.get(url).data['results']
+        self.assertEqual(self.get(url, expand='items,client')[0].data['results'], full)
+
+    def test_cursor_uses_columns_outside_the_selection(self):
+        url = reverse('quotation-list')
+        response, _ = self.get(url, fields='quotation_number', ordering='-total', page_size=2)
+        numbers = [row['quotation_number'] for row in response.data['results']]
+        response = self.client.get(response.data['next'])
+        numbers += [row['quotation_number'] for row in response.data['results']]
+        expected = [q.quotation_number for q in sorted(self.quotations, key=lambda q: q.total, reverse=True)]
+        self.assertEqual(numbers, expected)
+
+    def test_detail_loads_only_what_is_selected(self):
+        url = reverse('quotation-detail', args=[self.quotations[0].pk])
+        response, queries = self.get(url, fields='status,total')
+        self.assertEqual(response.data, {'id': self.quotations[0].pk, 'status': 'DRAFT', 'total': '10.00'})
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"notes"', queries[1])
+
+        response, queries = self.get(url, fields='total', expand='items')
+        self.assertEqual(len(response.data['items']), 2)
+        self.assertEqual(len(queries), 3)
+        self.assertNotEqual(response['ETag'], self.client.get(url)['ETag'])
+
+        response, queries = self.get(url, fields='total', expand='client')
+        self.assertEqual(response.data['client_email'], self.acme.email)
+        self.assertEqual(len(queries), 2)
+
+    def test_unknown_names_are_rejected(self):
+        url = reverse('receipt-list')
+        self.assertEqual(self.client.get(url, {'fields': 'total,secret'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'expand': 'payments'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('client-list'), {'expand': 'items'}).status_code, 400)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        from . import db_router
+        self.router = db_router
+        db_router._down.clear()
+        db_router._pins().clear()
+        self.user = User.objects.create_user(username='reader')
+        make_client(name='Replicated')
+        call_command('sync_sqlite_replica', stdout=StringIO())
+        make_client(name='Not replicated yet')
+        self.api = self.client_for(self.user)
+
+    def client_for(self, user):
+        from rest_framework.test import APIClient
+        api = APIClient()
+        api.force_authenticate(user)
+        return api
+
+    def names(self, api=None):
+        response = (api or self.api).get(reverse('client-list'))
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['name'] for row in response.data['results'])
+
+    def test_safe_methods_read_from_the_replica(self):
+        self.assertEqual(self.names(), ['Replicated'])
+        # Outside the billing viewsets reads stay on the primary
+        self.assertEqual(self.api.get(reverse('dashboard')).data['total_clients'], 2)
+
+    def test_reads_follow_the_users_own_writes(self):
+        response = self.api.post(reverse('client-list'), {'name': 'Mine', 'email': 'mine@example.com', 'phone': '1'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.names(), ['Mine', 'Not replicated yet', 'Replicated'])
+        other = self.client_for(User.objects.create_user(username='other'))
+        self.assertEqual(self.names(other), ['Replicated'])
+
+        # The pin expires after DATABASE_REPLICA_STICKY_SECONDS
+        self.router._pins().clear()
+        self.assertEqual(self.names(), ['Replicated'])
+
+    def test_unavailable_replica_falls_back_to_the_primary(self):
+        from django.db import OperationalError, connections
+        replica = connections['replica']
+        with mock.patch.object(replica, 'ensure_connection', side_effect=OperationalError('down')) as connect:
+            with self.assertLogs('api.db_router', 'WARNING'):
+                self.assertEqual(self.names(), ['Not replicated yet', 'Replicated'])
+            self.assertEqual(self.names(), ['Not replicated yet', 'Replicated'])
+        # Not retried until DATABASE_REPLICA_RETRY_SECONDS have passed
+        self.assertEqual(connect.call_count, 1)
+        self.router._down.clear()
+        self.assertEqual(self.names(), ['Replicated'])
+
+    def test_replicas_are_never_migrated(self):
+        router = self.router.ReplicaRouter()
+        self.assertTrue(router.allow_migrate('default', 'api'))
+        self.assertFalse(router.allow_migrate('replica', 'api'))
+        # Not serving reads does not make it migratable
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertFalse(router.allow_migrate('replica', 'api'))
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import caches
+        from rest_framework_simplejwt.tokens import AccessToken
+        caches['responses'].clear()
+        self.user = User.objects.create_user(username='cached', password='password123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.url = reverse('dashboard')
+
+    def get(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(self.url)
+        user_queries = [query for query in ctx.captured_queries if '"auth_user"' in query['sql']]
+        return response, len(user_queries)
+
+    def test_user_is_read_from_the_cache(self):
+        self.assertEqual(self.get()[1], 1)
+        response, user_queries = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(user_queries, 0)
+
+        with override_settings(AUTH_USER_CACHE_SECONDS=0):
+            self.assertEqual(self.get()[1], 1)
+
+    def test_user_changes_invalidate_the_cache(self):
+        from django.contrib.auth.models import Group
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('changed-password')
+            self.user.save()
+        self.assertEqual(self.get()[1], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Group.objects.create(name='billing').user_set.add(self.user)
+        self.assertEqual(self.get()[1], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.get()[0].status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.assertEqual(self.get()[0].status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self.get()[0].status_code, 401)
+
+    def test_cached_user_still_checks_the_token(self):
+        from . import authentication
+        self.get()
+        # The token predates CHECK_REVOKE_TOKEN and has no password hash claim
+        with mock.patch.object(authentication.api_settings, 'CHECK_REVOKE_TOKEN', True):
+            response, user_queries = self.get()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(user_queries, 0)
+
+
+class AsyncViewTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.quotation = make_quotation(make_client(email='acme@example.com'))
+        add_items(self.quotation)
+        self.url = reverse('quotation-send-email', args=[self.quotation.pk]) + '?wait=1'
+
+    def test_send_email_can_wait_for_delivery(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['to'], ['acme@example.com'])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].attachments[0][2], 'application/pdf')
+        self.assertFalse(Job.objects.exists())
+
+    def test_refused_delivery_is_a_502(self):
+        import smtplib
+        refused = smtplib.SMTPAuthenticationError(535, b'Bad credentials for billing@smtp.internal')
+        with mock.patch('api.utils.email_service.EmailMessage.send', side_effect=refused), \
+                self.assertLogs('api.views', 'ERROR') as logs:
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 502)
+        # The server's reply is logged, not sent to the client
+        self.assertNotIn('smtp.internal', response.data['detail'])
+        self.assertIn('smtp.internal', logs.output[0])
+
+        # Anything else is a bug, not a delivery failure
+        with mock.patch('api.utils.email_service.EmailMessage.send', side_effect=AttributeError('to')), \
+                self.assertRaises(AttributeError):
+            self.client.post(self.url)
+
+    @override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='smtp.example.com', EMAIL_PORT=2525,
+    )
+    def test_smtp_backend_sends_over_async_smtp(self):
+        aiosmtplib = mock.Mock(send=mock.AsyncMock())
+        with mock.patch('api.utils.email_service.aiosmtplib', aiosmtplib):
+            self.assertEqual(self.client.post(self.url).status_code, 200)
+        options = aiosmtplib.send.call_args.kwargs
+        self.assertEqual((options['hostname'], options['port']), ('smtp.example.com', 2525))
+        self.assertEqual(options['recipients'], ['acme@example.com'])
+        self.assertIn(b'Content-Type: application/pdf', aiosmtplib.send.call_args.args[0])
+
+    async def test_served_through_the_asgi_handler(self):
+        from django.test import AsyncClient
+        from rest_framework_simplejwt.tokens import AccessToken
+        client = AsyncClient()
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await client.get(reverse('quotation-pdf', args=[self.quotation.pk]), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        # Queries run in sync_to_async threads still count towards the request
+        self.assertIn('pdf;dur=', response['Server-Timing'])
+        self.assertNotIn('"0 queries"', response['Server-Timing'])
+
+        response = await client.get(reverse('dashboard'), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_quotations'], 1)
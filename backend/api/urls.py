@@ -1,15 +1,30 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ClientViewSet, QuotationViewSet, ReceiptViewSet, RegisterView
+from .models import Quotation, Receipt
+from .views import (
+    ClientViewSet, DashboardView, DocumentEmailView, DocumentPDFView, JobDetailView, JobViewSet, PDFCacheStatsView,
+    QuotationViewSet, ReceiptViewSet, RegisterView, ResponseCacheStatsView, SearchView,
+)
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 router = DefaultRouter()
 router.register(r'clients', ClientViewSet)
 router.register(r'quotations', QuotationViewSet)
 router.register(r'receipts', ReceiptViewSet)
+router.register(r'jobs', JobViewSet)
 
 urlpatterns = [
+    # Async views (api/async_views.py)
+    path('quotations/<int:pk>/pdf/', DocumentPDFView.as_view(model=Quotation), name='quotation-pdf'),
+    path('receipts/<int:pk>/pdf/', DocumentPDFView.as_view(model=Receipt), name='receipt-pdf'),
+    path('quotations/<int:pk>/send_email/', DocumentEmailView.as_view(model=Quotation), name='quotation-send-email'),
+    path('receipts/<int:pk>/send_email/', DocumentEmailView.as_view(model=Receipt), name='receipt-send-email'),
+    path('jobs/<int:pk>/', JobDetailView.as_view(), name='job-detail'),
     path('', include(router.urls)),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('pdf-cache/stats/', PDFCacheStatsView.as_view(), name='pdf-cache-stats'),
+    path('response-cache/stats/', ResponseCacheStatsView.as_view(), name='response-cache-stats'),
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
@@ -1,15 +1,31 @@
-from django.core.mail import EmailMessage
+from concurrent.futures import ThreadPoolExecutor
+from smtplib import SMTPException, SMTPServerDisconnected
+
+from asgiref.sync import sync_to_async
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
+from django.db.models import QuerySet
 from django.template.loader import render_to_string
-from .pdf_generator import generate_quotation_pdf, generate_receipt_pdf
-import os
+from ..metrics import EMAIL_SEND_DURATION, timed
+from .pdf_cache import render_quotation_pdf, render_receipt_pdf
+from .pdf_generator import pdf_filename
 
+try:
+    import aiosmtplib
+except ImportError:  # optional: pip install aiosmtplib
+    aiosmtplib = None
 
-def send_quotation_email(quotation):
-    """Send quotation email with PDF attachment"""
+# Raised by ``asend`` when the server cannot be reached or refuses the message
+DELIVERY_ERRORS = (SMTPException, OSError) + ((aiosmtplib.SMTPException,) if aiosmtplib else ())
+
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+
+def build_quotation_email(quotation, connection=None):
+    """Build the quotation email with its PDF attached, ready to send"""
     
     # Generate PDF
-    pdf_path = generate_quotation_pdf(quotation)
+    pdf = render_quotation_pdf(quotation)
     
     # Prepare email content
     subject = f'Quotation {quotation.quotation_number} from Event Company'
@@ -43,25 +59,28 @@ def send_quotation_email(quotation):
         body=html_message,
         from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@eventcompany.com'),
         to=[quotation.client.email],
+        connection=connection,
     )
     
     # Attach PDF
-    email.attach_file(pdf_path)
+    email.attach(pdf_filename(quotation), pdf, 'application/pdf')
     email.content_subtype = 'html'
-    
-    # Send email
-    email.send()
-    
-    # Clean up PDF file
-    if os.path.exists(pdf_path):
-        os.remove(pdf_path)
 
+    return email
 
-def send_receipt_email(receipt):
-    """Send receipt email with PDF attachment"""
+
+def send_quotation_email(quotation):
+    """Send quotation email with PDF attachment"""
+    email = build_quotation_email(quotation)
+    with timed(EMAIL_SEND_DURATION, 'smtp', kind='quotation'):
+        email.send()
+
+
+def build_receipt_email(receipt, connection=None):
+    """Build the receipt email with its PDF attached, ready to send"""
     
     # Generate PDF
-    pdf_path = generate_receipt_pdf(receipt)
+    pdf = render_receipt_pdf(receipt)
     
     # Prepare email content
     subject = f'Receipt {receipt.receipt_number} from Event Company'
@@ -95,15 +114,151 @@ def send_receipt_email(receipt):
         body=html_message,
         from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@eventcompany.com'),
         to=[receipt.client.email],
+        connection=connection,
     )
     
     # Attach PDF
-    email.attach_file(pdf_path)
+    email.attach(pdf_filename(receipt), pdf, 'application/pdf')
     email.content_subtype = 'html'
-    
-    # Send email
-    email.send()
-    
-    # Clean up PDF file
-    if os.path.exists(pdf_path):
-        os.remove(pdf_path)
+
+    return email
+
+
+def send_receipt_email(receipt):
+    """Send receipt email with PDF attachment"""
+    email = build_receipt_email(receipt)
+    with timed(EMAIL_SEND_DURATION, 'smtp', kind='receipt'):
+        email.send()
+
+
+async def asend(message, kind):
+    """
+    Send ``message`` from an async view without blocking the event loop.
+    With the SMTP backend and aiosmtplib installed it is sent over an async
+    SMTP connection using the ``EMAIL_*`` settings. Otherwise the configured
+    backend sends it from a worker thread.
+    """
+    with timed(EMAIL_SEND_DURATION, 'smtp', kind=kind):
+        if aiosmtplib is None or settings.EMAIL_BACKEND != SMTP_BACKEND:
+            await sync_to_async(message.send, thread_sensitive=False)()
+            return
+        await aiosmtplib.send(
+            message.message().as_bytes(linesep='\r\n'),
+            sender=message.from_email,
+            recipients=message.recipients(),
+            hostname=settings.EMAIL_HOST,
+            port=settings.EMAIL_PORT,
+            username=settings.EMAIL_HOST_USER or None,
+            password=settings.EMAIL_HOST_PASSWORD or None,
+            use_tls=settings.EMAIL_USE_SSL,
+            start_tls=settings.EMAIL_USE_TLS,
+            client_cert=settings.EMAIL_SSL_CERTFILE,
+            client_key=settings.EMAIL_SSL_KEYFILE,
+            timeout=settings.EMAIL_TIMEOUT,
+        )
+
+
+def _document_number(document):
+    return getattr(document, 'quotation_number', None) or getattr(document, 'receipt_number', None)
+
+
+def _bulk_result(document, status, message=None, error=None):
+    result = {'id': document.pk, 'number': _document_number(document), 'status': status}
+    if message is not None:
+        result['to'] = message.to
+    if error is not None:
+        result['error'] = error
+    return result
+
+
+def _send_over_connection(connection, messages):
+    """Send ``(document, message)`` pairs over ``connection``, one result per message"""
+    if not messages:
+        return []
+    try:
+        # Does nothing once open, so the connection is reused across batches
+        connection.open()
+    except Exception as exc:
+        return [_bulk_result(document, 'failed', message, f'connect: {exc}') for document, message in messages]
+    results = []
+    for document, message in messages:
+        message.connection = connection
+        try:
+            with timed(EMAIL_SEND_DURATION, kind=document._meta.model_name):
+                try:
+                    connection.send_messages([message])
+                except SMTPServerDisconnected:
+                    # The server dropped us mid-run: reconnect once and retry
+                    connection.close()
+                    connection.open()
+                    connection.send_messages([message])
+        except Exception as exc:
+            results.append(_bulk_result(document, 'failed', message, str(exc)))
+        else:
+            results.append(_bulk_result(document, 'sent', message))
+    return results
+
+
+def send_bulk_emails(documents, build_message, render_workers=None, connections=None, batch_size=None):
+    """
+    Email many quotations or receipts.
+
+    PDFs for each batch are rendered concurrently by ``render_workers``
+    threads. The messages are then sent with ``send_messages`` over
+    ``connections`` SMTP connections, each opened on first use and kept
+    open for the whole run instead of one connection per document. A
+    connection that cannot be opened fails the messages of its share of
+    the batch and is tried again for the next one. Returns one result dict
+    per document.
+
+    The documents must arrive with their client and items already loaded,
+    because the render threads do not touch the database.
+    """
+    render_workers = render_workers or getattr(settings, 'EMAIL_BULK_RENDER_WORKERS', 4)
+    connections = connections or getattr(settings, 'EMAIL_BULK_CONNECTIONS', 2)
+    batch_size = batch_size or getattr(settings, 'EMAIL_BULK_BATCH_SIZE', 50)
+
+    results = []
+    documents = iter(documents)
+    pool = [get_connection() for _ in range(connections)]
+    try:
+        with ThreadPoolExecutor(max_workers=render_workers) as renderers, \
+                ThreadPoolExecutor(max_workers=connections) as senders:
+            while True:
+                batch = [document for _, document in zip(range(batch_size), documents)]
+                if not batch:
+                    break
+
+                messages = []
+                futures = [(document, renderers.submit(build_message, document)) for document in batch]
+                for document, future in futures:
+                    try:
+                        messages.append((document, future.result()))
+                    except Exception as exc:
+                        results.append(_bulk_result(document, 'failed', error=f'render: {exc}'))
+
+                slices = [messages[i::connections] for i in range(connections)]
+                for sent in senders.map(_send_over_connection, pool, slices):
+                    results.extend(sent)
+    finally:
+        for connection in pool:
+            connection.close()
+    return results
+
+
+def _with_relations(documents, batch_size):
+    if isinstance(documents, QuerySet):
+        return documents.select_related('client').prefetch_related('items').iterator(chunk_size=batch_size)
+    return documents
+
+
+def send_bulk_quotation_emails(quotations, **options):
+    """Email every quotation in ``quotations`` (see ``send_bulk_emails``)"""
+    batch_size = options.get('batch_size') or getattr(settings, 'EMAIL_BULK_BATCH_SIZE', 50)
+    return send_bulk_emails(_with_relations(quotations, batch_size), build_quotation_email, **options)
+
+
+def send_bulk_receipt_emails(receipts, **options):
+    """Email every receipt in ``receipts`` (see ``send_bulk_emails``)"""
+    batch_size = options.get('batch_size') or getattr(settings, 'EMAIL_BULK_BATCH_SIZE', 50)
+    return send_bulk_emails(_with_relations(receipts, batch_size), build_receipt_email, **options)
@@ -0,0 +1,164 @@
+"""
+On-disk cache in front of ``pdf_generator``.
+
+Entries are content addressed: ``<type>/<id>/<digest>.pdf`` where the digest
+covers everything the PDF shows (header fields, client details,
+``updated_at`` and every line item). An unchanged document is never
+re-rendered, and an edit always produces a different key even if an
+invalidation signal is missed. Saving or deleting a document or one of its
+items also removes that document's entries straight away (see
+``api.signals``).
+
+The directory is bounded by ``PDF_CACHE_MAX_BYTES``. Hits refresh the file's
+mtime, and eviction removes the least recently used files first. Each
+process keeps a running total of the bytes it has written since it last
+scanned the directory. The directory is scanned only when that total goes
+over the budget, or every ``SCAN_EVERY`` misses so that files written by
+other processes are counted too.
+"""
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+from .pdf_generator import generate_quotation_pdf, generate_receipt_pdf
+
+SCAN_EVERY = 100
+
+
+def _fingerprint(document):
+    client = document.client
+    parts = [
+        document._meta.model_name, document.pk, document.updated_at,
+        client.name, client.email,
+    ]
+    parts.extend(
+        (item.pk, item.description, item.quantity, item.unit_price, item.total)
+        for item in document.items.all()
+    )
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+class PDFCache:
+    def __init__(self, directory=None, max_bytes=None):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bytes on disk as of the last scan plus those written since; None until the first scan
+        self._bytes = None
+        self._misses_since_scan = 0
+
+    @property
+    def directory(self):
+        return Path(self._directory or getattr(settings, 'PDF_CACHE_DIR', settings.BASE_DIR / 'cache' / 'pdf'))
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return getattr(settings, 'PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+
+    def _document_dir(self, model_name, pk):
+        return self.directory / model_name / str(pk)
+
+    def path_for(self, document):
+        return self._document_dir(document._meta.model_name, document.pk) / f'{_fingerprint(document)}.pdf'
+
+    def get_or_render(self, document, render):
+        path = self.path_for(document)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            pass
+        else:
+            os.utime(path)
+            with self._lock:
+                self.hits += 1
+            return data
+
+        with self._lock:
+            self.misses += 1
+        data = render(document)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write under a temporary name so readers never see a partial file
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._misses_since_scan += 1
+            scan = (
+                self._bytes is None or self._misses_since_scan >= SCAN_EVERY
+                or self._bytes + len(data) > self.max_bytes
+            )
+            if self._bytes is not None:
+                self._bytes += len(data)
+        if scan:
+            self.evict()
+        return data
+
+    def invalidate(self, model_name, pk):
+        shutil.rmtree(self._document_dir(model_name, pk), ignore_errors=True)
+
+    def _entries(self):
+        entries = []
+        for path in self.directory.glob('*/*/*.pdf'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits its byte budget."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+                path.unlink(missing_ok=True)
+                total -= size
+                with self._lock:
+                    self.evictions += 1
+                if total <= self.max_bytes:
+                    break
+        with self._lock:
+            self._bytes = total
+            self._misses_since_scan = 0
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        with self._lock:
+            self._bytes = None
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes,
+            }
+
+
+pdf_cache = PDFCache()
+
+
+def render_quotation_pdf(quotation):
+    """Cached ``generate_quotation_pdf``."""
+    return pdf_cache.get_or_render(quotation, generate_quotation_pdf)
+
+
+def render_receipt_pdf(receipt):
+    """Cached ``generate_receipt_pdf``."""
+    return pdf_cache.get_or_render(receipt, generate_receipt_pdf)
@@ -0,0 +1,150 @@
+"""
+Batch PDF export as a streamed ZIP archive.
+
+Documents are rendered by the reportlab generators on a process pool, so
+throughput scales with the number of cores. Exports served by the API share
+one pool of ``PDF_EXPORT_WORKERS`` processes, created on first use and kept
+for the life of the server process. Workers pay for ``django.setup()`` once,
+and concurrent exports queue on the same workers instead of each starting
+its own. The ``export_pdfs`` command uses a pool of its own.
+
+The archive is written to a non-seekable sink, which makes ``zipfile`` use
+data descriptors and lets each member be yielded to the client as soon as it
+is rendered. At most ``window`` documents are in flight, so memory stays
+bounded whatever the size of the export.
+"""
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.db.models import QuerySet
+
+from .pdf_generator import generate_quotation_pdf, generate_receipt_pdf, pdf_filename
+
+GENERATORS = {
+    'quotation': generate_quotation_pdf,
+    'receipt': generate_receipt_pdf,
+}
+
+_shared_executor = None
+_shared_lock = threading.Lock()
+
+
+class _StreamSink:
+    """Write-only, non-seekable file object that buffers until drained."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def render_member(document):
+    """Render one document; runs inside a pool worker."""
+    data = GENERATORS[document._meta.model_name](document)
+    return pdf_filename(document), data
+
+
+def _default_workers():
+    return getattr(settings, 'PDF_EXPORT_WORKERS', None) or os.cpu_count() or 1
+
+
+def _shared_pool():
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            _shared_executor = _executor(_default_workers(), 'process')
+        return _shared_executor
+
+
+def _discard_shared_pool(executor):
+    """Forget a broken shared pool, so the next export starts a new one."""
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is executor:
+            _shared_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _executor(workers, pool):
+    if pool == 'thread':
+        return ThreadPoolExecutor(max_workers=workers)
+    # Spawned workers import Django from scratch and never touch the database:
+    # the documents arrive pickled with their client and items already loaded.
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    )
+
+
+def stream_pdf_zip(documents, workers=None, window=None, pool='shared'):
+    """
+    Yield the bytes of a ZIP archive containing one PDF per document.
+
+    ``documents`` may be a queryset, in which case clients and items are
+    loaded in chunks alongside it. Members are added in completion order.
+    ``pool`` is ``'shared'`` (the server-wide pool; ``workers`` only sizes
+    the window), or ``'process'`` / ``'thread'`` for a pool of ``workers``
+    closed at the end.
+    """
+    workers = workers or _default_workers()
+    window = window or workers * 4
+    if isinstance(documents, QuerySet):
+        documents = documents.select_related('client').prefetch_related('items').iterator(chunk_size=window)
+
+    executor = _shared_pool() if pool == 'shared' else _executor(workers, pool)
+    sink = _StreamSink()
+    pending = set()
+    try:
+        with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED) as archive:
+
+            def write_finished(futures):
+                for future in futures:
+                    name, data = future.result()
+                    archive.writestr(name, data)
+
+            for document in documents:
+                pending.add(executor.submit(render_member, document))
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    write_finished(done)
+                    yield sink.drain()
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                write_finished(done)
+                yield sink.drain()
+    except BrokenProcessPool:
+        if pool == 'shared':
+            _discard_shared_pool(executor)
+        raise
+    finally:
+        # Only reached with work pending if the client went away or a render failed
+        for future in pending:
+            future.cancel()
+        if pool != 'shared':
+            executor.shutdown()
+
+    # Closing the archive wrote the central directory
+    yield sink.drain()
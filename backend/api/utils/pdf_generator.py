@@ -1,21 +1,21 @@
-import os
+from io import BytesIO
+
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
-from django.conf import settings
+
+from ..metrics import PDF_RENDER_DURATION, timed
 
 
-def _ensure_media_dir():
-    media_root = os.path.join(settings.BASE_DIR, 'media')
-    os.makedirs(media_root, exist_ok=True)
-    return media_root
+def pdf_filename(document):
+    """Attachment/download name for a quotation or receipt PDF."""
+    return f'{document._meta.model_name}_{document.id}.pdf'
 
 
+@timed(PDF_RENDER_DURATION, 'pdf', kind='quotation')
 def generate_quotation_pdf(quotation):
-    """Generate a PDF file for a quotation and return the file path."""
-    media_root = _ensure_media_dir()
-    filename = f'quotation_{quotation.id}.pdf'
-    filepath = os.path.join(media_root, filename)
-    c = canvas.Canvas(filepath, pagesize=A4)
+    """Render a quotation to PDF in memory and return the bytes."""
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
     # Header
     c.setFont('Helvetica-Bold', 20)
@@ -54,15 +54,14 @@ def generate_quotation_pdf(quotation):
     c.drawString(350, y - 50, 'Total:')
     c.drawString(450, y - 50, f'${quotation.total:.2f}')
     c.save()
-    return filepath
+    return buffer.getvalue()
 
 
+@timed(PDF_RENDER_DURATION, 'pdf', kind='receipt')
 def generate_receipt_pdf(receipt):
-    """Generate a PDF file for a receipt and return the file path."""
-    media_root = _ensure_media_dir()
-    filename = f'receipt_{receipt.id}.pdf'
-    filepath = os.path.join(media_root, filename)
-    c = canvas.Canvas(filepath, pagesize=A4)
+    """Render a receipt to PDF in memory and return the bytes."""
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
     # Header
     c.setFont('Helvetica-Bold', 20)
@@ -101,4 +100,4 @@ def generate_receipt_pdf(receipt):
     c.drawString(350, y - 50, 'Total:')
     c.drawString(450, y - 50, f'${receipt.total:.2f}')
     c.save()
-    return filepath
+    return buffer.getvalue()
@@ -1,15 +1,127 @@
-from rest_framework import viewsets, status
+import logging
+
+from rest_framework import mixins, viewsets, status
+from rest_framework.filters import OrderingFilter
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import JSONRenderer
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from django.urls import reverse
+from django.utils.http import content_disposition_header
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 
-from .models import Client, Quotation, Receipt
-from .serializers import ClientSerializer, QuotationSerializer, ReceiptSerializer
+from . import jobs, rollups, search
+from .async_views import AsyncAPIView, run_blocking
+from .conditional import ConditionalGetMixin
+from .db_router import ReplicaReadMixin
+from .response_cache import ResponseCacheMixin
+from .sync import DeltaSyncMixin
+from .readers import ValuesListMixin
+from .fieldsets import SparseFieldsMixin
+from .filters import DocumentFilterSerializer, ListFilterBackend, filter_documents, filter_list, serialize_filters
+from .pagination import SearchPagination
+from .renderers import CSVRenderer, NDJSONRenderer, PDFRenderer, PrometheusRenderer, ZIPRenderer
+from .models import Client, Job, Quotation, Receipt
+from .serializers import ClientSerializer, JobSerializer, QuotationSerializer, ReceiptSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def job_accepted(request, job, message):
+    """202 response pointing the caller at the job status endpoint"""
+    status_url = request.build_absolute_uri(reverse('job-detail', args=[job.pk]))
+    return Response(
+        {'message': message, 'job_id': job.pk, 'status': job.status, 'status_url': status_url},
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': status_url},
+    )
+
+
+def pdf_response(request, document, pdf):
+    """
+    Send a freshly rendered PDF straight from memory. Not streamed: the bytes
+    are already there, and ASGI would read a sync iterator from a thread.
+    """
+    from .utils.pdf_generator import pdf_filename
+    response = HttpResponse(pdf, content_type='application/pdf')
+    response['Content-Disposition'] = content_disposition_header(
+        request.query_params.get('download') in ('1', 'true'), pdf_filename(document),
+    )
+    return response
+
+
+def bulk_send_accepted(request, document, model):
+    """Validate a bulk email filter and queue the send as one background job"""
+    filters = DocumentFilterSerializer(data=request.data, model=model)
+    filters.is_valid(raise_exception=True)
+    job = jobs.enqueue(
+        'bulk_send_emails',
+        {'document': document, 'filters': serialize_filters(filters.validated_data)},
+        user=request.user,
+        max_attempts=1,
+    )
+    return job_accepted(request, job, f'Bulk {document} email queued')
+
+
+def pdf_zip_response(request, queryset, filename):
+    """Stream a ZIP of PDFs for every document matching the query string filter"""
+    from .utils.pdf_export import stream_pdf_zip
+    filters = DocumentFilterSerializer(data=request.query_params, model=queryset.model)
+    filters.is_valid(raise_exception=True)
+    response = StreamingHttpResponse(
+        stream_pdf_zip(filter_documents(queryset, filters.validated_data)),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def export_response(request, queryset, name):
+    """
+    Stream a CSV or NDJSON export (picked by ``?format=`` or the Accept
+    header). Quotations and receipts accept the list filters plus ``?items=``.
+    """
+    from .exports import DocumentExportSerializer, stream_export
+    items = 'none'
+    if queryset.model is not Client:
+        export = DocumentExportSerializer(data=request.query_params, model=queryset.model)
+        export.is_valid(raise_exception=True)
+        options = dict(export.validated_data)
+        items = options.pop('items', 'nested')
+        queryset = filter_list(queryset, options)
+
+    fmt = request.accepted_renderer.format
+    response = StreamingHttpResponse(
+        stream_export(queryset, fmt, items=items),
+        content_type=f'{request.accepted_renderer.media_type}; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
+
+def import_response(request, kind):
+    """Bulk import an uploaded CSV / NDJSON / JSON file and report per-row errors"""
+    from .imports import FORMATS, ImportFormatError, detect_format, import_file
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+    fmt = request.data.get('type')
+    try:
+        if fmt is None:
+            fmt = detect_format(upload.name)
+        elif fmt not in FORMATS:
+            raise ImportFormatError(f'type must be one of: {", ".join(FORMATS)}.')
+    except ImportFormatError as exc:
+        return Response({'type': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(import_file(kind, upload.file, fmt))
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -61,33 +173,233 @@ class RegisterView(APIView):
         )
 
 
-class ClientViewSet(viewsets.ModelViewSet):
+class DashboardView(AsyncAPIView):
+    """
+    Dashboard statistics served from the monthly rollup table
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        return Response(await rollups.adashboard_stats())
+
+
+class SearchView(APIView):
+    """
+    Ranked full-text search over clients, quotations and receipts:
+    ``?q=marquee tent acme``, optionally ``&type=quotation``
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        text = request.query_params.get('q', '')
+        kind = request.query_params.get('type') or None
+        if search.match_query(text) is None:
+            return Response({'q': ['Enter at least one word to search for.']}, status=status.HTTP_400_BAD_REQUEST)
+        if kind is not None and kind not in search.KINDS.values():
+            return Response(
+                {'type': [f'Must be one of: {", ".join(search.KINDS.values())}.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(search.SearchResults(text, kind), request, view=self)
+        for result in page:
+            result['url'] = request.build_absolute_uri(reverse(f"{result['type']}-detail", args=[result['id']]))
+        return paginator.get_paginated_response(page)
+
+
+class PDFCacheStatsView(APIView):
+    """
+    Hit/miss counters and size of the rendered PDF cache
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        from .utils.pdf_cache import pdf_cache
+        return Response(pdf_cache.stats())
+
+
+class ResponseCacheStatsView(APIView):
+    """
+    Hit/miss counters of the per-user response cache (this worker process)
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        from .response_cache import stats
+        return Response(stats.as_dict())
+
+
+class MetricsView(APIView):
+    """
+    Request, database, PDF and SMTP metrics of this worker process in the
+    Prometheus text format (see ``api.metrics``)
+    """
+    permission_classes = [IsAdminUser]
+    renderer_classes = [PrometheusRenderer]
+
+    def get(self, request):
+        from . import metrics
+        return Response(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class ClientViewSet(
+    ReplicaReadMixin, ResponseCacheMixin, ConditionalGetMixin, DeltaSyncMixin, ValuesListMixin, SparseFieldsMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [ListFilterBackend, OrderingFilter]
+    ordering_fields = ['created_at', 'name', 'total_paid', 'receipt_count', 'open_quotation_count', 'last_payment_at']
+    ordering = ['-created_at']
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        return export_response(request, Client.objects.all(), 'clients')
 
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_records(self, request):
+        return import_response(request, 'clients')
 
-class QuotationViewSet(viewsets.ModelViewSet):
-    queryset = Quotation.objects.all()
+
+class QuotationViewSet(
+    ReplicaReadMixin, ResponseCacheMixin, ConditionalGetMixin, DeltaSyncMixin, ValuesListMixin, SparseFieldsMixin,
+    viewsets.ModelViewSet,
+):
+    queryset = Quotation.objects.select_related('client').prefetch_related('items')
     serializer_class = QuotationSerializer
     permission_classes = [IsAuthenticated]
+    etag_related = ['client']
+    expandable = {'items': ['items'], 'client': ['client_name', 'client_email']}
+    expand_queryset = {'items': {'prefetch_related': ['items']}, 'client': {'select_related': ['client']}}
+    filter_backends = [ListFilterBackend, OrderingFilter]
+    ordering_fields = ['created_at', 'date', 'total', 'valid_until']
+    ordering = ['-created_at']
+
+    @action(detail=False, methods=['post'])
+    def bulk_send(self, request):
+        return bulk_send_accepted(request, 'quotation', Quotation)
+
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer, ZIPRenderer])
+    def export_pdfs(self, request):
+        return pdf_zip_response(request, Quotation.objects.all(), 'quotations.zip')
 
-    @action(detail=True, methods=['post'])
-    def send_email(self, request, pk=None):
-        from .utils.email_service import send_quotation_email
-        quotation = self.get_object()
-        send_quotation_email(quotation)
-        return Response({'message': 'Quotation sent successfully'})
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        return export_response(request, Quotation.objects.all(), 'quotations')
 
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_records(self, request):
+        return import_response(request, 'quotations')
 
-class ReceiptViewSet(viewsets.ModelViewSet):
-    queryset = Receipt.objects.all()
+
+class ReceiptViewSet(
+    ReplicaReadMixin, ResponseCacheMixin, ConditionalGetMixin, DeltaSyncMixin, ValuesListMixin, SparseFieldsMixin,
+    viewsets.ModelViewSet,
+):
+    queryset = Receipt.objects.select_related('client').prefetch_related('items')
     serializer_class = ReceiptSerializer
     permission_classes = [IsAuthenticated]
+    etag_related = ['client']
+    expandable = {'items': ['items'], 'client': ['client_name', 'client_email']}
+    expand_queryset = {'items': {'prefetch_related': ['items']}, 'client': {'select_related': ['client']}}
+    filter_backends = [ListFilterBackend, OrderingFilter]
+    ordering_fields = ['created_at', 'date', 'total']
+    ordering = ['-created_at']
+
+    @action(detail=False, methods=['post'])
+    def bulk_send(self, request):
+        return bulk_send_accepted(request, 'receipt', Receipt)
+
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer, ZIPRenderer])
+    def export_pdfs(self, request):
+        return pdf_zip_response(request, Receipt.objects.all(), 'receipts.zip')
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        return export_response(request, Receipt.objects.all(), 'receipts')
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_records(self, request):
+        return import_response(request, 'receipts')
+
+
+def visible_jobs(user):
+    """Jobs ``user`` may see: staff see every job, others the ones they queued"""
+    if user.is_staff:
+        return Job.objects.all()
+    return Job.objects.filter(created_by=user)
+
+
+class JobViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Background jobs queued by the current user (one job: ``JobDetailView``)
+    """
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return visible_jobs(self.request.user)
+
+
+class JobDetailView(AsyncAPIView):
+    """
+    Status of one background job, polled after a ``202``
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, pk):
+        job = await aget_object_or_404(visible_jobs(request.user), pk=pk)
+        return Response(JobSerializer(job).data)
+
+
+def _documents(model):
+    return model.objects.select_related('client').prefetch_related('items')
+
+
+class DocumentPDFView(AsyncAPIView):
+    """
+    PDF of a quotation or receipt (``model``), rendered on the bounded
+    render pool instead of the event loop
+    """
+    model = None
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, PDFRenderer]
+
+    async def get(self, request, pk):
+        from .utils import pdf_cache
+        document = await aget_object_or_404(_documents(self.model), pk=pk)
+        render = getattr(pdf_cache, f'render_{self.model._meta.model_name}_pdf')
+        return pdf_response(request, document, await run_blocking(render, document))
+
+
+class DocumentEmailView(AsyncAPIView):
+    """
+    Email a quotation or receipt (``model``) to its client. Queued as a job
+    by default; ``?wait=1`` renders and sends it during the request over
+    async SMTP and answers ``502`` if the server refuses it.
+    """
+    model = None
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request, pk):
+        from .utils import email_service
+        kind = self.model._meta.model_name
+        document = await aget_object_or_404(_documents(self.model), pk=pk)
+        if request.query_params.get('wait') not in ('1', 'true'):
+            job = await sync_to_async(jobs.enqueue)(
+                f'send_{kind}_email', {f'{kind}_id': document.pk}, user=request.user,
+            )
+            return job_accepted(request, job, f'{kind.capitalize()} queued for sending')
 
-    @action(detail=True, methods=['post'])
-    def send_email(self, request, pk=None):
-        from .utils.email_service import send_receipt_email
-        receipt = self.get_object()
-        send_receipt_email(receipt)
-        return Response({'message': 'Receipt sent successfully'})
+        message = await run_blocking(getattr(email_service, f'build_{kind}_email'), document)
+        try:
+            await email_service.asend(message, kind)
+        except email_service.DELIVERY_ERRORS:
+            # The server's reply can name hosts and accounts; keep it in the log
+            logger.exception('Sending %s %s to %s failed', kind, document.pk, message.to)
+            return Response({'detail': 'The mail server could not deliver the email.'},
+                            status=status.HTTP_502_BAD_GATEWAY)
+        return Response({'message': f'{kind.capitalize()} sent', 'to': message.to})
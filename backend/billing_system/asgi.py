@@ -2,6 +2,9 @@
 ASGI config for billing_system project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with e.g. ``uvicorn billing_system.asgi:application``; the PDF,
+email, dashboard and job status views are async (see api/async_views.py).
+Set CONN_MAX_AGE to 0 when serving over ASGI.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -1,3 +1,5 @@
+import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 
@@ -25,6 +27,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # MUST be first
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.DatabaseRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -45,16 +49,92 @@ CORS_ALLOWED_ORIGINS = [
 # DRF
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # Same output as JSONRenderer; uses orjson when it is installed
+        'api.renderers.FastJSONRenderer',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
+# Upper bound for the ?page_size= query parameter
+API_MAX_PAGE_SIZE = 200
+
+# Background jobs (python manage.py run_jobs)
+JOB_WORKERS = 4
+JOB_POOL = 'thread'  # or 'process'
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 30  # seconds, doubled after every failed attempt
+JOB_RETRY_BACKOFF_MAX = 3600
+JOB_LEASE_SECONDS = 600  # renewed every third of this while a job runs
+
+# Bulk email sends (api/utils/email_service.py)
+EMAIL_BULK_RENDER_WORKERS = 4
+EMAIL_BULK_CONNECTIONS = 2
+EMAIL_BULK_BATCH_SIZE = 50
+
+# Threads rendering PDFs and emails for the async views (api/async_views.py);
+# at most this many renders run at once per ASGI worker process
+ASYNC_RENDER_WORKERS = 4
+
+# Rendered PDF cache (api/utils/pdf_cache.py)
+PDF_CACHE_DIR = BASE_DIR / 'cache' / 'pdf'
+PDF_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Delta sync (api/sync.py): deletions are remembered this long, and each
+# sync window is widened by a few seconds to catch late commits
+TOMBSTONE_RETENTION_DAYS = 30
+DELTA_SYNC_OVERLAP_SECONDS = 2
+
+# Results per page of /api/search/
+SEARCH_PAGE_SIZE = 20
+
+# Rows read per query by the streaming CSV/NDJSON export (api/exports.py)
+EXPORT_CHUNK_SIZE = 500
+
+# Records validated and inserted per transaction by the bulk import
+# (api/imports.py), and how many row errors its report lists
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_ERRORS = 1000
+
+# Processes rendering PDFs for the batch ZIP export (api/utils/pdf_export.py),
+# shared by every export of a server process; None uses one per CPU core
+PDF_EXPORT_WORKERS = None
+
+# Per-user cache of GET responses of the client/quotation/receipt
+# endpoints (see api/response_cache.py). File-based so every worker process
+# sees the same entries and invalidations; MAX_ENTRIES bounds its size.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'responses',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 5000, 'CULL_FREQUENCY': 4},
+    },
+}
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_ENABLED = True
+
+# Users of JWT-authenticated requests are read from this cache instead of
+# the database (see api/authentication.py); 0 turns it off. The cache must
+# be shared by every worker process for invalidations to reach them all.
+AUTH_USER_CACHE_ALIAS = 'responses'
+AUTH_USER_CACHE_SECONDS = 300
+
+# Requests slower than this are logged as warnings on api.slow_requests
+SLOW_REQUEST_MS = 1000
+
+# QT-/RC- numbers reserved per worker process at a time (see api/numbering.py)
+DOCUMENT_NUMBER_BLOCK_SIZE = 1
+
 # JWT
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=4),  # 4 hours
@@ -66,13 +146,51 @@ SIMPLE_JWT = {
 
 ROOT_URLCONF = 'billing_system.urls'
 
+# Persistent connections, checked before reuse. For PostgreSQL set ENGINE
+# to 'django.db.backends.postgresql' and NAME/USER/PASSWORD/HOST/PORT on
+# each alias. Under ASGI every request opens its own connections, so set
+# CONN_MAX_AGE to 0 there.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        # A file-backed test database lets threaded tests write concurrently
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    },
 }
 
+# Local stand-in for a read replica: a read-only copy of db.sqlite3
+# refreshed by `python manage.py sync_sqlite_replica`. Set SQLITE_REPLICA
+# to its file (e.g. db.replica.sqlite3) to define the 'replica' alias and
+# serve reads from it. The test suite always defines the alias, and its
+# replica tests list it in DATABASE_REPLICAS themselves.
+SQLITE_REPLICA = os.environ.get('SQLITE_REPLICA', '')
+if SQLITE_REPLICA or sys.argv[1:2] == ['test']:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{BASE_DIR / (SQLITE_REPLICA or 'db.replica.sqlite3')}?mode=ro",
+        'OPTIONS': {'uri': True},
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        # Never migrated: it gets the schema from the primary (api/db_router.py)
+        'REPLICA': True,
+        # Tests copy the primary into it, as replication would
+        'TEST': {'NAME': BASE_DIR / 'test_db.replica.sqlite3', 'MIGRATE': False},
+    }
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+
+# Aliases serving the reads of the client/quotation/receipt endpoints (see
+# api/db_router.py). After a write the user reads from the primary for
+# DATABASE_REPLICA_STICKY_SECONDS, tracked in a cache every worker shares;
+# a failing replica is skipped for DATABASE_REPLICA_RETRY_SECONDS.
+DATABASE_REPLICAS = ['replica'] if SQLITE_REPLICA else []
+DATABASE_REPLICA_STICKY_SECONDS = 5
+DATABASE_REPLICA_RETRY_SECONDS = 30
+DATABASE_PIN_CACHE_ALIAS = 'responses'
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
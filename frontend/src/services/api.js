@@ -96,6 +96,34 @@ api.interceptors.response.use(
     }
 );
 
+// Follow cursor pagination links and resolve with every row, shaped like a
+// regular axios response so callers can keep reading `response.data`.
+// `params` (filters, ordering) only go on the first request; the `next`
+// links already carry them.
+export const fetchAllPages = async (url, params = {}) => {
+    const results = [];
+    let deleted = [];
+    let syncedAt = null;
+    let next = url;
+    let config = { params };
+    while (next) {
+        const response = await api.get(next, config);
+        config = {};
+        const page = response.data;
+        if (!page.results) {
+            return response;
+        }
+        // Only the first page carries these
+        if (page.synced_at) {
+            syncedAt = page.synced_at;
+            deleted = page.deleted || [];
+        }
+        results.push(...page.results);
+        next = page.next;
+    }
+    return { data: results, deleted, syncedAt };
+};
+
 // Auth API
 export const authAPI = {
     login: (credentials) => api.post('/auth/token/', credentials),
@@ -105,31 +133,59 @@ export const authAPI = {
 
 //Client API
 export const clientAPI = {
-    getAll: () => api.get('/clients/'),
+    getAll: (params) => fetchAllPages('/clients/', params),
+    // Rows changed and ids deleted since a previous response's synced_at
+    getChanges: (since) => fetchAllPages('/clients/', { updated_since: since }),
     get: (id) => api.get(`/clients/${id}/`),
     create: (data) => api.post('/clients/', data),
     update: (id, data) => api.put(`/clients/${id}/`, data),
     delete: (id) => api.delete(`/clients/${id}/`),
 };
 
+// What the list tables, dashboard and delta sync read; a full document
+// (with its line items) is loaded with get() when one is opened
+const QUOTATION_LIST_FIELDS = {
+    fields: 'quotation_number,client,date,valid_until,status,total,created_at,updated_at',
+    expand: 'client',
+};
+const RECEIPT_LIST_FIELDS = {
+    fields: 'receipt_number,client,date,payment_method,status,total,created_at,updated_at',
+    expand: 'client',
+};
+
 // Quotation API
 export const quotationAPI = {
-    getAll: () => api.get('/quotations/'),
+    getAll: (params) => fetchAllPages('/quotations/', { ...QUOTATION_LIST_FIELDS, ...params }),
+    getChanges: (since) => fetchAllPages('/quotations/', { ...QUOTATION_LIST_FIELDS, updated_since: since }),
     get: (id) => api.get(`/quotations/${id}/`),
     create: (data) => api.post('/quotations/', data),
     update: (id, data) => api.put(`/quotations/${id}/`, data),
     delete: (id) => api.delete(`/quotations/${id}/`),
     sendEmail: (id) => api.post(`/quotations/${id}/send_email/`),
+    getPdf: (id) => api.get(`/quotations/${id}/pdf/`, { responseType: 'blob' }),
 };
 
 // Receipt API
 export const receiptAPI = {
-    getAll: () => api.get('/receipts/'),
+    // params: e.g. { status: 'PAID', date_from: '2024-01-01', ordering: '-total' }
+    getAll: (params) => fetchAllPages('/receipts/', { ...RECEIPT_LIST_FIELDS, ...params }),
+    getChanges: (since) => fetchAllPages('/receipts/', { ...RECEIPT_LIST_FIELDS, updated_since: since }),
     get: (id) => api.get(`/receipts/${id}/`),
     create: (data) => api.post('/receipts/', data),
     update: (id, data) => api.put(`/receipts/${id}/`, data),
     delete: (id) => api.delete(`/receipts/${id}/`),
     sendEmail: (id) => api.post(`/receipts/${id}/send_email/`),
+    getPdf: (id) => api.get(`/receipts/${id}/pdf/`, { responseType: 'blob' }),
+};
+
+// Full-text search; params: { type: 'quotation', page, page_size }
+export const searchAPI = {
+    search: (q, params = {}) => api.get('/search/', { params: { q, ...params } }),
+};
+
+// Dashboard API
+export const dashboardAPI = {
+    getStats: () => api.get('/dashboard/'),
 };
 
 export default api;
@@ -10,6 +10,8 @@ export const useAppStore = defineStore('app', {
         loading: false,
         error: null,
         lastFetched: null,
+        // Server time of the last full or delta fetch, per collection
+        syncedAt: { clients: null, quotations: null, receipts: null },
     }),
 
     actions: {
@@ -31,9 +33,12 @@ export const useAppStore = defineStore('app', {
             const now = Date.now();
             const staleTime = 5 * 60 * 1000; // 5 minutes
             
-            if (!this.lastFetched || (now - this.lastFetched) > staleTime) {
+            if (!this.lastFetched) {
                 console.log('Fetching fresh data...');
                 await this.fetchAllData();
+            } else if ((now - this.lastFetched) > staleTime) {
+                console.log('Fetching changes since last sync...');
+                await this.syncAllData();
             } else {
                 console.log('Using cached data');
             }
@@ -60,11 +65,60 @@ export const useAppStore = defineStore('app', {
             }
         },
 
+        // Fetch only what changed since the last fetch
+        async syncAllData() {
+            this.loading = true;
+            this.error = null;
+
+            try {
+                await Promise.all([
+                    this.syncCollection('clients', clientAPI, () => this.fetchClients()),
+                    this.syncCollection('quotations', quotationAPI, () => this.fetchQuotations()),
+                    this.syncCollection('receipts', receiptAPI, () => this.fetchReceipts())
+                ]);
+                this.lastFetched = Date.now();
+                console.log('All data synced successfully');
+            } catch (error) {
+                console.error('Error syncing data:', error);
+                this.error = 'Failed to load data';
+            } finally {
+                this.loading = false;
+            }
+        },
+
+        // Merge changed rows and drop deleted ones; reload everything when
+        // the server can no longer tell what was deleted (410 Gone)
+        async syncCollection(name, api, fetchAll) {
+            const since = this.syncedAt[name];
+            if (!since) {
+                return fetchAll();
+            }
+            try {
+                const response = await api.getChanges(since);
+                const deleted = new Set(response.deleted);
+                const changed = new Map(response.data.map(row => [row.id, row]));
+                const rows = this[name]
+                    .filter(row => !deleted.has(row.id))
+                    .map(row => changed.get(row.id) || row);
+                const known = new Set(rows.map(row => row.id));
+                const added = response.data.filter(row => !known.has(row.id) && !deleted.has(row.id));
+                this[name] = [...added.reverse(), ...rows];
+                this.syncedAt[name] = response.syncedAt;
+                console.log(`Synced ${changed.size} changed and ${deleted.size} deleted ${name}`);
+            } catch (error) {
+                if (error.response?.status === 410) {
+                    return fetchAll();
+                }
+                throw error;
+            }
+        },
+
         // Client actions
         async fetchClients() {
             try {
                 const response = await clientAPI.getAll();
                 this.clients = response.data.results || response.data;
+                this.syncedAt.clients = response.syncedAt;
                 console.log(`Fetched ${this.clients.length} clients`);
             } catch (error) {
                 console.error('Error fetching clients:', error);
@@ -142,10 +196,12 @@ export const useAppStore = defineStore('app', {
         },
 
         // Quotation actions
-        async fetchQuotations() {
+        async fetchQuotations(filters = {}) {
             try {
-                const response = await quotationAPI.getAll();
+                const response = await quotationAPI.getAll(filters);
                 this.quotations = response.data.results || response.data;
+                // A filtered list can't be brought up to date with a delta
+                this.syncedAt.quotations = Object.keys(filters).length ? null : response.syncedAt;
                 console.log(`Fetched ${this.quotations.length} quotations`);
             } catch (error) {
                 console.error('Error fetching quotations:', error);
@@ -170,6 +226,12 @@ export const useAppStore = defineStore('app', {
             }
         },
 
+        // The list rows are sparse; this is the whole quotation with its items
+        async loadQuotation(id) {
+            const response = await quotationAPI.get(id);
+            return response.data;
+        },
+
         async updateQuotation(id, quotation) {
             this.loading = true;
             try {
@@ -222,10 +284,11 @@ export const useAppStore = defineStore('app', {
         },
 
         // Receipt actions
-        async fetchReceipts() {
+        async fetchReceipts(filters = {}) {
             try {
-                const response = await receiptAPI.getAll();
+                const response = await receiptAPI.getAll(filters);
                 this.receipts = response.data.results || response.data;
+                this.syncedAt.receipts = Object.keys(filters).length ? null : response.syncedAt;
                 console.log(`Fetched ${this.receipts.length} receipts`);
             } catch (error) {
                 console.error('Error fetching receipts:', error);
@@ -250,6 +313,12 @@ export const useAppStore = defineStore('app', {
             }
         },
 
+        // The list rows are sparse; this is the whole receipt with its items
+        async loadReceipt(id) {
+            const response = await receiptAPI.get(id);
+            return response.data;
+        },
+
         async updateReceipt(id, receipt) {
             this.loading = true;
             try {
@@ -391,6 +460,7 @@ export const useAppStore = defineStore('app', {
             this.loading = false;
             this.error = null;
             this.lastFetched = null;
+            this.syncedAt = { clients: null, quotations: null, receipts: null };
             console.log('All store data cleared');
         },
     },